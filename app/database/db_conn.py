@@ -1,26 +1,158 @@
 from pymongo import MongoClient
+from pymongo.database import Database
 from app.repositories.user_repositories import UserRepository
+from app.repositories.message_repository import MessageRepository
+from app.repositories.parqueadero_repository import ParqueaderoRepository
+from app.repositories.suscripcion_repository import SuscripcionRepository, soporta_transacciones
+from app.repositories.trabajo_repository import TrabajoRepository
+from app.repositories.lease_repository import LeaseRepository
+from app.repositories.buzon_notificaciones_repository import BuzonNotificacionesRepository
+from app.repositories.suscriptores_repository import SuscriptoresRepository
+from app.repositories.cuota_envios_repository import CuotaEnviosRepository
 import os
 
 MONGO_URL = os.getenv("MONGO_URL")
 
-client = MongoClient(MONGO_URL)
+# tz_aware: las fechas (BSON date, en UTC) se leen como datetime con zona
+client = MongoClient(MONGO_URL, tz_aware=True)
 db = client["mvp"]
 
-def get_db():
-    comprobar_collections(db)
+# Repositorios que declaran índices (atributo "indices")
+REPOSITORIOS = [MessageRepository, ParqueaderoRepository, SuscripcionRepository, TrabajoRepository, LeaseRepository,
+                BuzonNotificacionesRepository, SuscriptoresRepository, UserRepository, CuotaEnviosRepository]
+
+COLECCIONES = ["mensajes", "usuarios", "conversaciones", "parqueaderos", "suscripciones", "trabajos", "leases",
+               "contadores", "buzon_notificaciones", "suscriptores", "cuotas_envio"]
+
+# Validación de esquema en MongoDB. "warn" registra en el log de Mongo los documentos
+# inválidos sin rechazarlos (hay documentos históricos que no cumplen todo)
+ESQUEMAS = {
+    "usuarios": {
+        "bsonType": "object",
+        "required": ["_id"],
+        "properties": {
+            "_id": {"bsonType": "string"},
+            "name": {"bsonType": ["string", "null"]},
+            "rol": {"enum": ["conductor", "gestor_parqueadero", None]},
+            "estado_registro": {"bsonType": ["string", "null"]},
+            "estado_chat": {"bsonType": "object"},
+            "parqueadero_id": {"bsonType": ["string", "null"]}
+        }
+    },
+    "parqueaderos": {
+        "bsonType": "object",
+        "required": ["_id", "name", "ubicacion", "capacidad", "tiene_cupos", "cupos_libres"],
+        "properties": {
+            "_id": {"bsonType": "string"},
+            "name": {"bsonType": "string"},
+            "capacidad": {"bsonType": ["int", "long"]},
+            "tiene_cupos": {"bsonType": "bool"},
+            "cupos_libres": {"bsonType": "string"},
+            "ultima_actualizacion": {"bsonType": ["date", "null"]},
+            "coordenadas": {
+                "bsonType": ["object", "null"],
+                "required": ["type", "coordinates"],
+                "properties": {
+                    "type": {"enum": ["Point"]},
+                    "coordinates": {"bsonType": "array", "minItems": 2, "maxItems": 2}
+                }
+            }
+        }
+    },
+    "suscripciones": {
+        "bsonType": "object",
+        "required": ["_id", "conductor_id", "activa"],
+        "properties": {
+            "conductor_id": {"bsonType": "string"},
+            "parqueadero_id": {"bsonType": ["string", "null"]},
+            "fecha_suscripcion": {"bsonType": ["date", "null"]},
+            "activa": {"bsonType": "bool"}
+        }
+    },
+    "mensajes": {
+        "bsonType": "object",
+        "required": ["id", "from_", "type"],
+        "properties": {
+            "id": {"bsonType": "string"},
+            "from_": {"bsonType": "string"},
+            "type": {"bsonType": "string"},
+            "recibido_en": {"bsonType": "date"}
+        }
+    }
+}
+
+
+def get_db() -> Database:
+    """Dependencia de FastAPI. Las colecciones e índices se crean una sola vez en inicializar_base_datos"""
     return db
 
-def comprobar_collections(db):
-    colecciones = db.list_collection_names()
-    if "mensajes" not in colecciones:
-        db.create_collection("mensajes")
-    if "usuarios" not in colecciones:
-        db.create_collection("usuarios")
-    if "conversaciones" not in colecciones:
-        db.create_collection("conversaciones")
-    if "parqueaderos" not in colecciones:
-        db.create_collection("parqueaderos")
+
+def inicializar_base_datos(db: Database) -> dict:
+    """
+    Bootstrap de la base de datos al arrancar (lifespan de FastAPI y worker):
+    crea colecciones faltantes, aplica los validadores de esquema y crea los índices.
+    Retorna un reporte de lo realizado.
+    """
+    reporte = {"colecciones_creadas": [], "validadores": [], "indices": [], "vistas": [], "errores": [],
+               "transacciones": False}
+    existentes = set(db.list_collection_names())
+    try:
+        reporte["transacciones"] = soporta_transacciones(db)
+    except Exception as e:
+        reporte["errores"].append(f"transacciones: {e}")
+
+    for nombre in COLECCIONES:
+        esquema = ESQUEMAS.get(nombre)
+        opciones = {}
+        if esquema:
+            opciones = {
+                "validator": {"$jsonSchema": esquema},
+                "validationLevel": "moderate",
+                "validationAction": "warn"
+            }
+        try:
+            if nombre not in existentes:
+                db.create_collection(nombre, **opciones)
+                reporte["colecciones_creadas"].append(nombre)
+            elif opciones:
+                db.command("collMod", nombre, **opciones)
+            if opciones:
+                reporte["validadores"].append(nombre)
+        except Exception as e:
+            reporte["errores"].append(f"{nombre}: {e}")
+
+    for repositorio in REPOSITORIOS:
+        repo = repositorio(db)
+        try:
+            nombres = repo.crear_indices()
+            reporte["indices"].extend(f"{repo.collection.name}.{nombre}" for nombre in nombres)
+        except Exception as e:
+            # Ej: duplicados históricos en mensajes.id; el LRU del deduplicador sigue funcionando
+            reporte["errores"].append(f"índices de {repo.collection.name}: {e}")
+
+    # Primera vez con la vista de suscriptores: se construye desde las suscripciones existentes
+    suscriptores_repo = SuscriptoresRepository(db)
+    try:
+        if suscriptores_repo.esta_vacia():
+            conjuntos = suscriptores_repo.reconstruir()
+            reporte["vistas"].append(f"suscriptores ({conjuntos} conjuntos)")
+    except Exception as e:
+        reporte["errores"].append(f"vista suscriptores: {e}")
+
+    return reporte
+
+
+def imprimir_reporte(reporte: dict):
+    print("Base de datos inicializada:")
+    print(f"  Colecciones creadas: {', '.join(reporte['colecciones_creadas']) or 'ninguna'}")
+    print(f"  Validadores de esquema (warn): {', '.join(reporte['validadores']) or 'ninguno'}")
+    print(f"  Índices: {', '.join(reporte['indices']) or 'ninguno'}")
+    print(f"  Vistas reconstruidas: {', '.join(reporte['vistas']) or 'ninguna'}")
+    if not reporte["transacciones"]:
+        print("  Sin transacciones (no es replica set): la vista de suscriptores se actualiza sin atomicidad")
+    for error in reporte["errores"]:
+        print(f"  ERROR: {error}")
+
 
 def get_usuario(db, wa_id: str):
     user_repo = UserRepository(db)
@@ -0,0 +1,202 @@
+"""
+Exportación del historial a archivos JSONL comprimidos (gzip), un archivo por día UTC.
+
+Colecciones exportables (por su campo de fecha):
+    mensajes.recibido_en
+    suscripciones.fecha_suscripcion
+
+Se lee con un cursor por lotes ordenado por fecha, así que la memoria no depende del
+tamaño del rango. Cada archivo se escribe como .tmp y se renombra al terminar; recién
+entonces avanza la marca de agua ("exportacion_<coleccion>" en "contadores"). Si la
+exportación se interrumpe, la siguiente ejecución retoma desde la marca y reescribe el
+día incompleto.
+
+La marca solo avanza sobre rangos contiguos a ella: todo lo anterior a la marca está
+exportado. Un --desde posterior a la marca exporta los archivos pero no la mueve (el
+hueco [marca, desde) sigue pendiente y --podar no lo toca).
+
+Los mensajes vencen por TTL a los MENSAJES_TTL_DIAS días: si la marca queda más atrás
+que eso, la exportación avisa que los mensajes de ese tramo pueden haberse borrado sin
+exportar. Hay que exportar con más frecuencia que el TTL.
+
+--podar borra de MongoDB los mensajes anteriores a la marca (ya exportados), por día.
+Las suscripciones no se podan: las activas son estado vivo del sistema.
+
+Los mensajes registrados antes de recibido_en no tienen fecha y no se exportan.
+
+Uso (contra la base configurada en MONGO_URL):
+    python -m app.database.exportar_archivo --salida archivo/ [--colecciones mensajes suscripciones]
+        [--desde 2025-01-01] [--hasta 2025-02-01] [--podar] [--lote 1000]
+"""
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+from pymongo.database import Database
+from app.repositories.message_repository import MENSAJES_TTL_DIAS
+from app.utils.tiempo_utils import ahora, normalizar_fecha
+
+CAMPOS = {
+    "mensajes": "recibido_en",
+    "suscripciones": "fecha_suscripcion",
+}
+PODABLES = {"mensajes"}
+# Lo más reciente que se exporta es ahora - margen: el registro diferido puede tener mensajes sin escribir
+EXPORTACION_MARGEN_MINUTOS = int(os.getenv("EXPORTACION_MARGEN_MINUTOS", "5"))
+
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)  # ObjectId y demás tipos BSON
+
+
+def _sello(fecha: datetime) -> str:
+    return fecha.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _fecha(texto: str) -> datetime:
+    """Fecha de la línea de comandos (ISO, sin zona = UTC)"""
+    fecha = datetime.fromisoformat(texto)
+    return fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+
+
+def _dias(desde: datetime, hasta: datetime):
+    """Rangos [inicio, fin) que cortan [desde, hasta) en la medianoche UTC"""
+    inicio = desde
+    while inicio < hasta:
+        medianoche = datetime(inicio.year, inicio.month, inicio.day, tzinfo=timezone.utc) + timedelta(days=1)
+        fin = min(medianoche, hasta)
+        yield inicio, fin
+        inicio = fin
+
+
+def obtener_marca(db: Database, coleccion: str) -> Optional[datetime]:
+    contador = db["contadores"].find_one({"_id": f"exportacion_{coleccion}"})
+    return normalizar_fecha(contador["hasta"]) if contador else None
+
+
+def guardar_marca(db: Database, coleccion: str, hasta: datetime):
+    db["contadores"].update_one(
+        {"_id": f"exportacion_{coleccion}"},
+        {"$set": {"hasta": hasta, "actualizado_en": ahora()}},
+        upsert=True
+    )
+
+
+def _primera_fecha(db: Database, coleccion: str) -> Optional[datetime]:
+    """Fecha del documento más antiguo (inicio de la primera exportación)"""
+    campo = CAMPOS[coleccion]
+    primero = db[coleccion].find_one({campo: {"$type": "date"}}, {campo: 1}, sort=[(campo, 1)])
+    return normalizar_fecha(primero[campo]) if primero else None
+
+
+def _avisar_vencidos(coleccion: str, desde: datetime):
+    """Avisa si el rango empieza antes de lo que el TTL de mensajes conserva"""
+    if coleccion != "mensajes" or MENSAJES_TTL_DIAS <= 0:
+        return
+    vencimiento = ahora() - timedelta(days=MENSAJES_TTL_DIAS)
+    if desde < vencimiento:
+        print(f"ADVERTENCIA {coleccion}: se exporta desde {desde.isoformat()}, pero el TTL de "
+              f"{MENSAJES_TTL_DIAS} días ya pudo borrar lo anterior a {vencimiento.isoformat()} sin exportar")
+
+
+def exportar_rango(db: Database, coleccion: str, desde: datetime, hasta: datetime, salida: Path,
+                   lote: int = 1000) -> int:
+    """Escribe los documentos con fecha en [desde, hasta) a un .jsonl.gz. Retorna cuántos escribió"""
+    campo = CAMPOS[coleccion]
+    archivo = salida / f"{coleccion}-{_sello(desde)}-{_sello(hasta)}.jsonl.gz"
+    temporal = archivo.with_name(archivo.name + ".tmp")
+    cursor = db[coleccion].find({campo: {"$gte": desde, "$lt": hasta}}, sort=[(campo, 1)], batch_size=lote)
+    documentos = 0
+    try:
+        with gzip.open(temporal, "wt", encoding="utf-8") as destino:
+            for documento in cursor:
+                destino.write(json.dumps(documento, default=_a_json, ensure_ascii=False) + "\n")
+                documentos += 1
+    finally:
+        cursor.close()
+    if documentos:
+        os.replace(temporal, archivo)
+    else:
+        temporal.unlink()
+    return documentos
+
+
+def exportar(db: Database, coleccion: str, salida: Path, desde: Optional[datetime] = None,
+             hasta: Optional[datetime] = None, lote: int = 1000) -> dict:
+    """
+    Exporta día por día desde la marca de agua (o desde) hasta hasta, avanzando la marca
+    después de cada archivo mientras el rango sea contiguo a ella.
+    Retorna {"documentos": int, "archivos": int, "hasta": datetime}.
+    """
+    limite = ahora() - timedelta(minutes=EXPORTACION_MARGEN_MINUTOS)
+    hasta = min(hasta, limite) if hasta else limite
+    marca = obtener_marca(db, coleccion)
+    desde = desde or marca or _primera_fecha(db, coleccion)
+    resultado = {"documentos": 0, "archivos": 0, "hasta": desde}
+    if desde is None:
+        return resultado
+    if marca is not None and desde > marca:
+        # Avanzar la marca daría por exportado [marca, desde) y podar() lo borraría
+        print(f"{coleccion}: --desde es posterior a la marca ({marca.isoformat()}); la marca no se mueve")
+    _avisar_vencidos(coleccion, min(desde, marca) if marca else desde)
+    salida.mkdir(parents=True, exist_ok=True)
+
+    for inicio, fin in _dias(desde, hasta):
+        documentos = exportar_rango(db, coleccion, inicio, fin, salida, lote)
+        resultado["documentos"] += documentos
+        resultado["archivos"] += 1 if documentos else 0
+        resultado["hasta"] = fin
+        # Solo avanza si el día empieza en o antes de la marca (sin huecos); con --desde
+        # explícito se puede reexportar un rango viejo, pero la marca nunca retrocede
+        if marca is None or inicio <= marca < fin:
+            guardar_marca(db, coleccion, fin)
+            marca = fin
+    return resultado
+
+
+def podar(db: Database, coleccion: str) -> int:
+    """Borra, un día por operación, los documentos anteriores a la marca de agua. Retorna cuántos borró"""
+    if coleccion not in PODABLES:
+        raise ValueError(f"{coleccion} no se poda")
+    marca = obtener_marca(db, coleccion)
+    if marca is None:
+        return 0
+    campo = CAMPOS[coleccion]
+    primero = db[coleccion].find_one({campo: {"$lt": marca}}, {campo: 1}, sort=[(campo, 1)])
+    if primero is None:
+        return 0
+    borrados = 0
+    for inicio, fin in _dias(normalizar_fecha(primero[campo]), marca):
+        borrados += db[coleccion].delete_many({campo: {"$gte": inicio, "$lt": fin}}).deleted_count
+    return borrados
+
+
+def main():
+    from app.database.db_conn import get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--salida", type=Path, required=True, help="directorio de los .jsonl.gz")
+    parser.add_argument("--colecciones", nargs="+", choices=sorted(CAMPOS), default=["mensajes"])
+    parser.add_argument("--desde", type=_fecha, help="ISO; por defecto la marca de agua")
+    parser.add_argument("--hasta", type=_fecha, help=f"ISO; por defecto ahora - {EXPORTACION_MARGEN_MINUTOS} minutos")
+    parser.add_argument("--podar", action="store_true", help="borra de MongoDB lo exportado (solo mensajes)")
+    parser.add_argument("--lote", type=int, default=1000, help="documentos por lote del cursor")
+    args = parser.parse_args()
+
+    db = get_db()
+    for coleccion in args.colecciones:
+        resultado = exportar(db, coleccion, args.salida, args.desde, args.hasta, args.lote)
+        marca = obtener_marca(db, coleccion)
+        marca = marca.isoformat() if marca else "sin documentos"
+        print(f"{coleccion}: {resultado['documentos']} documentos en {resultado['archivos']} archivos (marca: {marca})")
+        if args.podar and coleccion in PODABLES:
+            print(f"{coleccion}: {podar(db, coleccion)} documentos podados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Migración de fechas guardadas como texto ("YYYY-MM-DD HH:MM:SS", hora de Bogotá)
+a fechas nativas de MongoDB (BSON date, en UTC).
+
+Campos migrados:
+    parqueaderos.ultima_actualizacion
+    suscripciones.fecha_suscripcion
+    usuarios.estado_chat.ultima_interaccion
+
+Es idempotente: solo toca los documentos cuyo campo sigue siendo texto. Los textos que
+no tienen el formato esperado se reportan y se dejan como están.
+
+Uso (contra la base configurada en MONGO_URL):
+    python -m app.database.migrar_fechas [--simular] [--lote 1000]
+"""
+import argparse
+from pymongo import UpdateOne
+from pymongo.database import Database
+from app.utils.tiempo_utils import parsear_legado
+
+CAMPOS = [
+    ("parqueaderos", "ultima_actualizacion"),
+    ("suscripciones", "fecha_suscripcion"),
+    ("usuarios", "estado_chat.ultima_interaccion"),
+]
+
+
+def _leer_campo(documento: dict, campo: str):
+    for parte in campo.split("."):
+        documento = (documento or {}).get(parte)
+    return documento
+
+
+def migrar_campo(db: Database, coleccion: str, campo: str, lote: int = 1000, simular: bool = False,
+                 extra_set: dict = None) -> dict:
+    """
+    Convierte un campo de texto a fecha en bloques de `lote` documentos (bulk_write).
+    extra_set se agrega a cada actualización (ej. la versión de parqueaderos).
+    Retorna {"migrados": int, "invalidos": int}.
+    """
+    resultado = {"migrados": 0, "invalidos": 0}
+    operaciones = []
+    cursor = db[coleccion].find({campo: {"$type": "string"}}, {campo: 1})
+    for documento in cursor:
+        fecha = parsear_legado(_leer_campo(documento, campo))
+        if fecha is None:
+            resultado["invalidos"] += 1
+            continue
+        operaciones.append(UpdateOne({"_id": documento["_id"], campo: {"$type": "string"}},
+                                     {"$set": {campo: fecha, **(extra_set or {})}}))
+        if len(operaciones) >= lote:
+            resultado["migrados"] += _aplicar(db, coleccion, operaciones, simular)
+            operaciones = []
+    if operaciones:
+        resultado["migrados"] += _aplicar(db, coleccion, operaciones, simular)
+    return resultado
+
+
+def _aplicar(db: Database, coleccion: str, operaciones: list, simular: bool) -> int:
+    if simular:
+        return len(operaciones)
+    return db[coleccion].bulk_write(operaciones, ordered=False).modified_count
+
+
+def migrar(db: Database, lote: int = 1000, simular: bool = False) -> dict:
+    """Migra todos los campos de CAMPOS. Retorna el resultado por "coleccion.campo" """
+    from app.repositories.parqueadero_repository import ParqueaderoRepository
+
+    reporte = {}
+    for coleccion, campo in CAMPOS:
+        extra_set = None
+        if coleccion == "parqueaderos" and not simular:
+            # Nueva versión: la foto de disponibilidad de cada proceso relee los parqueaderos migrados
+            extra_set = {"version": ParqueaderoRepository(db)._siguiente_version()}
+        reporte[f"{coleccion}.{campo}"] = migrar_campo(db, coleccion, campo, lote, simular, extra_set)
+    return reporte
+
+
+def main():
+    from app.database.db_conn import get_db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lote", type=int, default=1000)
+    parser.add_argument("--simular", action="store_true", help="cuenta lo que se migraría sin escribir")
+    args = parser.parse_args()
+
+    reporte = migrar(get_db(), args.lote, args.simular)
+    for nombre, resultado in reporte.items():
+        print(f"{nombre}: {resultado['migrados']} migrados, {resultado['invalidos']} inválidos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Verificación de planes de consulta: ejecuta explain() sobre las consultas de los
+repositorios y falla si MongoDB tendría que recorrer la colección completa (COLLSCAN).
+
+En modo prueba (VERIFICAR_PLANES=1) todos los repositorios envuelven su colección
+con ColeccionVerificada, así cualquier consulta sin índice lanza PlanConsultaError.
+
+verificar_repositorios llama a los métodos reales de cada repositorio (también los que
+escriben), así el chequeo no se desactualiza cuando cambia una consulta. La usa
+tests/test_verificar_planes.py.
+
+Uso (contra el servidor de MONGO_URL; crea y borra la base "verificar_planes"):
+    python -m app.database.verificar_planes
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Set
+
+VERIFICAR_PLANES = os.getenv("VERIFICAR_PLANES", "0") == "1"
+BASE_VERIFICACION = "verificar_planes"
+
+
+class PlanConsultaError(AssertionError):
+    """La consulta no usa índices (COLLSCAN)"""
+
+
+def etapas_del_plan(plan: Any) -> Set[str]:
+    """Recolecta recursivamente las etapas ("stage") de un plan de explain()"""
+    etapas = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            etapas.add(plan["stage"])
+        for valor in plan.values():
+            etapas |= etapas_del_plan(valor)
+    elif isinstance(plan, list):
+        for valor in plan:
+            etapas |= etapas_del_plan(valor)
+    return etapas
+
+
+class ColeccionVerificada:
+    """
+    Proxy de pymongo.Collection que verifica el plan de cada consulta antes de ejecutarla.
+    Los filtros vacíos (recorridos completos intencionales, ej. find_all) no se verifican.
+    aggregate tampoco: $geoNear ya falla sin su índice y la otra agregación
+    (SuscriptoresRepository.reconstruir) recorre todas las activas a propósito.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, nombre):
+        return getattr(self._collection, nombre)
+
+    def verificar(self, filtro: Optional[dict], sort=None):
+        if not filtro:
+            return
+        cursor = self._collection.find(filtro)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in etapas_del_plan(plan):
+            raise PlanConsultaError(f"COLLSCAN en {self._collection.name}: filtro={filtro} sort={sort}")
+
+    def find(self, filter=None, *args, **kwargs):
+        self.verificar(filter, kwargs.get("sort"))
+        return self._collection.find(filter, *args, **kwargs)
+
+    def find_one(self, filter=None, *args, **kwargs):
+        self.verificar(filter, kwargs.get("sort"))
+        return self._collection.find_one(filter, *args, **kwargs)
+
+    def find_one_and_update(self, filter, update, *args, **kwargs):
+        self.verificar(filter, kwargs.get("sort"))
+        return self._collection.find_one_and_update(filter, update, *args, **kwargs)
+
+    def update_one(self, filter, update, *args, **kwargs):
+        self.verificar(filter)
+        return self._collection.update_one(filter, update, *args, **kwargs)
+
+    def update_many(self, filter, update, *args, **kwargs):
+        self.verificar(filter)
+        return self._collection.update_many(filter, update, *args, **kwargs)
+
+    def delete_one(self, filter, *args, **kwargs):
+        self.verificar(filter)
+        return self._collection.delete_one(filter, *args, **kwargs)
+
+    def delete_many(self, filter, *args, **kwargs):
+        self.verificar(filter)
+        return self._collection.delete_many(filter, *args, **kwargs)
+
+    def count_documents(self, filter, *args, **kwargs):
+        self.verificar(filter)
+        return self._collection.count_documents(filter, *args, **kwargs)
+
+    def bulk_write(self, requests, *args, **kwargs):
+        # Las operaciones de un lote comparten la forma del filtro: basta verificar la primera
+        if requests:
+            self.verificar(getattr(requests[0], "_filter", None))
+        return self._collection.bulk_write(requests, *args, **kwargs)
+
+
+class BaseDatosVerificada:
+    """Proxy de pymongo.Database: toda colección (también "contadores") sale como ColeccionVerificada"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, nombre):
+        return getattr(self._db, nombre)
+
+    def __getitem__(self, nombre):
+        return ColeccionVerificada(self._db[nombre])
+
+
+def coleccion(db, nombre: str):
+    """db[nombre] para un repositorio; en modo prueba (VERIFICAR_PLANES) verificada"""
+    collection = db[nombre]
+    if VERIFICAR_PLANES and not isinstance(collection, ColeccionVerificada):
+        return ColeccionVerificada(collection)
+    return collection
+
+
+def verificar_repositorios(db) -> Dict[str, Optional[str]]:
+    """
+    Llama, sobre db, a cada método de consulta de los repositorios (y de la exportación)
+    con todas sus colecciones verificadas. Escribe documentos: usar una base de prueba.
+    Retorna {consulta: None si usa índices, o el error}.
+    """
+    from pymongo.errors import OperationFailure
+    from app.database.exportar_archivo import CAMPOS, _primera_fecha, exportar_rango, guardar_marca, obtener_marca, podar
+    from app.models.database_models import Conductor, GestorParqueadero
+    from app.repositories.buzon_notificaciones_repository import BuzonNotificacionesRepository
+    from app.repositories.cuota_envios_repository import CuotaEnviosRepository
+    from app.repositories.lease_repository import LeaseRepository
+    from app.repositories.message_repository import MessageRepository
+    from app.repositories.parqueadero_repository import ParqueaderoRepository
+    from app.repositories.suscripcion_repository import SuscripcionRepository
+    from app.repositories.suscriptores_repository import SuscriptoresRepository
+    from app.repositories.trabajo_repository import TrabajoRepository
+    from app.repositories.user_repositories import ConductorRepository, GestorParqueaderoRepository, UserRepository
+    from app.utils.tiempo_utils import ahora
+
+    db = BaseDatosVerificada(db)
+    usuarios = UserRepository(db)
+    conductores = ConductorRepository(db)
+    gestores = GestorParqueaderoRepository(db)
+    parqueaderos = ParqueaderoRepository(db)
+    suscripciones = SuscripcionRepository(db)
+    suscriptores = SuscriptoresRepository(db)
+    trabajos = TrabajoRepository(db)
+    buzones = BuzonNotificacionesRepository(db)
+    mensajes = MessageRepository(db)
+    leases = LeaseRepository(db)
+    cuotas = CuotaEnviosRepository(db)
+
+    conductor, gestor, parqueadero = "verificacion-conductor", "verificacion-gestor", "verificacion-parqueadero"
+    inicio = ahora() - timedelta(days=1)
+    mensaje = {"id": "verificacion-mensaje", "from_": conductor, "type": "text", "recibido_en": inicio}
+    cola = SimpleNamespace(encolar_cupo_liberado=lambda parqueadero_id, gestor_id: trabajos.encolar(
+        "cupo_liberado", {"parqueadero_id": parqueadero_id, "gestor_id": gestor_id}))
+    encolado = {}  # resultado de actualizar_cupos_con_notificacion (trabajo_id para los pasos de trabajos)
+    salida = Path(tempfile.mkdtemp(prefix="verificar_planes-"))
+
+    # En orden: los primeros pasos crean los documentos que consultan los siguientes
+    consultas = {
+        "usuarios.create": lambda: usuarios.create(Conductor(**{"_id": conductor, "rol": "conductor"})),
+        "gestores.create": lambda: gestores.create(GestorParqueadero(**{"_id": gestor, "rol": "gestor_parqueadero"})),
+        "usuarios.find_by_id": lambda: usuarios.find_by_id(conductor),
+        "usuarios.find_fila_by_id": lambda: usuarios.find_fila_by_id(gestor, ["parqueadero_id"]),
+        "usuarios.iter_pagina (rol)": lambda: list(usuarios.iter_pagina({"rol": "conductor"}, None, 100)),
+        "usuarios.iter_pagina (rol, cursor)": lambda: list(usuarios.iter_pagina({"rol": "conductor"}, conductor, 100)),
+        "usuarios.iter_pagina (cursor)": lambda: list(usuarios.iter_pagina({}, conductor, 100)),
+        "conductores.iter_all": lambda: list(conductores.iter_all()),
+        "gestores.iter_all": lambda: list(gestores.iter_all()),
+        "usuarios.transicionar_estado": lambda: usuarios.transicionar_estado(conductor, "inicio", {}),
+        "usuarios.transicionar_estado (paso_esperado)": lambda: usuarios.transicionar_estado(
+            conductor, "menu", paso_esperado="inicio"),
+        "usuarios.actualizar_estado_registro": lambda: usuarios.actualizar_estado_registro(conductor, "esperando_nombre"),
+        "usuarios.actualizar_nombre": lambda: usuarios.actualizar_nombre(conductor, "Verificación"),
+        "usuarios.actualizar_contexto_temporal": lambda: usuarios.actualizar_contexto_temporal(conductor, {}),
+        "parqueaderos.create": lambda: parqueaderos.create(
+            {"_id": parqueadero, "name": parqueadero, "ubicacion": "Calle 1", "capacidad": 10}),
+        "parqueaderos.find_by_name": lambda: parqueaderos.find_by_name(parqueadero),
+        "parqueaderos.find_by_id": lambda: parqueaderos.find_by_id(parqueadero),
+        "parqueaderos.find_many_by_ids": lambda: parqueaderos.find_many_by_ids([parqueadero, "otro"], campos=["name"]),
+        "parqueaderos.find_fila_by_id": lambda: parqueaderos.find_fila_by_id(parqueadero, ["name"]),
+        "parqueaderos.obtener_version": parqueaderos.obtener_version,
+        "parqueaderos.find_cambiados_desde": lambda: parqueaderos.find_cambiados_desde(0),
+        "parqueaderos.actualizar_coordenadas": lambda: parqueaderos.actualizar_coordenadas(parqueadero, 4.65, -74.06),
+        "parqueaderos.actualizar_cupos": lambda: parqueaderos.actualizar_cupos(parqueadero, "3", True),
+        "parqueaderos.actualizar_cupos_con_notificacion": lambda: encolado.update(
+            parqueaderos.actualizar_cupos_con_notificacion(parqueadero, "5", True, "5-10", "pocos cupos", cola, gestor)),
+        "parqueaderos.find_pagina_con_cupos": lambda: parqueaderos.find_pagina_con_cupos(7),
+        "parqueaderos.find_pagina_con_cupos (despues_de)": lambda: parqueaderos.find_pagina_con_cupos(
+            7, despues_de=(inicio, parqueadero)),
+        "parqueaderos.find_pagina_con_cupos (desde)": lambda: parqueaderos.find_pagina_con_cupos(
+            7, desde=(inicio, parqueadero)),
+        "parqueaderos.find_pagina_con_cupos (antes_de)": lambda: parqueaderos.find_pagina_con_cupos(
+            7, antes_de=(inicio, parqueadero)),
+        "parqueaderos.find_pagina_con_cupos (sin fecha)": lambda: parqueaderos.find_pagina_con_cupos(
+            7, despues_de=(None, parqueadero)),
+        # $geoNear falla con OperationFailure si no existe el índice 2dsphere
+        "parqueaderos.find_cercanos_con_cupos": lambda: parqueaderos.find_cercanos_con_cupos(4.65, -74.06, 5, 5000),
+        "gestores.update": lambda: gestores.update(GestorParqueadero(
+            **{"_id": gestor, "rol": "gestor_parqueadero", "parqueadero_id": parqueadero})),
+        "gestores.obtener_parqueadero_id": lambda: gestores.obtener_parqueadero_id(gestor),
+        "suscripciones.create_suscripcion": lambda: suscripciones.create_suscripcion(conductor, parqueadero),
+        "suscripciones.create_suscripcion (global)": lambda: suscripciones.create_suscripcion(conductor),
+        "suscripciones.find_active_suscripcion": lambda: suscripciones.find_active_suscripcion(conductor, parqueadero),
+        "suscripciones.find_suscripciones_by_conductor": lambda: suscripciones.find_suscripciones_by_conductor(conductor),
+        "suscripciones.find_suscripciones_by_parqueadero": lambda: suscripciones.find_suscripciones_by_parqueadero(
+            parqueadero),
+        "suscriptores.obtener_version": suscriptores.obtener_version,
+        "suscriptores.find_cambiados_desde": lambda: suscriptores.find_cambiados_desde(0),
+        "suscriptores.find_conductores": lambda: suscriptores.find_conductores(parqueadero),
+        "suscripciones.desactivar_suscripcion": lambda: suscripciones.desactivar_suscripcion(conductor, parqueadero),
+        "suscripciones.desactivar_todas_suscripciones": lambda: suscripciones.desactivar_todas_suscripciones(conductor),
+        "suscriptores.reconstruir": suscriptores.reconstruir,
+        "suscriptores.esta_vacia": suscriptores.esta_vacia,
+        "trabajos.reclamar_siguiente": lambda: trabajos.reclamar_siguiente("verificacion", 60),
+        "trabajos.reprogramar": lambda: trabajos.reprogramar(encolado["trabajo_id"], "error", 0, {}),
+        "trabajos.completar": lambda: trabajos.completar(encolado["trabajo_id"], {}),
+        "trabajos.marcar_fallido": lambda: trabajos.marcar_fallido(encolado["trabajo_id"], "error"),
+        "buzon_notificaciones.acumular": lambda: buzones.acumular([conductor], parqueadero, 0),
+        "buzon_notificaciones.reclamar_vencidos": lambda: buzones.reclamar_vencidos("verificacion", 10, 60),
+        "buzon_notificaciones.confirmar_envio": lambda: buzones.confirmar_envio(conductor, [parqueadero], 60, 3),
+        "buzon_notificaciones.posponer": lambda: buzones.posponer(conductor, ahora(), fallido=True),
+        "mensajes.crear_mensajes_nuevos": lambda: mensajes.crear_mensajes_nuevos([dict(mensaje)]),
+        "mensajes.crear_mensajes_nuevos (duplicado)": lambda: mensajes.crear_mensajes_nuevos([dict(mensaje)]),
+        "mensajes.obtener_mensajes": lambda: mensajes.obtener_mensajes(conductor),
+        "leases.adquirir": lambda: leases.adquirir(conductor, "verificacion", 30),
+        "leases.adquirir (ocupado)": lambda: leases.adquirir(conductor, "otro", 30),
+        "leases.renovar": lambda: leases.renovar(conductor, "verificacion", 30),
+        "leases.liberar": lambda: leases.liberar(conductor, "verificacion"),
+        "cuotas_envio.reservar": lambda: cuotas.reservar("verificacion", 1, 1),
+        "cuotas_envio.reservar (llena)": lambda: cuotas.reservar("verificacion", 1, 1),
+        "cuotas_envio.pausar": lambda: cuotas.pausar("verificacion", 1.0),
+        "cuotas_envio.pausa_hasta": lambda: cuotas.pausa_hasta("verificacion"),
+    }
+    for coleccion in CAMPOS:
+        consultas[f"exportacion.{coleccion}.primera_fecha"] = lambda c=coleccion: _primera_fecha(db, c)
+        consultas[f"exportacion.{coleccion}.exportar_rango"] = lambda c=coleccion: exportar_rango(
+            db, c, inicio, ahora(), salida)
+        consultas[f"exportacion.{coleccion}.marca"] = lambda c=coleccion: (guardar_marca(db, c, ahora()),
+                                                                          obtener_marca(db, c))
+    consultas["exportacion.mensajes.podar"] = lambda: podar(db, "mensajes")
+    consultas["mensajes.eliminar_mensaje"] = lambda: mensajes.eliminar_mensaje(mensaje["id"])
+    consultas["usuarios.delete"] = lambda: usuarios.delete(conductor)
+
+    resultados = {}
+    for nombre, consulta in consultas.items():
+        try:
+            consulta()
+            resultados[nombre] = None
+        except (AssertionError, OperationFailure) as e:
+            resultados[nombre] = str(e)
+    shutil.rmtree(salida, ignore_errors=True)
+    return resultados
+
+
+def main():
+    from pymongo import MongoClient
+    from app.database.db_conn import inicializar_base_datos, imprimir_reporte
+
+    client = MongoClient(os.getenv("MONGO_URL"), tz_aware=True)
+    client.drop_database(BASE_VERIFICACION)
+    db = client[BASE_VERIFICACION]
+    imprimir_reporte(inicializar_base_datos(db))
+
+    fallas = 0
+    for nombre, error in verificar_repositorios(db).items():
+        if error:
+            fallas += 1
+            print(f"FALLA  {nombre}: {error}")
+        else:
+            print(f"OK     {nombre}")
+    client.drop_database(BASE_VERIFICACION)
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
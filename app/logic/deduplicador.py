@@ -0,0 +1,62 @@
+"""
+Deduplicación de mensajes entrantes por ID de WhatsApp.
+Meta reintenta el webhook cuando tardamos en responder; los reintentos traen
+los mismos IDs de mensaje y no deben volver a ejecutar el flujo.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List
+from app.models.whatsapp_webhook import Message
+
+DEDUP_CAPACIDAD = int(os.getenv("DEDUP_CAPACIDAD", "10000"))
+
+
+class DeduplicadorMensajes:
+    """
+    LRU en memoria de IDs ya recibidos, delante del índice único de "mensajes".
+    El LRU descarta los reintentos sin ir a MongoDB; el índice cubre los que
+    llegan a otro proceso o después de un reinicio.
+    """
+
+    def __init__(self, capacidad: int = DEDUP_CAPACIDAD):
+        self.capacidad = capacidad
+        self._vistos: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metricas = {"duplicados_memoria": 0, "duplicados_base_datos": 0}
+
+    def filtrar_nuevos(self, mensajes: Iterable[Message]) -> List[Message]:
+        """Retorna los mensajes no vistos (también quita repetidos dentro del lote) y los marca como vistos"""
+        nuevos = []
+        with self._lock:
+            for msg in mensajes:
+                if msg.id in self._vistos:
+                    self._vistos.move_to_end(msg.id)
+                    self._metricas["duplicados_memoria"] += 1
+                    continue
+                self._vistos[msg.id] = None
+                nuevos.append(msg)
+            while len(self._vistos) > self.capacidad:
+                self._vistos.popitem(last=False)
+        return nuevos
+
+    def olvidar(self, ids: Iterable[str]):
+        """Desmarca IDs cuyo registro falló, para que el reintento de Meta sí se procese"""
+        with self._lock:
+            for id_mensaje in ids:
+                self._vistos.pop(id_mensaje, None)
+
+    def contar_duplicados_base_datos(self, cantidad: int):
+        if cantidad:
+            with self._lock:
+                self._metricas["duplicados_base_datos"] += cantidad
+
+    def metricas(self) -> dict:
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas["ids_en_memoria"] = len(self._vistos)
+        metricas["reintentos_absorbidos"] = metricas["duplicados_memoria"] + metricas["duplicados_base_datos"]
+        return metricas
+
+
+deduplicador = DeduplicadorMensajes()
@@ -0,0 +1,246 @@
+"""
+Despachador de mensajes entrantes fuera del event loop de uvicorn.
+Procesa en paralelo mensajes de usuarios distintos, pero los de un mismo
+usuario (wa_id) siempre en el orden en que llegaron.
+
+Con varios workers de uvicorn, un lease en MongoDB por wa_id garantiza que
+solo un proceso a la vez ejecute el flujo de ese usuario. El lease se renueva
+mientras el flujo corre; si otro proceso lo retiene, el mensaje espera su turno
+al frente de la cola del usuario en lugar de procesarse sin serializar. La espera
+es un timer, no un hilo del pool: los demás usuarios siguen procesándose.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from app.repositories.lease_repository import LeaseRepository
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_PENDIENTES = int(os.getenv("WEBHOOK_MAX_PENDIENTES", "1000"))
+WEBHOOK_MAX_POR_USUARIO = int(os.getenv("WEBHOOK_MAX_POR_USUARIO", "20"))
+# "1" activa el lease en MongoDB; necesario solo con varios workers de uvicorn (el dockerfile corre uno)
+WEBHOOK_LEASE = os.getenv("WEBHOOK_LEASE", "0") == "1"
+LEASE_DURACION = float(os.getenv("LEASE_DURACION", "30"))  # segundos
+LEASE_PAUSA_REINTENTO = float(os.getenv("LEASE_PAUSA_REINTENTO", "0.25"))  # segundos antes de reintentar sin lease
+
+
+class ColaLlenaError(Exception):
+    """El despachador no acepta más trabajo (backpressure)"""
+
+
+class LeaseMongo:
+    """
+    Lease por clave en MongoDB para serializar el trabajo entre procesos.
+    Un hilo renueva cada duracion/3 los leases retenidos, así un flujo lento
+    no pierde el suyo a mitad del procesamiento.
+    """
+
+    def __init__(self, lease_repo: LeaseRepository, duracion: float = LEASE_DURACION):
+        self.lease_repo = lease_repo
+        self.duracion = duracion
+        self.dueno = f"{socket.gethostname()}-{os.getpid()}"
+        self._retenidos: Set[str] = set()
+        self._lock = threading.Lock()
+        self._renovador: Optional[threading.Thread] = None
+        self.perdidos = 0
+
+    def adquirir(self, clave: str) -> bool:
+        """Un solo intento sin esperar: False si otro proceso lo retiene (quien llama reprograma)"""
+        if not self.lease_repo.adquirir(clave, self.dueno, self.duracion):
+            return False
+        self._retener(clave)
+        return True
+
+    def liberar(self, clave: str):
+        with self._lock:
+            self._retenidos.discard(clave)
+        self.lease_repo.liberar(clave, self.dueno)
+
+    def _retener(self, clave: str):
+        with self._lock:
+            self._retenidos.add(clave)
+            if self._renovador is None:
+                self._renovador = threading.Thread(target=self._renovar_periodicamente,
+                                                   name="lease-renovador", daemon=True)
+                self._renovador.start()
+
+    def _renovar_periodicamente(self):
+        while True:
+            time.sleep(self.duracion / 3)
+            with self._lock:
+                claves = list(self._retenidos)
+            for clave in claves:
+                try:
+                    renovado = self.lease_repo.renovar(clave, self.dueno, self.duracion)
+                except Exception as e:
+                    print(f"Error renovando lease de {clave}: {e}")
+                    continue
+                with self._lock:
+                    perdido = not renovado and clave in self._retenidos
+                    if perdido:
+                        self.perdidos += 1
+                if perdido:
+                    print(f"Lease de {clave} perdido mientras se procesaba")
+
+
+class DespachadorPorUsuario:
+    """
+    Ejecuta tareas en un pool de hilos con orden FIFO por clave.
+    Cada clave tiene una cola; solo un hilo a la vez drena la cola de una clave.
+    La cantidad de tareas pendientes está acotada en total y por clave.
+    """
+
+    def __init__(self, max_workers: int = WEBHOOK_WORKERS, max_pendientes: int = WEBHOOK_MAX_PENDIENTES,
+                 max_por_clave: int = WEBHOOK_MAX_POR_USUARIO, lease: Optional[LeaseMongo] = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+        self._colas: Dict[str, Deque[Tuple[float, Callable, tuple]]] = {}
+        self._lock = threading.Lock()
+        self.max_pendientes = max_pendientes
+        self.max_por_clave = max_por_clave
+        self.lease = lease
+        self._pendientes = 0
+        self._metricas = {
+            "aceptadas": 0,
+            "rechazadas": 0,
+            "procesadas": 0,
+            "errores": 0,
+            "lease_ocupado": 0,
+            "pendientes_max": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0
+        }
+
+    def enviar(self, clave: str, funcion: Callable[..., Any], *args):
+        """
+        Encola la tarea detrás de las pendientes de la misma clave.
+        Lanza ColaLlenaError si se superó el límite total o el de la clave.
+        """
+        self.enviar_lote([(clave, funcion, args)])
+
+    def enviar_lote(self, tareas: List[Tuple[str, Callable[..., Any], tuple]]):
+        """
+        Encola varias tareas (clave, funcion, args) respetando su orden.
+        Es todo o nada: si alguna no cabe, no se encola ninguna y se lanza ColaLlenaError.
+        """
+        por_clave = Counter(clave for clave, _, _ in tareas)
+        nuevas_claves = []
+        with self._lock:
+            lleno = self._pendientes + len(tareas) > self.max_pendientes or any(
+                len(self._colas.get(clave, ())) + cantidad > self.max_por_clave
+                for clave, cantidad in por_clave.items()
+            )
+            if lleno:
+                self._metricas["rechazadas"] += len(tareas)
+                raise ColaLlenaError(f"Cola llena ({self._pendientes} pendientes)")
+
+            self._pendientes += len(tareas)
+            self._metricas["aceptadas"] += len(tareas)
+            self._metricas["pendientes_max"] = max(self._metricas["pendientes_max"], self._pendientes)
+            ahora = time.monotonic()
+            for clave, funcion, args in tareas:
+                cola = self._colas.get(clave)
+                if cola is None:
+                    cola = self._colas[clave] = deque()
+                    nuevas_claves.append(clave)
+                # Si la clave ya se está drenando, la tarea se procesará en orden
+                cola.append((ahora, funcion, args))
+        for clave in nuevas_claves:
+            self._executor.submit(self._drenar, clave)
+
+    def _drenar(self, clave: str):
+        """Ejecuta la siguiente tarea de la clave y vuelve a programarse si quedan más"""
+        while True:
+            with self._lock:
+                # La tarea sale de la cola solo cuando se ejecutó (sin lease se queda al frente)
+                encolada_en, funcion, args = self._colas[clave][0]
+            if not self._ejecutar(clave, encolada_en, funcion, args):
+                temporizador = threading.Timer(LEASE_PAUSA_REINTENTO, self._reprogramar, (clave,))
+                temporizador.daemon = True
+                temporizador.start()
+                return
+            with self._lock:
+                self._colas[clave].popleft()
+                self._pendientes -= 1
+                if not self._colas[clave]:
+                    del self._colas[clave]
+                    return
+            try:
+                # Reprogramar en lugar de seguir en el mismo hilo, para no acaparar el pool
+                self._executor.submit(self._drenar, clave)
+                return
+            except RuntimeError:
+                # El pool se está cerrando: terminar la cola en este hilo
+                continue
+
+    def _reprogramar(self, clave: str):
+        """Vuelve a intentar la cola de una clave que esperaba el lease"""
+        try:
+            self._executor.submit(self._drenar, clave)
+        except RuntimeError:
+            # El pool se está cerrando: terminar la cola en este hilo
+            self._drenar(clave)
+
+    def _ejecutar(self, clave: str, encolada_en: float, funcion: Callable, args: tuple) -> bool:
+        """Ejecuta la tarea con el lease de la clave. False si no se consiguió el lease (no se ejecutó)"""
+        espera_ms = (time.monotonic() - encolada_en) * 1000
+        tiene_lease = False
+        resultado = "procesadas"
+        try:
+            if self.lease:
+                tiene_lease = self.lease.adquirir(clave)
+                if not tiene_lease:
+                    # Otro proceso retiene al usuario: no se procesa sin serializar, se reintenta
+                    self._contar("lease_ocupado")
+                    return False
+            funcion(*args)
+        except Exception as e:
+            resultado = "errores"
+            print(f"Error procesando mensaje de {clave}: {e}")
+            traceback.print_exc()
+        finally:
+            if tiene_lease:
+                try:
+                    self.lease.liberar(clave)
+                except Exception as e:
+                    print(f"Error liberando lease de {clave}: {e}")
+        with self._lock:
+            self._metricas[resultado] += 1
+            self._metricas["espera_total_ms"] += espera_ms
+            self._metricas["espera_max_ms"] = max(self._metricas["espera_max_ms"], espera_ms)
+        return True
+
+    def _contar(self, metrica: str):
+        with self._lock:
+            self._metricas[metrica] += 1
+
+    def metricas(self) -> dict:
+        """Profundidad de colas y tiempos de espera para monitoreo de backpressure"""
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas["pendientes"] = self._pendientes
+            metricas["usuarios_activos"] = len(self._colas)
+            metricas["max_pendientes"] = self.max_pendientes
+        metricas["leases_perdidos"] = self.lease.perdidos if self.lease else 0
+        terminadas = metricas["procesadas"] + metricas["errores"]
+        metricas["espera_promedio_ms"] = round(metricas.pop("espera_total_ms") / terminadas, 2) if terminadas else 0.0
+        metricas["espera_max_ms"] = round(metricas["espera_max_ms"], 2)
+        return metricas
+
+    def cerrar(self, esperar: bool = True):
+        """Detiene el pool, por defecto esperando a que terminen las tareas en curso"""
+        self._executor.shutdown(wait=esperar)
+
+
+def _crear_despachador() -> DespachadorPorUsuario:
+    lease = None
+    if WEBHOOK_LEASE:
+        from app.database.db_conn import db
+        lease = LeaseMongo(LeaseRepository(db))
+    return DespachadorPorUsuario(lease=lease)
+
+
+despachador = _crear_despachador()
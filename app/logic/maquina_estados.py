@@ -0,0 +1,74 @@
+"""
+Máquina de estados de las conversaciones.
+
+Cada regla asocia (rol, paso, entrada) con un manejador. Para resolver un mensaje
+se buscan, en este orden:
+1. Comandos globales del rol: reglas con paso CUALQUIER_PASO y una entrada concreta
+   (ej. "menu" o el prefijo "desuscribir"), válidos en cualquier paso.
+2. Reglas del paso actual, primero las de entrada concreta y luego la de cualquier entrada.
+3. La regla por defecto del rol (CUALQUIER_PASO, cualquier entrada).
+Dentro de cada grupo gana la regla registrada primero.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app.logic.sesion import Conversacion
+
+CUALQUIER_PASO = "*"
+
+# manejador(conversacion, texto, flow_service)
+Manejador = Callable[[Conversacion, str, object], None]
+
+
+class Regla:
+    """Una transición de la tabla: entrada exacta, por prefijo o cualquiera (ambas None)"""
+
+    def __init__(self, manejador: Manejador, textos: Optional[Iterable[str]] = None, prefijo: Optional[str] = None):
+        self.manejador = manejador
+        self.textos = frozenset(textos) if textos is not None else None
+        self.prefijo = prefijo
+
+    @property
+    def cualquier_entrada(self) -> bool:
+        return self.textos is None and self.prefijo is None
+
+    def coincide(self, texto: str) -> bool:
+        if self.textos is not None:
+            return texto in self.textos
+        if self.prefijo is not None:
+            return texto.startswith(self.prefijo)
+        return True
+
+
+class MaquinaEstados:
+    """Registro de reglas por (rol, paso) y resolución del manejador de un mensaje"""
+
+    def __init__(self):
+        self._reglas: Dict[Tuple[str, str], List[Regla]] = {}
+
+    def registrar(self, rol: str, pasos, manejador: Manejador, textos: Optional[Iterable[str]] = None,
+                  prefijo: Optional[str] = None):
+        """pasos puede ser un paso, una lista de pasos o CUALQUIER_PASO"""
+        for paso in ([pasos] if isinstance(pasos, str) else pasos):
+            self._reglas.setdefault((rol, paso), []).append(Regla(manejador, textos, prefijo))
+
+    def resolver(self, rol: str, paso: Optional[str], texto: str) -> Optional[Manejador]:
+        """Manejador para el mensaje, o None si el rol no tiene reglas"""
+        globales = self._reglas.get((rol, CUALQUIER_PASO), [])
+        del_paso = self._reglas.get((rol, paso), []) if paso != CUALQUIER_PASO else []
+        candidatas = (
+            [r for r in globales if not r.cualquier_entrada]
+            + [r for r in del_paso if not r.cualquier_entrada]
+            + [r for r in del_paso if r.cualquier_entrada]
+            + [r for r in globales if r.cualquier_entrada]
+        )
+        for regla in candidatas:
+            if regla.coincide(texto):
+                return regla.manejador
+        return None
+
+    def despachar(self, conversacion: Conversacion, texto: str, flow_service) -> bool:
+        """Ejecuta el manejador que corresponde. False si no hay regla para el rol"""
+        manejador = self.resolver(conversacion.rol, conversacion.paso, texto)
+        if manejador is None:
+            return False
+        manejador(conversacion, texto, flow_service)
+        return True
@@ -1,11 +1,220 @@
+"""
+Consulta de parqueaderos para los flujos de conversación.
 
+La tabla de parqueaderos es pequeña, se lee en cada "ver parqueaderos" y solo
+cambia cuando un gestor confirma cupos. Se mantiene una foto en memoria del
+proceso (SnapshotDisponibilidad) que se refresca de forma incremental con el
+contador de versión que ParqueaderoRepository incrementa en cada escritura.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
+from app.models.database_models import Parqueadero
 from app.repositories.parqueadero_repository import ParqueaderoRepository
 from app.repositories.user_repositories import GestorParqueaderoRepository
+from app.utils.tiempo_utils import normalizar_fecha
 
+# Cada cuánto (segundos) se consulta el contador de versión; acota qué tan vieja puede estar la foto
+SNAPSHOT_INTERVALO = float(os.getenv("SNAPSHOT_INTERVALO", "1"))
+# Recarga completa periódica (cubre parqueaderos eliminados)
+SNAPSHOT_RECARGA_COMPLETA = float(os.getenv("SNAPSHOT_RECARGA_COMPLETA", "300"))
+# "0" pagina directamente en MongoDB en lugar de la foto en memoria
+SNAPSHOT_PARQUEADEROS = os.getenv("SNAPSHOT_PARQUEADEROS", "1") == "1"
+# 7 parqueaderos + 2 botones de navegación + 1 volver = 10 filas (máximo de WhatsApp)
+PARQUEADEROS_POR_PAGINA = 7
+# Respuesta a una ubicación compartida: cuántos parqueaderos y a qué distancia máxima (metros)
+PARQUEADEROS_CERCANOS = int(os.getenv("PARQUEADEROS_CERCANOS", "5"))
+DISTANCIA_MAXIMA_CERCANOS = float(os.getenv("DISTANCIA_MAXIMA_CERCANOS", "5000"))
 
-def obtener_parqueaderos_con_cupos(db):
-    parqueadero_repo = ParqueaderoRepository(db)
-    return parqueadero_repo.find_with_available_spots()
+
+# Los parqueaderos sin fecha van al final (como null en el orden descendente de MongoDB)
+SIN_FECHA = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def clave_orden(parqueadero: Parqueadero) -> Tuple[datetime, str]:
+    """Clave de orden de la paginación: (ultima_actualizacion, _id)"""
+    return (parqueadero.ultima_actualizacion or SIN_FECHA, parqueadero.id)
+
+
+def cursor_de(parqueadero: Parqueadero) -> list:
+    """Cursor que se guarda en la sesión: [ultima_actualizacion o None, _id]"""
+    return [parqueadero.ultima_actualizacion, parqueadero.id]
+
+
+def clave_de_cursor(cursor) -> Tuple[datetime, str]:
+    """Clave de orden de un cursor guardado (acepta los de texto anteriores a las fechas nativas)"""
+    return (normalizar_fecha(cursor[0]) or SIN_FECHA, cursor[1])
+
+
+class FotoParqueaderos:
+    """Foto inmutable: parqueaderos con cupos ordenados por última actualización + índice por ID"""
+
+    def __init__(self, por_id: Mapping[str, Parqueadero], version: int):
+        self.version = version
+        self.por_id = MappingProxyType(dict(por_id))
+        self.con_cupos: Tuple[Parqueadero, ...] = tuple(sorted(
+            (p for p in self.por_id.values() if p.tiene_cupos), key=clave_orden, reverse=True
+        ))
+        # Claves en orden ascendente para búsqueda binaria de cursores
+        self._claves = [clave_orden(p) for p in reversed(self.con_cupos)]
+
+    def pagina(self, limite: int, despues_de=None, desde=None, antes_de=None) -> Tuple[List[Parqueadero], bool, bool]:
+        """
+        Misma semántica que ParqueaderoRepository.find_pagina_con_cupos, con búsqueda binaria.
+        Retorna (parqueaderos, hay_anterior, hay_siguiente).
+        """
+        total = len(self.con_cupos)
+        if antes_de:
+            fin = total - bisect_right(self._claves, clave_de_cursor(antes_de))
+            inicio = max(fin - limite, 0)
+        else:
+            if despues_de:
+                inicio = total - bisect_left(self._claves, clave_de_cursor(despues_de))
+            elif desde:
+                inicio = total - bisect_right(self._claves, clave_de_cursor(desde))
+            else:
+                inicio = 0
+            fin = min(inicio + limite, total)
+        return list(self.con_cupos[inicio:fin]), inicio > 0, fin < total
+
+
+class SnapshotDisponibilidad:
+    """
+    Foto de disponibilidad compartida por los hilos del proceso.
+    Los lectores toman la referencia actual sin bloqueo; el refresco construye
+    una foto nueva y la reemplaza. Los modelos son compartidos: no modificarlos.
+    """
+
+    def __init__(self, intervalo: float = SNAPSHOT_INTERVALO, recarga_completa: float = SNAPSHOT_RECARGA_COMPLETA):
+        self.intervalo = intervalo
+        self.recarga_completa = recarga_completa
+        self._foto: Optional[FotoParqueaderos] = None
+        self._verificado_en = 0.0
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+        self._metricas = {"recargas_completas": 0, "refrescos_incrementales": 0, "verificaciones": 0}
+
+    def foto(self, db) -> FotoParqueaderos:
+        """Retorna la foto vigente, refrescándola si pasó el intervalo"""
+        foto = self._foto
+        if foto is not None and time.monotonic() - self._verificado_en < self.intervalo:
+            return foto
+        # Solo un hilo refresca; los demás siguen con la foto actual
+        if foto is not None and not self._lock.acquire(blocking=False):
+            return foto
+        if foto is None:
+            self._lock.acquire()
+        try:
+            self._refrescar(ParqueaderoRepository(db))
+        finally:
+            self._lock.release()
+        return self._foto
+
+    def _refrescar(self, repo: ParqueaderoRepository):
+        ahora = time.monotonic()
+        if self._foto is None or ahora - self._cargado_en >= self.recarga_completa:
+            parqueaderos = repo.find_all()
+            self._foto = FotoParqueaderos({p.id: p for p in parqueaderos}, _version_leida(parqueaderos, 0))
+            self._cargado_en = ahora
+            self._metricas["recargas_completas"] += 1
+        else:
+            self._metricas["verificaciones"] += 1
+            # El contador solo indica si hay algo nuevo: se incrementa antes de escribir el documento
+            if repo.obtener_version() != self._foto.version:
+                cambiados = repo.find_cambiados_desde(self._foto.version)
+                if cambiados:
+                    por_id = dict(self._foto.por_id)
+                    por_id.update((p.id, p) for p in cambiados)
+                    self._foto = FotoParqueaderos(por_id, _version_leida(cambiados, self._foto.version))
+                    self._metricas["refrescos_incrementales"] += 1
+        self._verificado_en = ahora
+
+    def invalidar(self):
+        """Fuerza la verificación de versión en la próxima lectura"""
+        self._verificado_en = 0.0
+
+    def metricas(self) -> dict:
+        foto = self._foto
+        return {
+            **self._metricas,
+            "version": foto.version if foto else None,
+            "parqueaderos": len(foto.por_id) if foto else 0,
+            "con_cupos": len(foto.con_cupos) if foto else 0
+        }
+
+
+def _version_leida(parqueaderos, minima: int) -> int:
+    """
+    Versión de la foto: la mayor entre los documentos leídos, no la del contador.
+    Un escritor toma la versión N del contador y escribe el documento después; si la
+    foto guardara N antes de que el documento exista, el $gt de find_cambiados_desde
+    ya no lo traería. (Dos escritores concurrentes pueden igual escribir fuera de orden;
+    eso lo cubre la recarga completa periódica.)
+    """
+    return max([minima] + [p.version or 0 for p in parqueaderos])
+
+
+snapshot_disponibilidad = SnapshotDisponibilidad()
+
+
+def obtener_pagina_con_cupos(db, pagina: int = 1, despues_de=None, desde=None, antes_de=None,
+                             limite: int = PARQUEADEROS_POR_PAGINA) -> dict:
+    """
+    Página de parqueaderos con cupos paginada por cursor (ver find_pagina_con_cupos).
+    pagina es el número que lleva la sesión; solo se usa cuando se pagina en MongoDB.
+
+    Returns:
+        dict con: {"parqueaderos": List[Parqueadero], "hay_anterior": bool, "hay_siguiente": bool,
+                   "total": int (None si no se conoce), "cursor_inicio": list, "cursor_fin": list}
+    """
+    if SNAPSHOT_PARQUEADEROS:
+        foto = snapshot_disponibilidad.foto(db)
+        parqueaderos, hay_anterior, hay_siguiente = foto.pagina(limite, despues_de, desde, antes_de)
+        total = len(foto.con_cupos)
+    else:
+        parqueaderos, hay_mas = ParqueaderoRepository(db).find_pagina_con_cupos(limite, despues_de, desde, antes_de)
+        # Hacia atrás se sabe si hay más anteriores; hacia adelante, si hay más siguientes
+        hay_anterior = hay_mas if antes_de else pagina > 1
+        hay_siguiente = True if antes_de else hay_mas
+        total = None
+    return {
+        "parqueaderos": parqueaderos,
+        "hay_anterior": hay_anterior,
+        "hay_siguiente": hay_siguiente,
+        "total": total,
+        "cursor_inicio": cursor_de(parqueaderos[0]) if parqueaderos else None,
+        "cursor_fin": cursor_de(parqueaderos[-1]) if parqueaderos else None
+    }
+
+def obtener_parqueaderos_cercanos(db, latitud: float, longitud: float,
+                                  limite: int = PARQUEADEROS_CERCANOS) -> List[Tuple[Parqueadero, float]]:
+    """
+    Los parqueaderos con cupos más cercanos a la ubicación del conductor con su distancia en metros.
+    Va directo a MongoDB ($geoNear sobre el índice 2dsphere), no a la foto en memoria.
+    """
+    return ParqueaderoRepository(db).find_cercanos_con_cupos(latitud, longitud, limite, DISTANCIA_MAXIMA_CERCANOS)
+
+def actualizar_ubicacion_parqueadero(wa_id: str, latitud: float, longitud: float, db) -> Optional[Parqueadero]:
+    """Guarda la ubicación compartida por el gestor como coordenadas de su parqueadero"""
+    parqueadero_id = obtener_parqueadero_gestor(wa_id, db)
+    if not parqueadero_id:
+        return None
+    parqueadero = ParqueaderoRepository(db).actualizar_coordenadas(parqueadero_id, latitud, longitud)
+    snapshot_disponibilidad.invalidar()
+    return parqueadero
+
+def obtener_parqueadero(parqueadero_id: str, db) -> Optional[Parqueadero]:
+    """Busca en la foto en memoria; si no está (recién creado) o la foto está desactivada, consulta MongoDB"""
+    parqueadero = None
+    if SNAPSHOT_PARQUEADEROS:
+        parqueadero = snapshot_disponibilidad.foto(db).por_id.get(parqueadero_id)
+    if parqueadero is None:
+        parqueadero = ParqueaderoRepository(db).find_by_id(parqueadero_id)
+    return parqueadero
 
 def obtener_parqueadero_gestor(wa_id: str, db):
     gestor_repo = GestorParqueaderoRepository(db)
@@ -17,5 +226,6 @@ def actualizar_cupos_parqueadero(wa_id: str, cupos_libres: str, tiene_cupo: bool
     if parqueadero:
         parqueadero_repo = ParqueaderoRepository(db)
         parqueadero_repo.actualizar_cupos(parqueadero, cupos_libres, tiene_cupo)
+        snapshot_disponibilidad.invalidar()
         return True
-    return False
\ No newline at end of file
+    return False
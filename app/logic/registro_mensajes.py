@@ -0,0 +1,179 @@
+"""
+Registro diferido (write-behind) de los mensajes entrantes en "mensajes".
+
+Opcional (REGISTRO_DIFERIDO=1). El webhook agrega los documentos a un buffer en memoria
+y un hilo los escribe con insert_many(ordered=False) cada REGISTRO_LOTE mensajes o cada
+REGISTRO_INTERVALO_MS desde el primero pendiente, lo que ocurra antes. El flujo ya no
+espera ese insert: decide qué mensajes son nuevos solo con el LRU del deduplicador.
+
+Por eso no viene activado: el insert previo es la deduplicación entre procesos. Con
+varios workers de uvicorn, o después de un reinicio, un reintento de Meta que no está
+en el LRU vuelve a ejecutar el flujo (ej. una confirmación de cupos encolada dos veces);
+el índice único solo lo detecta al escribir el lote (duplicados_tardios). Usarlo solo
+con un proceso web, donde el LRU ve todos los reintentos.
+
+Pérdida acotada: si el proceso muere sin apagarse se pierden a lo sumo los pendientes
+(un lote o REGISTRO_INTERVALO_MS de tráfico en operación normal). Si MongoDB no
+responde, los lotes se reintentan y el buffer crece hasta REGISTRO_MAX_PENDIENTES;
+por encima se descartan los más antiguos. Al apagar, cerrar() escribe lo pendiente.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Iterable, List, Optional
+from app.repositories.message_repository import MessageRepository
+
+# Por defecto cada mensaje se registra antes de procesarlo (el insert decide si es nuevo; idempotente
+# entre procesos). "1" difiere el registro: ver la advertencia del módulo
+REGISTRO_DIFERIDO = os.getenv("REGISTRO_DIFERIDO", "0") == "1"
+REGISTRO_LOTE = int(os.getenv("REGISTRO_LOTE", "200"))
+REGISTRO_INTERVALO_MS = float(os.getenv("REGISTRO_INTERVALO_MS", "500"))
+REGISTRO_MAX_PENDIENTES = int(os.getenv("REGISTRO_MAX_PENDIENTES", "10000"))
+REGISTRO_ESPERA_CIERRE = 10  # segundos que cerrar() espera a que se escriba lo pendiente
+
+
+class RegistroMensajes:
+    """Buffer acotado de documentos de mensajes con un hilo escritor por proceso"""
+
+    def __init__(self, lote: int = REGISTRO_LOTE, intervalo_ms: float = REGISTRO_INTERVALO_MS,
+                 max_pendientes: int = REGISTRO_MAX_PENDIENTES):
+        self.lote = lote
+        self.intervalo = intervalo_ms / 1000
+        self.max_pendientes = max_pendientes
+        self._pendientes: Deque[dict] = deque()
+        self._primero_en: Optional[float] = None
+        self._condicion = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._repo: Optional[MessageRepository] = None
+        self._cerrando = False
+        self._metricas = {
+            "encolados": 0,
+            "escritos": 0,
+            "duplicados_tardios": 0,
+            "descartados": 0,
+            "lotes": 0,
+            "errores": 0,
+            "pendientes_max": 0,
+            "escritura_max_ms": 0.0
+        }
+
+    def iniciar(self, db=None):
+        """Arranca el hilo escritor (se llama solo con el primer mensaje si no se llamó antes)"""
+        with self._condicion:
+            if self._hilo is not None:
+                return
+            if db is None:
+                from app.database.db_conn import db
+            self._repo = MessageRepository(db)
+            self._cerrando = False
+            self._hilo = threading.Thread(target=self._ejecutar, name="registro-mensajes", daemon=True)
+            self._hilo.start()
+
+    def agregar(self, documentos: Iterable[dict]):
+        """Encola documentos para el próximo lote; no hace I/O"""
+        if self._hilo is None:
+            self.iniciar()
+        with self._condicion:
+            if not self._pendientes:
+                self._primero_en = time.monotonic()
+            antes = len(self._pendientes)
+            self._pendientes.extend(documentos)
+            self._metricas["encolados"] += len(self._pendientes) - antes
+            self._recortar()
+            self._metricas["pendientes_max"] = max(self._metricas["pendientes_max"], len(self._pendientes))
+            if len(self._pendientes) >= self.lote:
+                self._condicion.notify()
+
+    def _recortar(self):
+        """Descarta los más antiguos por encima de max_pendientes (llamar con el lock tomado)"""
+        excedente = len(self._pendientes) - self.max_pendientes
+        if excedente > 0:
+            for _ in range(excedente):
+                self._pendientes.popleft()
+            self._metricas["descartados"] += excedente
+            print(f"Registro de mensajes lleno: se descartaron {excedente} mensajes")
+
+    def _siguiente_lote(self) -> Optional[List[dict]]:
+        """Espera a que haya un lote listo (lleno, vencido o cierre). None cuando ya no queda nada"""
+        with self._condicion:
+            while True:
+                if self._pendientes and (self._cerrando or len(self._pendientes) >= self.lote):
+                    break
+                if self._pendientes:
+                    restante = self._primero_en + self.intervalo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._condicion.wait(restante)
+                elif self._cerrando:
+                    return None
+                else:
+                    self._condicion.wait()
+            lote = [self._pendientes.popleft() for _ in range(min(self.lote, len(self._pendientes)))]
+            # Los que quedan empiezan a contar su intervalo desde ahora
+            self._primero_en = time.monotonic() if self._pendientes else None
+            return lote
+
+    def _ejecutar(self):
+        while True:
+            lote = self._siguiente_lote()
+            if lote is None:
+                return
+            if self._escribir(lote):
+                continue
+            with self._condicion:
+                if self._cerrando:
+                    # Sin reintentos al apagar: MongoDB no responde y el proceso se va
+                    self._metricas["descartados"] += len(lote)
+                    continue
+                # Se devuelven al frente para el reintento (el índice único evita duplicar los que sí entraron)
+                self._pendientes.extendleft(reversed(lote))
+                self._primero_en = time.monotonic()
+                self._recortar()
+                self._condicion.wait(self.intervalo)
+
+    def _escribir(self, lote: List[dict]) -> bool:
+        inicio = time.perf_counter()
+        try:
+            nuevos = self._repo.crear_mensajes_nuevos(lote)
+        except Exception as e:
+            print(f"Error registrando {len(lote)} mensajes: {e}")
+            with self._condicion:
+                self._metricas["errores"] += 1
+            return False
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        with self._condicion:
+            self._metricas["lotes"] += 1
+            self._metricas["escritos"] += len(nuevos)
+            self._metricas["duplicados_tardios"] += len(lote) - len(nuevos)
+            self._metricas["escritura_max_ms"] = max(self._metricas["escritura_max_ms"], duracion_ms)
+        return True
+
+    def cerrar(self, espera: float = REGISTRO_ESPERA_CIERRE):
+        """Escribe lo pendiente y detiene el hilo (apagado de FastAPI)"""
+        with self._condicion:
+            hilo = self._hilo
+            if hilo is None:
+                return
+            self._cerrando = True
+            self._condicion.notify()
+        hilo.join(espera)
+        with self._condicion:
+            if hilo.is_alive():
+                print(f"Registro de mensajes: {len(self._pendientes)} pendientes sin escribir al apagar")
+            self._hilo = None
+
+    def metricas(self) -> dict:
+        with self._condicion:
+            metricas = dict(self._metricas)
+            metricas["pendientes"] = len(self._pendientes)
+            metricas["max_pendientes"] = self.max_pendientes
+            metricas["edad_pendientes_ms"] = (
+                round((time.monotonic() - self._primero_en) * 1000, 2) if self._primero_en is not None else 0.0
+            )
+        metricas["escritura_max_ms"] = round(metricas["escritura_max_ms"], 2)
+        metricas["diferido"] = REGISTRO_DIFERIDO
+        return metricas
+
+
+registro_mensajes = RegistroMensajes()
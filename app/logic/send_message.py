@@ -1,25 +1,10 @@
-import requests
-import os
-from app.repositories.message_repository import MessageRepository
+from app.services.whatsapp_client import obtener_cliente_whatsapp
 
-WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
-PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
-
-def send_message(to, message):
-    url = f"https://graph.facebook.com/v22.0/{PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "text": {"body": message}
-    }
-    response = requests.post(url, json=payload, headers=headers)
-    if response.status_code != 200:
-        print(f"Failed to send message to {to}. Response: {response.status_code} {response.text}")
+def send_message(to, message) -> bool:
+    """Envía un mensaje de texto usando el cliente compartido de WhatsApp"""
+    resultado = obtener_cliente_whatsapp().enviar_texto(to, message)
+    if not resultado["success"]:
+        print(f"Failed to send message to {to}. Response: {resultado['status_code']} {resultado['error']}")
     else:
         print(f"Message sent to {to}.")
-    
-    print("📤 Respuesta de Meta:", response.status_code, response.text)
\ No newline at end of file
+    return resultado["success"]
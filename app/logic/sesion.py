@@ -1,33 +1,312 @@
+"""
+Acceso a los usuarios durante el procesamiento de los mensajes.
+
+Un mismo mensaje consulta al usuario varias veces (autenticación, router por rol,
+cada sub-servicio). Para no repetir el find_one en "usuarios":
+- Mapa de identidad por mensaje: dentro de alcance_mensaje() cada usuario se lee
+  de MongoDB una sola vez; las actualizaciones reemplazan la copia (write-through).
+- Caché opcional del proceso (SESION_CACHE_TTL > 0): TTL + LRU compartida entre
+  mensajes, invalidada con un change stream de "usuarios" para que los cambios
+  hechos por otros workers no se lean obsoletos. Requiere replica set; si el
+  change stream no está disponible la caché se desactiva.
+
+Durante el flujo de un usuario registrado el estado del chat vive en una
+Conversacion: los cambios de paso y contexto se aplican en memoria y se guardan
+con una sola escritura al terminar el mensaje (ninguna si no cambió nada).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
 from app.repositories.user_repositories import UserRepository, ConductorRepository
 from app.models.database_models import Conductor, User
 
+SESION_CACHE_TTL = float(os.getenv("SESION_CACHE_TTL", "0"))  # segundos; 0 desactiva la caché del proceso
+SESION_CACHE_MAX = int(os.getenv("SESION_CACHE_MAX", "5000"))
+
+# Usuarios ya leídos durante el mensaje en curso (None fuera de alcance_mensaje)
+_usuarios_mensaje: ContextVar[Optional[Dict[str, User]]] = ContextVar("usuarios_mensaje", default=None)
+# Conversaciones abiertas durante el mensaje en curso
+_conversaciones: ContextVar[Optional[Dict[str, "Conversacion"]]] = ContextVar("conversaciones", default=None)
+
+
+class Conversacion:
+    """
+    Estado del chat de un usuario mientras se procesa un mensaje.
+    Los cambios se aplican sobre el usuario en memoria (las lecturas posteriores
+    del mismo mensaje los ven) y se comparan con el estado cargado al guardar.
+    """
+
+    def __init__(self, usuario: User):
+        self.usuario = usuario
+        self.wa_id = usuario.id
+        self.paso_inicial = usuario.estado_chat.paso_actual
+        self._contexto_inicial = deepcopy(usuario.estado_chat.contexto_temporal)
+
+    @property
+    def rol(self) -> Optional[str]:
+        return self.usuario.rol
+
+    @property
+    def paso(self) -> Optional[str]:
+        return self.usuario.estado_chat.paso_actual
+
+    @property
+    def contexto(self) -> dict:
+        return self.usuario.estado_chat.contexto_temporal or {}
+
+    def transicionar(self, paso_actual: Optional[str] = None, contexto: Optional[dict] = None):
+        """Misma semántica que UserRepository.transicionar_estado (None = sin cambios, {} = limpiar)"""
+        if paso_actual is not None:
+            self.usuario.estado_chat.paso_actual = paso_actual
+        if contexto is not None:
+            self.usuario.estado_chat.contexto_temporal = contexto
+
+    def cambios(self) -> Tuple[Optional[str], Optional[dict]]:
+        """(paso_actual, contexto) a escribir; None en los que no cambiaron"""
+        paso = self.paso if self.paso != self.paso_inicial else None
+        contexto = self.usuario.estado_chat.contexto_temporal
+        if contexto == self._contexto_inicial:
+            contexto = None
+        elif contexto is None:
+            contexto = {}
+        return paso, contexto
+
+    @property
+    def modificada(self) -> bool:
+        return self.cambios() != (None, None)
+
+
+class CacheUsuarios:
+    """Caché TTL + LRU de usuarios compartida por los hilos del proceso"""
+
+    def __init__(self, ttl: float = SESION_CACHE_TTL, max_entradas: int = SESION_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.activa = ttl > 0
+        self._entradas: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._escucha = None
+        self._metricas = {"aciertos": 0, "fallos": 0, "invalidaciones": 0,
+                          "conversaciones_guardadas": 0, "conversaciones_sin_cambios": 0,
+                          "conversaciones_en_conflicto": 0}
+
+    def obtener(self, wa_id: str) -> Optional[User]:
+        """Retorna una copia (los hilos no comparten instancias) o None si no está o venció"""
+        if not self.activa:
+            return None
+        with self._lock:
+            entrada = self._entradas.get(wa_id)
+            if entrada and entrada[0] > time.monotonic():
+                self._entradas.move_to_end(wa_id)
+                self._metricas["aciertos"] += 1
+                return entrada[1].model_copy(deep=True)
+            if entrada:
+                del self._entradas[wa_id]
+            self._metricas["fallos"] += 1
+        return None
+
+    def guardar(self, wa_id: str, usuario: Optional[User]):
+        if not self.activa:
+            return
+        with self._lock:
+            if usuario is None:
+                self._entradas.pop(wa_id, None)
+                return
+            self._entradas[wa_id] = (time.monotonic() + self.ttl, usuario.model_copy(deep=True))
+            self._entradas.move_to_end(wa_id)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, wa_id: str):
+        with self._lock:
+            if self._entradas.pop(wa_id, None) is not None:
+                self._metricas["invalidaciones"] += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def contar(self, metrica: str):
+        with self._lock:
+            self._metricas[metrica] += 1
+
+    def iniciar_invalidacion(self, db):
+        """Arranca (una sola vez) el hilo que escucha el change stream de "usuarios" """
+        if not self.activa or self._escucha:
+            return
+        with self._lock:
+            if self._escucha:
+                return
+            self._escucha = threading.Thread(target=self._escuchar_cambios, args=(db,),
+                                             name="sesion-change-stream", daemon=True)
+        self._escucha.start()
+
+    def _escuchar_cambios(self, db):
+        while self.activa:
+            try:
+                with db["usuarios"].watch() as cambios:
+                    for cambio in cambios:
+                        if "documentKey" in cambio:
+                            self.invalidar(cambio["documentKey"]["_id"])
+                        else:
+                            # drop / invalidate de la colección
+                            self.limpiar()
+            except Exception as e:
+                codigo = getattr(e, "code", None)
+                if codigo in (40573, 40324):
+                    # Sin replica set no hay change streams: una caché sin invalidación sería incorrecta
+                    print(f"Change streams no disponibles, caché de usuarios desactivada: {e}")
+                    self.activa = False
+                    self.limpiar()
+                    return
+                print(f"Error en change stream de usuarios, reintentando: {e}")
+                self.limpiar()
+                time.sleep(1)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas["entradas"] = len(self._entradas)
+        metricas["activa"] = self.activa
+        return metricas
+
+
+cache_usuarios = CacheUsuarios()
+
+
+@contextmanager
+def alcance_mensaje():
+    """Abre el mapa de identidad de usuarios para el procesamiento de un mensaje"""
+    token = _usuarios_mensaje.set({})
+    token_conversaciones = _conversaciones.set({})
+    try:
+        yield
+    finally:
+        _conversaciones.reset(token_conversaciones)
+        _usuarios_mensaje.reset(token)
+
+
+def _recordar(wa_id: str, usuario: Optional[User]) -> Optional[User]:
+    """Write-through: el resultado de una lectura o actualización reemplaza las copias en memoria"""
+    usuarios = _usuarios_mensaje.get()
+    if usuarios is not None:
+        usuarios[wa_id] = usuario
+    cache_usuarios.guardar(wa_id, usuario)
+    return usuario
+
+
+def _olvidar(wa_id: str):
+    usuarios = _usuarios_mensaje.get()
+    if usuarios is not None:
+        usuarios.pop(wa_id, None)
+    cache_usuarios.invalidar(wa_id)
+
+
 def obtener_usuario(wa_id: str, db) -> User:
+    usuarios = _usuarios_mensaje.get()
+    if usuarios is not None and wa_id in usuarios:
+        return usuarios[wa_id]
+    usuario = cache_usuarios.obtener(wa_id)
+    if usuario is None:
+        cache_usuarios.iniciar_invalidacion(db)
+        repo = UserRepository(db)
+        usuario = repo.find_by_id(wa_id)
+        cache_usuarios.guardar(wa_id, usuario)
+    if usuarios is not None:
+        usuarios[wa_id] = usuario
+    return usuario
+
+def _conversacion_abierta(wa_id: str) -> Optional[Conversacion]:
+    conversaciones = _conversaciones.get()
+    return conversaciones.get(wa_id) if conversaciones else None
+
+def abrir_conversacion(usuario: User) -> Conversacion:
+    """
+    Abre la conversación del usuario para el mensaje en curso (requiere alcance_mensaje).
+    Desde aquí transicionar_estado y compañía no escriben en MongoDB: acumulan en la conversación.
+    """
+    conversacion = Conversacion(usuario)
+    _conversaciones.get()[usuario.id] = conversacion
+    usuarios = _usuarios_mensaje.get()
+    usuarios[usuario.id] = usuario
+    return conversacion
+
+def guardar_conversacion(conversacion: Conversacion, db) -> Optional[User]:
+    """
+    Escribe los cambios de la conversación en un solo round-trip y la cierra.
+    Solo se aplica si el usuario sigue en el paso con el que se cargó (concurrencia optimista).
+    Retorna el usuario guardado, o None si no había cambios o el estado cambió entretanto.
+    """
+    conversaciones = _conversaciones.get()
+    if conversaciones is not None:
+        conversaciones.pop(conversacion.wa_id, None)
+    paso_actual, contexto = conversacion.cambios()
+    if paso_actual is None and contexto is None:
+        cache_usuarios.contar("conversaciones_sin_cambios")
+        return None
     repo = UserRepository(db)
-    return repo.find_by_id(wa_id)
+    usuario_actualizado = repo.transicionar_estado(conversacion.wa_id, paso_actual, contexto,
+                                                   paso_esperado=conversacion.paso_inicial)
+    if usuario_actualizado is None:
+        print(f"Cambios de la conversación de {conversacion.wa_id} descartados: el estado cambió")
+        cache_usuarios.contar("conversaciones_en_conflicto")
+        _olvidar(conversacion.wa_id)
+        return None
+    cache_usuarios.contar("conversaciones_guardadas")
+    return _recordar(conversacion.wa_id, usuario_actualizado)
 
 def crear_usuario(wa_id: str, db):
     repo = ConductorRepository(db)
     nuevo_usuario = repo.create(Conductor(_id=wa_id, rol="conductor"))
-    return nuevo_usuario
+    return _recordar(wa_id, nuevo_usuario)
 
 def actualizar_nombre(wa_id: str, nombre: str, db):
     repo = UserRepository(db)
     usuario_actualizado = repo.actualizar_nombre(wa_id, nombre)
-    return usuario_actualizado
+    return _recordar(wa_id, usuario_actualizado)
 
-def actualizar_estado_chat(wa_id: str, paso_actual: str, db):
+def transicionar_estado(wa_id: str, paso_actual: Optional[str], db, contexto: Optional[dict] = None,
+                        paso_esperado: Optional[str] = None) -> Optional[User]:
+    """
+    Cambia paso_actual y/o contexto_temporal en un solo round-trip (ver UserRepository.transicionar_estado).
+    Con una conversación abierta el cambio queda en memoria hasta guardar_conversacion.
+    Retorna None si el usuario ya no estaba en paso_esperado.
+    """
+    conversacion = _conversacion_abierta(wa_id)
+    if conversacion is not None:
+        if paso_esperado is not None and conversacion.paso != paso_esperado:
+            return None
+        conversacion.transicionar(paso_actual, contexto)
+        return conversacion.usuario
     repo = UserRepository(db)
-    usuario_actualizado = repo.actualizar_estado_chat(wa_id, paso_actual)
-    return usuario_actualizado
+    usuario_actualizado = repo.transicionar_estado(wa_id, paso_actual, contexto, paso_esperado)
+    if usuario_actualizado is None:
+        # Otro mensaje cambió el estado: descartar las copias en memoria
+        _olvidar(wa_id)
+        return None
+    return _recordar(wa_id, usuario_actualizado)
+
+def actualizar_estado_chat(wa_id: str, paso_actual: str, db):
+    return transicionar_estado(wa_id, paso_actual, db)
 
 def actualizar_estado_registro(wa_id: str, estado_registro: str, db):
     repo = UserRepository(db)
     usuario_actualizado = repo.actualizar_estado_registro(wa_id, estado_registro)
-    return usuario_actualizado
+    return _recordar(wa_id, usuario_actualizado)
 
 def actualizar_contexto_temporal(wa_id: str, contexto: dict, db):
     """
     Actualiza el contexto temporal del usuario (para guardar datos temporales durante flujos)
     """
+    if _conversacion_abierta(wa_id) is not None:
+        return transicionar_estado(wa_id, None, db, contexto=contexto)
     repo = UserRepository(db)
-    return repo.actualizar_contexto_temporal(wa_id, contexto)
\ No newline at end of file
+    return _recordar(wa_id, repo.actualizar_contexto_temporal(wa_id, contexto))
+
+def metricas() -> dict:
+    return cache_usuarios.metricas()
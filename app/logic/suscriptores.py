@@ -0,0 +1,108 @@
+"""
+Destinatarios del fan-out de cupo liberado.
+
+Los conjuntos de conductores por parqueadero (vista "suscriptores") se mantienen en
+memoria del proceso y se refrescan de forma incremental con su contador de versión,
+igual que la foto de disponibilidad (app.logic.parqueaderos). Calcular los
+destinatarios es una unión de dos conjuntos, sin consultar ni decodificar documentos.
+"""
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, Optional
+from app.repositories.suscriptores_repository import GLOBAL, SuscriptoresRepository
+
+# Cada cuánto (segundos) se consulta el contador de versión de la vista
+SUSCRIPTORES_INTERVALO = float(os.getenv("SUSCRIPTORES_INTERVALO", "1"))
+# Recarga completa periódica (cubre escrituras concurrentes que llegaron fuera de orden de versión)
+SUSCRIPTORES_RECARGA_COMPLETA = float(os.getenv("SUSCRIPTORES_RECARGA_COMPLETA", "300"))
+
+VACIO: FrozenSet[str] = frozenset()
+
+
+class CacheSuscriptores:
+    """
+    Conjuntos {parqueadero_id: frozenset(conductor_id)} compartidos por los hilos del proceso.
+    El refresco construye un diccionario nuevo y lo reemplaza; los lectores no se bloquean.
+    """
+
+    def __init__(self, intervalo: float = SUSCRIPTORES_INTERVALO, recarga_completa: float = SUSCRIPTORES_RECARGA_COMPLETA):
+        self.intervalo = intervalo
+        self.recarga_completa = recarga_completa
+        self._conjuntos: Optional[Dict[str, FrozenSet[str]]] = None
+        self._version = 0
+        self._verificado_en = 0.0
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+        self._metricas = {"recargas_completas": 0, "refrescos": 0, "verificaciones": 0, "conjuntos_releidos": 0}
+
+    def conjuntos(self, db) -> Dict[str, FrozenSet[str]]:
+        """Retorna los conjuntos vigentes, refrescándolos si pasó el intervalo"""
+        conjuntos = self._conjuntos
+        if conjuntos is not None and time.monotonic() - self._verificado_en < self.intervalo:
+            return conjuntos
+        # Solo un hilo refresca; los demás siguen con los conjuntos actuales
+        if conjuntos is not None and not self._lock.acquire(blocking=False):
+            return conjuntos
+        if conjuntos is None:
+            self._lock.acquire()
+        try:
+            self._refrescar(SuscriptoresRepository(db))
+        finally:
+            self._lock.release()
+        return self._conjuntos
+
+    def _refrescar(self, repo: SuscriptoresRepository):
+        """
+        La versión guardada es la mayor entre los documentos leídos, no la del contador:
+        agregar/quitar incrementan el contador antes de escribir el conjunto (sin transacción
+        en un mongod standalone) y un refresco entre ambas escrituras perdería ese conjunto.
+        """
+        ahora = time.monotonic()
+        if self._conjuntos is None or ahora - self._cargado_en >= self.recarga_completa:
+            cambiados = repo.find_cambiados_desde(-1)
+            self._conjuntos = {clave: conductores for clave, conductores, _ in cambiados}
+            self._version = max((version for _, _, version in cambiados), default=0)
+            self._cargado_en = ahora
+            self._metricas["recargas_completas"] += 1
+            self._metricas["conjuntos_releidos"] += len(cambiados)
+        else:
+            self._metricas["verificaciones"] += 1
+            # El contador solo indica si hay algo nuevo
+            if repo.obtener_version() != self._version:
+                cambiados = repo.find_cambiados_desde(self._version)
+                if cambiados:
+                    conjuntos = dict(self._conjuntos)
+                    for clave, conductores, _ in cambiados:
+                        conjuntos[clave] = conductores
+                    self._conjuntos = conjuntos
+                    self._version = max([self._version] + [version for _, _, version in cambiados])
+                    self._metricas["refrescos"] += 1
+                    self._metricas["conjuntos_releidos"] += len(cambiados)
+        self._verificado_en = ahora
+
+    def destinatarios(self, parqueadero_id: str, db) -> FrozenSet[str]:
+        """Conductores a notificar: suscritos al parqueadero más los globales"""
+        conjuntos = self.conjuntos(db)
+        return conjuntos.get(parqueadero_id, VACIO) | conjuntos.get(GLOBAL, VACIO)
+
+    def invalidar(self):
+        """Fuerza la verificación de versión en la próxima lectura"""
+        self._verificado_en = 0.0
+
+    def metricas(self) -> dict:
+        conjuntos = self._conjuntos or {}
+        return {
+            **self._metricas,
+            "version": self._version,
+            "parqueaderos": sum(1 for clave in conjuntos if clave != GLOBAL),
+            "globales": len(conjuntos.get(GLOBAL, VACIO))
+        }
+
+
+cache_suscriptores = CacheSuscriptores()
+
+
+def obtener_destinatarios(parqueadero_id: str, db) -> FrozenSet[str]:
+    """Conductores suscritos al parqueadero (específicos y globales), desde la caché en memoria"""
+    return cache_suscriptores.destinatarios(parqueadero_id, db)
@@ -1,31 +1,43 @@
-from app.models.whatsapp_webhook import WebhookPayload, Message
+from app.models.whatsapp_webhook import Message
 from app.services.whatsapp_message_service import WhatsAppMessageService
 from app.services.whatsapp_flow_service import WhatsAppFlowService
+from app.services.contenedor_servicios import ContenedorServicios
+from app.logic.maquina_estados import CUALQUIER_PASO, MaquinaEstados
 import app.logic.sesion as sesion
 
-def handle_message(payload: WebhookPayload, db):
+def es_mensaje_procesable(msg: Message) -> bool:
     """
-    Entrada principal para procesar mensajes (texto e interactivos)
+    Indica si el mensaje es de un tipo que el bot procesa (texto, interactivo o ubicación)
     """
-    msg = payload.get_mensaje()
-    if not msg:
-        return None
-    
-    # Verificar si es mensaje de texto o interactivo
-    if not msg.text and not msg.interactive:
+    return bool(msg and (msg.text or msg.interactive or msg.location))
+
+def handle_message(msg: Message, db, servicios: ContenedorServicios = None):
+    """
+    Entrada principal para procesar un mensaje (texto, interactivo o ubicación).
+    servicios es el contenedor creado en el lifespan; sin él se arma uno para este mensaje.
+    """
+    if not es_mensaje_procesable(msg):
         return None
     
-    # Inicializar servicios
-    message_service = WhatsAppMessageService(db)
-    flow_service = WhatsAppFlowService(db)
+    # Servicios compartidos del proceso (sin estado por mensaje)
+    servicios = servicios or ContenedorServicios(db)
+    message_service = servicios.message_service
+    flow_service = servicios.flow_service
     
-    usuario = handle_auth(msg, db, message_service)
-    if not usuario:
-        return None
-    
-    # Solo procesar si el usuario está completamente registrado
-    if usuario.estado_registro == "completo":
-        handle_user_interaction(msg, usuario, db, message_service, flow_service)
+    # El usuario se lee de MongoDB una sola vez por mensaje y su estado se guarda una sola vez
+    with sesion.alcance_mensaje():
+        usuario = handle_auth(msg, db, message_service)
+        if not usuario:
+            return None
+        
+        # Solo procesar si el usuario está completamente registrado
+        if usuario.estado_registro == "completo":
+            conversacion = sesion.abrir_conversacion(usuario)
+            try:
+                handle_user_interaction(msg, conversacion, message_service, flow_service)
+            finally:
+                # Los mensajes ya enviados reflejan el nuevo estado: guardarlo aunque el flujo falle
+                sesion.guardar_conversacion(conversacion, db)
     
     return usuario
 
@@ -62,10 +74,7 @@ def handle_usuario_nombre(msg: Message, db, message_service: WhatsAppMessageServ
     # Para registro de nombre, solo aceptar mensajes de texto
     if msg.type == "text" and msg.text and msg.text.body:
         # Actualizar nombre y completar registro
-        sesion.actualizar_nombre(msg.from_, msg.text.body, db)
-        
-        # Obtener usuario actualizado
-        usuario = sesion.obtener_usuario(msg.from_, db)
+        usuario = sesion.actualizar_nombre(msg.from_, msg.text.body, db)
         if usuario and usuario.estado_registro == "completo":
             message_service.confirmar_registro(msg.from_, usuario.name)
             return usuario
@@ -98,91 +107,67 @@ def extract_message_text(msg: Message) -> str:
     print("Debug - No se pudo extraer texto")
     return ""
 
-def handle_user_interaction(msg: Message, usuario, db, message_service: WhatsAppMessageService, flow_service: WhatsAppFlowService):
+def handle_user_interaction(msg: Message, conversacion: sesion.Conversacion,
+                            message_service: WhatsAppMessageService, flow_service: WhatsAppFlowService):
     """
     Maneja la interacción principal con usuarios registrados (texto e interactivos)
     """
     text = extract_message_text(msg)
     
-    if usuario.estado_chat.paso_actual == "inicial":
-        message_service.saludar_usuario_registrado(msg.from_, usuario.name)
+    if conversacion.paso == "inicial":
+        message_service.saludar_usuario_registrado(msg.from_, conversacion.usuario.name)
     
+    # La ubicación compartida se atiende en cualquier paso del flujo
+    if msg.type == "location" and msg.location:
+        handle_ubicacion(msg, conversacion.usuario, flow_service, message_service)
+    elif not maquina_estados.despachar(conversacion, text, flow_service):
+        message_service.error_rol_no_reconocido(msg.from_)
+
+def handle_ubicacion(msg: Message, usuario, flow_service: WhatsAppFlowService, message_service: WhatsAppMessageService):
+    """
+    Maneja una ubicación compartida: el conductor recibe los parqueaderos cercanos
+    y el gestor registra la ubicación de su parqueadero
+    """
+    latitud, longitud = msg.location.latitude, msg.location.longitude
     if usuario.rol == "conductor":
-        handle_conductor(text, msg.from_, db, flow_service)
+        flow_service.handle_parqueaderos_cercanos(msg.from_, latitud, longitud)
     elif usuario.rol == "gestor_parqueadero":
-        handle_gestor(text, msg.from_, db, flow_service)
+        flow_service.handle_ubicacion_gestor(msg.from_, latitud, longitud)
     else:
         message_service.error_rol_no_reconocido(msg.from_)
 
-def handle_conductor(text: str, user_id: str, db, flow_service: WhatsAppFlowService):
-    """
-    Maneja el flujo específico para conductores
-    """
-    usuario = sesion.obtener_usuario(user_id, db)
-    current_step = usuario.estado_chat.paso_actual
-    
-    # Comandos especiales que funcionan en cualquier momento
-    if text.lower().startswith("desuscribir"):
-        flow_service.handle_desuscribir_comando(text, user_id)
-        return
-    
-    # Mostrar menú si está en estado inicial o si solicita el menú
-    if current_step == "inicial" or text in ["menu", "menú"]:
-        flow_service.mostrar_menu_conductor(user_id)
-        return
-    
-    # Procesar opciones del menú principal
-    if current_step == "esperando_opcion_menu":
-        flow_service.handle_conductor_menu_option(text, user_id)
-        return
-    
-    # Procesar opciones del menú de suscripciones
-    if current_step == "esperando_opcion_suscripcion":
-        flow_service.handle_suscripcion_menu_option(text, user_id)
-        return
-    
-    # Procesar selección de parqueadero para suscripción
-    if current_step == "esperando_seleccion_parqueadero":
-        flow_service.handle_seleccion_parqueadero_suscripcion(text, user_id)
-        return
-    
-    # Procesar selección de parqueadero para ver detalles
-    if current_step == "viendo_parqueaderos":
-        flow_service.handle_seleccion_parqueadero_detalles(text, user_id)
-        return
-    
-    # Gestionar suscripciones (desuscribir)
-    if current_step == "gestionando_suscripciones":
-        flow_service.handle_gestion_suscripciones(text, user_id)
-        return
-    
-    # Si no está en ningún flujo específico, mostrar menú
-    flow_service.mostrar_menu_conductor(user_id)
 
-def handle_gestor(text: str, user_id: str, db, flow_service: WhatsAppFlowService):
-    """
-    Maneja el flujo específico para gestores de parqueaderos
-    """
-    usuario = sesion.obtener_usuario(user_id, db)
-    current_step = usuario.estado_chat.paso_actual
-    
-    # Mostrar menú si está en estado inicial o si solicita el menú
-    if current_step == "inicial" or text in ["menu", "menú"]:
-        flow_service.mostrar_menu_gestor(user_id)
-        return
-    
-    # Procesar opciones del menú
-    if current_step == "esperando_opcion_menu":
-        flow_service.handle_gestor_menu_option(text, user_id)
-        return
-    
-    if current_step == "esperando_cambio_cupos":
-        flow_service.handle_cupos_gestor(text, user_id)
-        return
-    
-    if current_step == "esperando_confirmacion_cupos":
-        flow_service.handle_cupos_gestor(text, user_id)
-        return
-    
-    # Si no está en ningún flujo específico, mostrar menú
-    flow_service.mostrar_menu_gestor(user_id)
\ No newline at end of file
+# ===== TABLAS DE TRANSICIONES =====
+# (rol, paso, entrada) -> método de WhatsAppFlowService; ver el orden de resolución en maquina_estados
+
+def _con_texto(metodo: str):
+    """Manejador que delega en flow_service.<metodo>(texto, user_id)"""
+    return lambda conversacion, text, flow_service: getattr(flow_service, metodo)(text, conversacion.wa_id)
+
+def _sin_texto(metodo: str):
+    """Manejador que delega en flow_service.<metodo>(user_id)"""
+    return lambda conversacion, text, flow_service: getattr(flow_service, metodo)(conversacion.wa_id)
+
+maquina_estados = MaquinaEstados()
+COMANDOS_MENU = ["menu", "menú"]
+
+# Conductor
+maquina_estados.registrar("conductor", CUALQUIER_PASO, _con_texto("handle_desuscribir_comando"), prefijo="desuscribir")
+maquina_estados.registrar("conductor", CUALQUIER_PASO, _sin_texto("mostrar_menu_conductor"), textos=COMANDOS_MENU)
+maquina_estados.registrar("conductor", "inicial", _sin_texto("mostrar_menu_conductor"))
+maquina_estados.registrar("conductor", "esperando_opcion_menu", _con_texto("handle_conductor_menu_option"))
+maquina_estados.registrar("conductor", "esperando_opcion_suscripcion", _con_texto("handle_suscripcion_menu_option"))
+maquina_estados.registrar("conductor", "esperando_seleccion_parqueadero",
+                          _con_texto("handle_seleccion_parqueadero_suscripcion"))
+maquina_estados.registrar("conductor", "viendo_parqueaderos", _con_texto("handle_seleccion_parqueadero_detalles"))
+maquina_estados.registrar("conductor", "gestionando_suscripciones", _con_texto("handle_gestion_suscripciones"))
+maquina_estados.registrar("conductor", CUALQUIER_PASO, _sin_texto("mostrar_menu_conductor"))
+
+# Gestor de parqueadero
+maquina_estados.registrar("gestor_parqueadero", CUALQUIER_PASO, _sin_texto("mostrar_menu_gestor"), textos=COMANDOS_MENU)
+maquina_estados.registrar("gestor_parqueadero", "inicial", _sin_texto("mostrar_menu_gestor"))
+maquina_estados.registrar("gestor_parqueadero", "esperando_opcion_menu", _con_texto("handle_gestor_menu_option"))
+# handle_cupos_gestor deriva a la confirmación según el paso
+maquina_estados.registrar("gestor_parqueadero", ["esperando_cambio_cupos", "esperando_confirmacion_cupos"],
+                          _con_texto("handle_cupos_gestor"))
+maquina_estados.registrar("gestor_parqueadero", CUALQUIER_PASO, _sin_texto("mostrar_menu_gestor"))
@@ -1,21 +1,53 @@
+import json
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import Depends, FastAPI, Request, HTTPException
-from fastapi.responses import Response, HTMLResponse, FileResponse
+from typing import Iterator, Literal, Optional
+from fastapi import Depends, FastAPI, Request, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from app.routers import webhook_router
-from app.database.db_conn import get_db
+from app.database.db_conn import get_db, inicializar_base_datos, imprimir_reporte
+from app.logic.despachador import despachador
+from app.logic.deduplicador import deduplicador
+from app.logic.registro_mensajes import registro_mensajes
+import app.logic.sesion as sesion
+from app.logic.parqueaderos import snapshot_disponibilidad
+from app.logic.suscriptores import cache_suscriptores
+from app.services.whatsapp_client import obtener_cliente_whatsapp
 from app.models.database_models import Parqueadero, User, GestorParqueadero, Suscripcion
 from app.repositories.user_repositories import ConductorRepository, UserRepository, GestorParqueaderoRepository
 from app.repositories.parqueadero_repository import ParqueaderoRepository
 from app.repositories.suscripcion_repository import SuscripcionRepository
-from app.services.notification_service import NotificationService
-from app.services.whatsapp_interactive_service import WhatsAppInteractiveService
+from app.services.contenedor_servicios import ContenedorServicios, obtener_servicios
+
+# Listados de administración (GET /usuarios, GET /parqueaderos)
+LISTADO_LIMITE_POR_DEFECTO = 100
+LISTADO_LIMITE_MAXIMO = 1000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicializa la base de datos y el grafo de servicios una sola vez al arrancar;
+    al apagar cierra el despachador y escribe el registro de mensajes pendiente
+    """
+    reporte = inicializar_base_datos(get_db())
+    imprimir_reporte(reporte)
+    app.state.reporte_inicializacion = reporte
+    app.state.servicios = ContenedorServicios(get_db(), reporte["transacciones"])
+    registro_mensajes.iniciar(get_db())
+    yield
+    # Espera a que terminen los mensajes en proceso antes de apagar
+    despachador.cerrar()
+    registro_mensajes.cerrar()
+    obtener_cliente_whatsapp().cerrar()
 
 app = FastAPI(
     title="Sistema de Parqueaderos API",
     description="API para gestión de parqueaderos y notificaciones vía WhatsApp",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Montar archivos estáticos
@@ -36,6 +68,7 @@ async def read_root():
         "status": "active",
         "endpoints": {
             "health": "/health",
+            "metricas": "/metricas",
             "privacy_policy": "/privacy-policy",
             "terms_of_service": "/terms-of-service",
             "docs": "/docs",
@@ -55,6 +88,22 @@ async def health_check():
         "service": "fastapi"
     }
 
+@app.get("/metricas")
+async def metricas():
+    """
+    Métricas internas del proceso (profundidad de colas, tiempos de espera, rechazos)
+    """
+    return {
+        "instance": os.getenv("INSTANCE_ID", "unknown"),
+        "despachador": despachador.metricas(),
+        "deduplicador": deduplicador.metricas(),
+        "registro_mensajes": registro_mensajes.metricas(),
+        "cache_usuarios": sesion.metricas(),
+        "parqueaderos": snapshot_disponibilidad.metricas(),
+        "suscriptores": cache_suscriptores.metricas(),
+        "whatsapp": obtener_cliente_whatsapp().metricas()
+    }
+
 @app.get("/privacy-policy", response_class=HTMLResponse)
 async def privacy_policy():
     """
@@ -141,11 +190,39 @@ async def asociar_parqueadero_gestor(wa_id: str, parqueadero_id: str, db = Depen
     gestor_repo.update(gestor)
     return {"message": "Parqueadero asociado al gestor exitosamente"}
 
+def _respuesta_listado(repo, filtro: dict, despues_de: Optional[str], limite: Optional[int], formato: str) -> Response:
+    """
+    Página por keyset sobre _id. En JSON retorna la lista (a lo sumo LISTADO_LIMITE_MAXIMO) y el
+    cursor de la página siguiente en el header X-Cursor-Siguiente. En NDJSON transmite un documento
+    por línea mientras lee el cursor de MongoDB (sin limite, hasta el final), en memoria constante.
+    """
+    if formato == "ndjson":
+        modelos = repo.iter_pagina(filtro, despues_de, limite)
+        return StreamingResponse(_lineas_ndjson(modelos), media_type="application/x-ndjson")
+    
+    limite = min(limite or LISTADO_LIMITE_POR_DEFECTO, LISTADO_LIMITE_MAXIMO)
+    pagina = [m.model_dump(by_alias=True) for m in repo.iter_pagina(filtro, despues_de, limite)]
+    headers = {"X-Cursor-Siguiente": str(pagina[-1]["_id"])} if len(pagina) == limite else {}
+    return JSONResponse(jsonable_encoder(pagina), headers=headers)
+
+def _lineas_ndjson(modelos: Iterator) -> Iterator[str]:
+    for modelo in modelos:
+        yield json.dumps(modelo.model_dump(mode="json", by_alias=True), ensure_ascii=False) + "\n"
+
 @app.get("/usuarios")
-async def listar_usuarios(db = Depends(get_db)):
-    user_repo = UserRepository(db)
-    usuarios = user_repo.find_all()
-    return [u.model_dump(by_alias=True) for u in usuarios]
+def listar_usuarios(rol: Optional[str] = None, despues_de: Optional[str] = None,
+                    limite: Optional[int] = Query(None, ge=1), formato: Literal["json", "ndjson"] = "json",
+                    db = Depends(get_db)):
+    """
+    Lista los usuarios paginando por _id
+    - *Parametros opcionales:*
+        - rol: "conductor" o "gestor_parqueadero" (el filtro se aplica en MongoDB)
+        - despues_de: cursor (header X-Cursor-Siguiente de la página anterior)
+        - limite: tamaño de la página (por defecto 100, máximo 1000 en JSON)
+        - formato: "ndjson" para exportar transmitiendo un usuario por línea
+    """
+    filtro = {"rol": rol} if rol else {}
+    return _respuesta_listado(UserRepository(db), filtro, despues_de, limite, formato)
 
 @app.post("/crear-parqueadero")
 async def crear_parqueadero(parqueadero_crear: Parqueadero, db = Depends(get_db)):
@@ -177,21 +254,24 @@ async def obtener_parqueadero_gestor(gestor_id: str, db = Depends(get_db)):
     return parqueadero.model_dump(by_alias=True)
 
 @app.get("/parqueaderos")
-async def listar_parqueaderos(db = Depends(get_db)):
-    parqueadero_repo = ParqueaderoRepository(db)
-    parqueaderos = parqueadero_repo.find_all()
-    return [p.model_dump(by_alias=True) for p in parqueaderos]
+def listar_parqueaderos(despues_de: Optional[str] = None, limite: Optional[int] = Query(None, ge=1),
+                        formato: Literal["json", "ndjson"] = "json", db = Depends(get_db)):
+    """
+    Lista los parqueaderos paginando por _id (mismos parámetros que GET /usuarios, sin rol)
+    """
+    return _respuesta_listado(ParqueaderoRepository(db), {}, despues_de, limite, formato)
 
 # ===== ENDPOINTS DE SUSCRIPCIONES Y NOTIFICACIONES =====
 
 @app.post("/suscribir-conductor")
-async def suscribir_conductor(conductor_id: str, parqueadero_id: str = None, db = Depends(get_db)):
+async def suscribir_conductor(conductor_id: str, parqueadero_id: str = None,
+                              servicios: ContenedorServicios = Depends(obtener_servicios)):
     """
     Suscribe un conductor a notificaciones de parqueaderos
     - conductor_id: WhatsApp ID del conductor (ej: 573001234567)
     - parqueadero_id: ID del parqueadero específico (opcional, si no se envía se suscribe a todos)
     """
-    notification_service = NotificationService(db)
+    notification_service = servicios.notification_service
     result = notification_service.suscribir_conductor(conductor_id, parqueadero_id)
     
     if not result["success"]:
@@ -200,13 +280,14 @@ async def suscribir_conductor(conductor_id: str, parqueadero_id: str = None, db
     return {"message": result["message"]}
 
 @app.delete("/desuscribir-conductor")
-async def desuscribir_conductor(conductor_id: str, parqueadero_id: str = None, db = Depends(get_db)):
+async def desuscribir_conductor(conductor_id: str, parqueadero_id: str = None,
+                                servicios: ContenedorServicios = Depends(obtener_servicios)):
     """
     Desuscribe un conductor de notificaciones
     - conductor_id: WhatsApp ID del conductor
     - parqueadero_id: ID del parqueadero específico (opcional, si no se envía se desuscribe de todos)
     """
-    notification_service = NotificationService(db)
+    notification_service = servicios.notification_service
     result = notification_service.desuscribir_conductor(conductor_id, parqueadero_id)
     
     if not result["success"]:
@@ -215,11 +296,12 @@ async def desuscribir_conductor(conductor_id: str, parqueadero_id: str = None, d
     return {"message": result["message"]}
 
 @app.get("/conductor/{conductor_id}/suscripciones")
-async def listar_suscripciones_conductor(conductor_id: str, db = Depends(get_db)):
+async def listar_suscripciones_conductor(conductor_id: str,
+                                         servicios: ContenedorServicios = Depends(obtener_servicios)):
     """
     Lista las suscripciones activas de un conductor
     """
-    notification_service = NotificationService(db)
+    notification_service = servicios.notification_service
     suscripciones = notification_service.listar_suscripciones_conductor(conductor_id)
     return {"suscripciones": suscripciones}
 
@@ -228,42 +310,52 @@ async def actualizar_cupos_parqueadero(
     parqueadero_id: str, 
     cupos_libres: str, 
     tiene_cupos: bool, 
-    db = Depends(get_db)
+    rango_cupos: str = None,
+    estado_ocupacion: str = None,
+    db = Depends(get_db),
+    servicios: ContenedorServicios = Depends(obtener_servicios)
 ):
     """
-    Actualiza los cupos de un parqueadero y envía notificaciones automáticamente
+    Actualiza los cupos de un parqueadero y encola las notificaciones a suscriptores
     - parqueadero_id: ID del parqueadero
     - cupos_libres: Número de cupos libres (como string)
     - tiene_cupos: Boolean indicando si hay cupos disponibles
+    - *Parametros opcionales:*
+        - rango_cupos: Rango aproximado de cupos (ej: "6-15 cupos")
+        - estado_ocupacion: Descripción del estado (ej: "Algunos cupos disponibles")
     """
     parqueadero_repo = ParqueaderoRepository(db)
-    notification_service = NotificationService(db)
+    cola_service = servicios.cola_notificaciones_service
     
     # Verificar que el parqueadero existe
     parqueadero = parqueadero_repo.find_by_id(parqueadero_id)
     if not parqueadero:
         raise HTTPException(status_code=404, detail="Parqueadero no encontrado")
     
-    # Actualizar cupos y enviar notificaciones
+    # Actualizar cupos y encolar notificaciones (las envía app.worker)
     result = parqueadero_repo.actualizar_cupos_con_notificacion(
         parqueadero_id, 
         cupos_libres, 
         tiene_cupos, 
-        notification_service
+        rango_cupos,
+        estado_ocupacion,
+        cola_service
     )
     
     return {
         "message": "Cupos actualizados exitosamente",
         "parqueadero": result["parqueadero"],
-        "notificaciones_enviadas": result["notificaciones_enviadas"]
+        "notificacion_encolada": result["notificacion_encolada"],
+        "trabajo_id": result["trabajo_id"]
     }
 
 @app.post("/test-interactive-message")
-async def test_interactive_message(user_phone: str, message_type: str = "menu"):
+async def test_interactive_message(user_phone: str, message_type: str = "menu",
+                                   servicios: ContenedorServicios = Depends(obtener_servicios)):
     """
     Endpoint para probar mensajes interactivos de WhatsApp
     """
-    interactive_service = WhatsAppInteractiveService()
+    interactive_service = servicios.interactive_service
     
     try:
         if message_type == "conductor_menu":
@@ -1,12 +1,20 @@
 import uuid
-from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
+from app.utils.tiempo_utils import normalizar_fecha
 
 class EstadoChat(BaseModel):
-    ultima_interaccion: Optional[str] = None  # Timestamp de la última interacción
+    ultima_interaccion: Optional[datetime] = None  # Momento de la última interacción (UTC)
     paso_actual: Optional[str] = None  # Paso actual en el flujo de conversación
     contexto_temporal: Optional[dict] = None  # Para guardar datos temporales durante flujos
 
+    # Documentos sin migrar guardan texto en hora de Bogotá (ver app.database.migrar_fechas)
+    @field_validator("ultima_interaccion", mode="before")
+    @classmethod
+    def normalizar_fecha_legada(cls, valor):
+        return normalizar_fecha(valor)
+
 class Parqueadero(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
     name: str 
@@ -16,7 +24,15 @@ class Parqueadero(BaseModel):
     cupos_libres: str = "0"  # Valor por defecto para compatibilidad
     rango_cupos: Optional[str] = None  # Nuevo campo para almacenar el rango
     estado_ocupacion: Optional[str] = None  # Descripción del estado (lleno, pocos cupos, etc.)
-    ultima_actualizacion: Optional[str] = None
+    ultima_actualizacion: Optional[datetime] = None  # UTC
+    version: Optional[int] = None  # Contador de escrituras (ver ParqueaderoRepository._siguiente_version)
+    coordenadas: Optional[dict] = None  # Punto GeoJSON: {"type": "Point", "coordinates": [longitud, latitud]}
+
+    @field_validator("ultima_actualizacion", mode="before")
+    @classmethod
+    def normalizar_fecha_legada(cls, valor):
+        return normalizar_fecha(valor)
+
     class Config:
         allow_population_by_field_name = True
 
@@ -40,8 +56,43 @@ class Suscripcion(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
     conductor_id: str  # WhatsApp ID del conductor
     parqueadero_id: Optional[str] = None  # Si es None, está suscrito a todos los parqueaderos
-    fecha_suscripcion: Optional[str] = None
+    fecha_suscripcion: Optional[datetime] = None  # UTC
     activa: bool = True
+
+    @field_validator("fecha_suscripcion", mode="before")
+    @classmethod
+    def normalizar_fecha_legada(cls, valor):
+        return normalizar_fecha(valor)
     
     class Config:
-        allow_population_by_field_name = True
\ No newline at end of file
+        allow_population_by_field_name = True
+class Trabajo(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), alias="_id")
+    tipo: str  # Ej: "cupo_liberado"
+    datos: dict = {}
+    estado: str = "pendiente"  # "pendiente", "procesando", "completado" o "fallido" (dead-letter)
+    intentos: int = 0
+    max_intentos: int = 5
+    disponible_en: datetime  # No se procesa antes de este momento (backoff)
+    bloqueado_hasta: Optional[datetime] = None  # Lease del trabajador que lo procesa
+    trabajador: Optional[str] = None
+    ultimo_error: Optional[str] = None
+    resultado: Optional[dict] = None
+    creado_en: Optional[datetime] = None
+    actualizado_en: Optional[datetime] = None
+
+    class Config:
+        allow_population_by_field_name = True
+
+
+class BuzonNotificaciones(BaseModel):
+    """Avisos de cupo liberado acumulados para un conductor (se envían como un solo resumen)"""
+    id: str = Field(alias="_id")  # WhatsApp ID del conductor
+    parqueaderos: List[str] = []  # Parqueaderos con cupo liberado pendientes de avisar
+    enviar_en: Optional[datetime] = None  # Cierre de la ventana de agrupación (None = nada pendiente)
+    envios: List[datetime] = []  # Últimos envíos, para el tope por periodo
+    intentos_fallidos: int = 0
+    reclamado_por: Optional[str] = None
+
+    class Config:
+        allow_population_by_field_name = True
@@ -43,6 +43,20 @@ class Interactive(BaseModel):
     button_reply: Optional[ButtonReply] = None
     list_reply: Optional[ListReply] = None
 
+class Location(BaseModel):
+    """
+    Modelo para mensajes de ubicación compartida
+    Atributos:
+        latitude (float): Latitud en grados.
+        longitude (float): Longitud en grados.
+        name (Optional[str]): Nombre del lugar, si el usuario eligió uno.
+        address (Optional[str]): Dirección del lugar, si viene.
+    """
+    latitude: float
+    longitude: float
+    name: Optional[str] = None
+    address: Optional[str] = None
+
 class Message(BaseModel):
     """
     Modelo para los mensajes en el webhook de WhatsApp
@@ -50,9 +64,10 @@ class Message(BaseModel):
         from_ (str): Número de teléfono del remitente.
         id (str): ID del mensaje.
         timestamp (str): Marca de tiempo del mensaje.
-        type (str): Tipo de mensaje (por ejemplo, "text", "interactive").
+        type (str): Tipo de mensaje (por ejemplo, "text", "interactive", "location").
         text (Optional[Text]): Contenido del mensaje, si es de tipo texto.
         interactive (Optional[Interactive]): Contenido interactivo, si es de tipo interactive.
+        location (Optional[Location]): Ubicación compartida, si es de tipo location.
     """
     from_: str = Field(..., alias="from")  # "from" es palabra reservada en Python
     id: str
@@ -60,6 +75,7 @@ class Message(BaseModel):
     type: str
     text: Optional[Text] = None
     interactive: Optional[Interactive] = None
+    location: Optional[Location] = None
 
 class Metadata(BaseModel):
     """
@@ -134,6 +150,21 @@ class WebhookPayload(BaseModel):
     object: str
     entry: List[Entry]
 
+    def get_mensajes(self) -> List[Message]:
+        """
+        Método para obtener todos los mensajes del payload.
+        Meta puede agrupar varias entradas, cambios y mensajes en un mismo POST.
+        
+        Retorna:
+            List[Message]: Los mensajes en el orden en que vienen en el payload.
+        """
+        return [
+            mensaje
+            for entry in self.entry
+            for change in entry.changes
+            for mensaje in (change.value.messages or [])
+        ]
+
     def get_mensaje(self) -> Message:
         """
         Método para obtener el primer mensaje del payload.
@@ -141,6 +172,5 @@ class WebhookPayload(BaseModel):
         Retorna:
             Message: El primer mensaje encontrado en el payload.
         """
-        if len(self.entry) > 0 and len(self.entry[0].changes) > 0 and self.entry[0].changes[0].value.messages:
-            return self.entry[0].changes[0].value.messages[0]
-        return None
+        mensajes = self.get_mensajes()
+        return mensajes[0] if mensajes else None
@@ -1,23 +1,151 @@
+import os
+import typing
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from pymongo import IndexModel
 from pymongo.database import Database
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Type
 from pydantic import BaseModel
+from app.database.verificar_planes import coleccion
+from app.utils.tiempo_utils import normalizar_fecha
+
+# Los documentos leídos de nuestras colecciones ya se validaron al escribirse (modelo + validador
+# de esquema): se construyen sin validar. "0" vuelve a validar cada lectura con pydantic.
+LECTURAS_CONFIABLES = os.getenv("LECTURAS_CONFIABLES", "1") == "1"
+# Documentos por lote que trae cada getMore de los iteradores (iter_*)
+ITER_BATCH_SIZE = int(os.getenv("ITER_BATCH_SIZE", "500"))
+
+
+def _tipos_de(anotacion) -> Tuple[type, ...]:
+    """Tipos concretos de una anotación (Optional[X] -> (X, NoneType))"""
+    return typing.get_args(anotacion) or (anotacion,)
+
+
+@lru_cache(maxsize=None)
+def _plan_construccion(model: Type[BaseModel]) -> Tuple[Dict[str, Type[BaseModel]], Tuple[str, ...]]:
+    """(submodelos por alias, campos de fecha por alias) de un modelo"""
+    submodelos, fechas = {}, []
+    for nombre, campo in model.model_fields.items():
+        clave = campo.alias or nombre
+        for tipo in _tipos_de(campo.annotation):
+            if isinstance(tipo, type) and issubclass(tipo, BaseModel):
+                submodelos[clave] = tipo
+            elif tipo is datetime:
+                fechas.append(clave)
+    return submodelos, tuple(fechas)
+
+
+def construir_confiable(model: Type[BaseModel], document: Dict[str, Any]) -> BaseModel:
+    """
+    Construye el modelo sin validación (model_construct) a partir de un documento propio.
+    Solo se convierten los submodelos y las fechas guardadas como texto (documentos sin migrar).
+    """
+    submodelos, fechas = _plan_construccion(model)
+    if submodelos or fechas:
+        document = dict(document)
+        for clave, submodelo in submodelos.items():
+            valor = document.get(clave)
+            if isinstance(valor, dict):
+                document[clave] = construir_confiable(submodelo, valor)
+        for clave in fechas:
+            if isinstance(document.get(clave), str):
+                document[clave] = normalizar_fecha(document[clave])
+    return model.model_construct(**document)
+
+
+@lru_cache(maxsize=256)
+def fila_para(campos: Tuple[str, ...]) -> type:
+    """Tipo de fila liviana (namedtuple) para una proyección: id + campos ("a.b" -> a_b)"""
+    return namedtuple("Fila", ["id"] + [campo.replace(".", "_") for campo in campos])
+
+
+def _valor(document: Dict[str, Any], campo: str) -> Any:
+    for parte in campo.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(parte)
+    return document
+
 
 class BaseRepository:
+    # Índices que necesitan las consultas del repositorio; se crean al arrancar
+    indices: List[IndexModel] = []
+
     def __init__(self, db: Database, collection_name: str, model: Type[BaseModel]):
         self.db = db
-        self.collection = db[collection_name]
+        self.collection = coleccion(db, collection_name)
         self.model = model
 
+    def construir(self, document: Dict[str, Any]) -> BaseModel:
+        """Modelo a partir de un documento leído de la colección"""
+        if LECTURAS_CONFIABLES:
+            return construir_confiable(self.model, document)
+        return self.model(**document)
+
+    def _fila(self, document: Dict[str, Any], campos: Tuple[str, ...]) -> tuple:
+        return fila_para(campos)(document["_id"], *(_valor(document, campo) for campo in campos))
+
+    def crear_indices(self) -> List[str]:
+        """Crea los índices declarados (idempotente). Retorna sus nombres"""
+        if not self.indices:
+            return []
+        return self.collection.create_indexes(self.indices)
+
     def find_all(self) -> List[BaseModel]:
-        documents = self.collection.find()
-        encontrados = []
-        for doc in documents:
-            encontrados.append(self.model(**doc))
-        return encontrados
+        return list(self.iter_all())
+
+    def iter_documentos(self, filtro: Optional[Dict[str, Any]] = None, proyeccion: Optional[Dict[str, Any]] = None,
+                        batch_size: int = ITER_BATCH_SIZE, **opciones) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre los documentos con un cursor por lotes de batch_size: la memoria no depende
+        del tamaño de la colección. El cursor se cierra aunque el consumidor no termine.
+        """
+        cursor = self.collection.find(filtro or {}, proyeccion, batch_size=batch_size, **opciones)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def iter_all(self, filtro: Optional[Dict[str, Any]] = None, batch_size: int = ITER_BATCH_SIZE) -> Iterator[BaseModel]:
+        """Como find_all pero generador (y con filtro opcional)"""
+        for doc in self.iter_documentos(filtro, batch_size=batch_size):
+            yield self.construir(doc)
+
+    def iter_pagina(self, filtro: Optional[Dict[str, Any]] = None, despues_de: Optional[str] = None,
+                    limite: Optional[int] = None, batch_size: int = ITER_BATCH_SIZE) -> Iterator[BaseModel]:
+        """
+        Recorre en orden de _id a partir del cursor despues_de (keyset: sin skip).
+        Sin limite sigue hasta el final; el _id del último elemento es el cursor de la página siguiente.
+        """
+        filtro = dict(filtro or {})
+        if despues_de is not None:
+            filtro["_id"] = {"$gt": despues_de}
+        opciones = {"sort": [("_id", 1)]}
+        if limite:
+            opciones["limit"] = limite
+        for doc in self.iter_documentos(filtro, batch_size=min(batch_size, limite or batch_size), **opciones):
+            yield self.construir(doc)
     
     def find_by_id(self, id: str) -> Optional[BaseModel]:
         document = self.collection.find_one({"_id": id})
-        return self.model(**document) if document else None
+        return self.construir(document) if document else None
+
+    def find_filas(self, filtro: Dict[str, Any], campos: Sequence[str], **opciones) -> List[tuple]:
+        """
+        Solo los campos indicados (proyección en MongoDB) como filas livianas:
+        namedtuple con id y los campos, ej. find_filas({...}, ["name"]) -> [Fila(id=..., name=...)].
+        opciones se pasan a find (sort, limit, ...).
+        """
+        campos = tuple(campos)
+        documents = self.collection.find(filtro, {campo: 1 for campo in campos}, **opciones)
+        return [self._fila(doc, campos) for doc in documents]
+
+    def find_fila_by_id(self, id: str, campos: Sequence[str]) -> Optional[tuple]:
+        """find_filas para un solo documento por _id"""
+        campos = tuple(campos)
+        document = self.collection.find_one({"_id": id}, {campo: 1 for campo in campos})
+        return self._fila(document, campos) if document else None
 
     def create(self, data: Dict[str, Any]) -> BaseModel:
         validated_data = self.model(**data)
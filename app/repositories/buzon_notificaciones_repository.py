@@ -0,0 +1,81 @@
+from app.repositories.base_repository import BaseRepository
+from app.models.database_models import BuzonNotificaciones
+from pymongo import IndexModel, UpdateOne
+from pymongo.database import Database
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List
+
+class BuzonNotificacionesRepository(BaseRepository):
+    """
+    Un documento por conductor con los parqueaderos que liberaron cupo y aún no se le avisan.
+    Los avisos que llegan dentro de la ventana se agrupan en el mismo documento.
+    """
+    indices = [IndexModel([("enviar_en", 1)], name="enviar_en")]
+
+    def __init__(self, db: Database):
+        super().__init__(db, "buzon_notificaciones", BuzonNotificaciones)
+
+    def acumular(self, conductor_ids: Iterable[str], parqueadero_id: str, ventana_segundos: float) -> int:
+        """
+        Agrega el parqueadero al buzón de cada conductor en un solo bulk_write.
+        Si el buzón no tenía nada pendiente, la ventana empieza ahora; si ya estaba abierta,
+        se conserva su cierre (el aviso sale en el mismo resumen).
+        Retorna la cantidad de buzones tocados.
+        """
+        enviar_en = datetime.now(timezone.utc) + timedelta(seconds=ventana_segundos)
+        # Update con pipeline: permite "agregar sin duplicar" y "fijar solo si está vacío" en una operación
+        pipeline = [{"$set": {
+            "parqueaderos": {"$setUnion": [{"$ifNull": ["$parqueaderos", []]}, [parqueadero_id]]},
+            "enviar_en": {"$ifNull": ["$enviar_en", enviar_en]},
+            "envios": {"$ifNull": ["$envios", []]},
+            "intentos_fallidos": {"$ifNull": ["$intentos_fallidos", 0]}
+        }}]
+        operaciones = [UpdateOne({"_id": conductor_id}, pipeline, upsert=True) for conductor_id in set(conductor_ids)]
+        if not operaciones:
+            return 0
+        self.collection.bulk_write(operaciones, ordered=False)
+        return len(operaciones)
+
+    def reclamar_vencidos(self, trabajador: str, limite: int, duracion_lease: float) -> List[BuzonNotificaciones]:
+        """
+        Toma hasta `limite` buzones cuya ventana ya cerró. Mientras se envían, su enviar_en
+        se corre a la duración del lease (si el trabajador se cae, otro los retoma después).
+        """
+        ahora = datetime.now(timezone.utc)
+        ids = [doc["_id"] for doc in self.collection.find({"enviar_en": {"$lte": ahora}}, {"_id": 1}, limit=limite)]
+        if not ids:
+            return []
+        self.collection.update_many(
+            {"_id": {"$in": ids}, "enviar_en": {"$lte": ahora}},
+            {"$set": {"enviar_en": ahora + timedelta(seconds=duracion_lease), "reclamado_por": trabajador}}
+        )
+        documents = self.collection.find({"_id": {"$in": ids}, "reclamado_por": trabajador})
+        return [self.construir(doc) for doc in documents]
+
+    def confirmar_envio(self, conductor_id: str, avisados: List[str], ventana_segundos: float,
+                        max_envios: int, enviado: bool = True) -> bool:
+        """
+        Quita del buzón los parqueaderos ya avisados (o descartados) y, si hubo mensaje, registra el envío.
+        Si llegaron otros mientras se enviaba, quedan en una ventana nueva.
+        """
+        ahora = datetime.now(timezone.utc)
+        restantes = {"$setDifference": ["$parqueaderos", avisados]}
+        cambios = {
+            "parqueaderos": restantes,
+            "enviar_en": {"$cond": [{"$gt": [{"$size": restantes}, 0]},
+                                    ahora + timedelta(seconds=ventana_segundos), None]},
+            "reclamado_por": None,
+            "intentos_fallidos": 0
+        }
+        if enviado:
+            cambios["envios"] = {"$slice": [{"$concatArrays": ["$envios", [ahora]]}, -max_envios]}
+        result = self.collection.update_one({"_id": conductor_id}, [{"$set": cambios}])
+        return result.modified_count > 0
+
+    def posponer(self, conductor_id: str, hasta: datetime, fallido: bool = False) -> bool:
+        """Reprograma el buzón sin tocar sus parqueaderos (tope alcanzado o envío fallido)"""
+        update = {"$set": {"enviar_en": hasta, "reclamado_por": None}}
+        if fallido:
+            update["$inc"] = {"intentos_fallidos": 1}
+        result = self.collection.update_one({"_id": conductor_id}, update)
+        return result.modified_count > 0
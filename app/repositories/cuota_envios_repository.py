@@ -0,0 +1,51 @@
+from pymongo import IndexModel
+from pymongo.database import Database
+from app.database.verificar_planes import coleccion
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+class CuotaEnviosRepository:
+    """
+    Contadores de envíos por ventana de un segundo, compartidos entre procesos
+    (web y worker) que envían por el mismo número de WhatsApp.
+    Documentos: {_id: "<clave>:<ventana>", enviados: int} y {_id: "<clave>:pausa", hasta: float}.
+    """
+    # TTL: MongoDB borra las ventanas viejas
+    indices = [IndexModel([("expira_en", 1)], name="expira_en_ttl", expireAfterSeconds=0)]
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.collection = coleccion(db, "cuotas_envio")
+
+    def crear_indices(self) -> List[str]:
+        return self.collection.create_indexes(self.indices)
+
+    def reservar(self, clave: str, ventana: int, tope: int) -> bool:
+        """Suma un envío a la ventana si no llegó al tope (un solo $inc atómico)"""
+        expira_en = datetime.fromtimestamp(ventana, timezone.utc) + timedelta(minutes=1)
+        for _ in range(2):
+            try:
+                self.collection.update_one(
+                    {"_id": f"{clave}:{ventana}", "enviados": {"$lt": tope}},
+                    {"$inc": {"enviados": 1}, "$setOnInsert": {"expira_en": expira_en}},
+                    upsert=True
+                )
+                return True
+            except DuplicateKeyError:
+                # La ventana existe y está llena, o dos procesos la crearon a la vez: se reintenta una vez
+                continue
+        return False
+
+    def pausar(self, clave: str, hasta: float):
+        """Pausa los envíos de todos los procesos hasta el instante hasta (epoch, segundos)"""
+        self.collection.update_one(
+            {"_id": f"{clave}:pausa"},
+            {"$max": {"hasta": hasta},
+             "$set": {"expira_en": datetime.fromtimestamp(hasta, timezone.utc) + timedelta(minutes=1)}},
+            upsert=True
+        )
+
+    def pausa_hasta(self, clave: str) -> float:
+        documento = self.collection.find_one({"_id": f"{clave}:pausa"})
+        return documento["hasta"] if documento else 0.0
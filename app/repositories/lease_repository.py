@@ -0,0 +1,48 @@
+from pymongo import IndexModel
+from pymongo.database import Database
+from app.database.verificar_planes import coleccion
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+class LeaseRepository:
+    """
+    Leases (candados con expiración) por clave, compartidos entre procesos.
+    Un lease vencido puede ser tomado por otro dueño (el proceso anterior se cayó).
+    """
+    # TTL: MongoDB borra los leases abandonados (adquirir ya ignora los vencidos)
+    indices = [IndexModel([("expira_en", 1)], name="expira_en_ttl", expireAfterSeconds=60)]
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.collection = coleccion(db, "leases")
+
+    def crear_indices(self) -> List[str]:
+        return self.collection.create_indexes(self.indices)
+
+    def adquirir(self, clave: str, dueno: str, duracion_segundos: float) -> bool:
+        """Toma el lease si está libre, vencido o ya es nuestro"""
+        ahora = datetime.now(timezone.utc)
+        try:
+            self.collection.update_one(
+                {"_id": clave, "$or": [{"expira_en": {"$lt": ahora}}, {"dueno": dueno}]},
+                {"$set": {"dueno": dueno, "expira_en": ahora + timedelta(seconds=duracion_segundos)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # El documento existe, no está vencido y es de otro dueño
+            return False
+
+    def renovar(self, clave: str, dueno: str, duracion_segundos: float) -> bool:
+        """Extiende el vencimiento del lease. False si ya no es nuestro (venció y lo tomó otro)"""
+        result = self.collection.update_one(
+            {"_id": clave, "dueno": dueno},
+            {"$set": {"expira_en": datetime.now(timezone.utc) + timedelta(seconds=duracion_segundos)}}
+        )
+        return result.matched_count > 0
+
+    def liberar(self, clave: str, dueno: str) -> bool:
+        """Libera el lease solo si sigue siendo nuestro"""
+        result = self.collection.delete_one({"_id": clave, "dueno": dueno})
+        return result.deleted_count > 0
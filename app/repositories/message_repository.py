@@ -1,14 +1,54 @@
+import os
 from app.repositories.base_repository import BaseRepository
 from app.models.whatsapp_webhook import Message
+from pymongo import IndexModel
+from pymongo.errors import BulkWriteError
+from typing import List, Set
+
+CODIGO_DUPLICADO = 11000
+# Días que se conserva el registro de mensajes (índice TTL sobre recibido_en); "0" lo conserva siempre.
+# Cambiar el valor con el índice ya creado requiere collMod o borrar el índice
+MENSAJES_TTL_DIAS = int(os.getenv("MENSAJES_TTL_DIAS", "30"))
+
 class MessageRepository(BaseRepository):
+    indices = [
+        # El ID de WhatsApp es único: los reintentos de Meta no se registran dos veces
+        IndexModel([("id", 1)], unique=True, name="id_unico")
+    ] + ([
+        # MongoDB borra en segundo plano los mensajes vencidos: la colección no crece sin límite.
+        # También sirve a los rangos por fecha de la exportación (app.database.exportar_archivo)
+        IndexModel([("recibido_en", 1)], expireAfterSeconds=MENSAJES_TTL_DIAS * 86400, name="ttl_recibido_en")
+    ] if MENSAJES_TTL_DIAS > 0 else [
+        IndexModel([("recibido_en", 1)], name="recibido_en")
+    ]) + [
+        # obtener_mensajes: historial de un usuario, más recientes primero
+        IndexModel([("from_", 1), ("recibido_en", -1)], name="from_recibido_en")
+    ]
+
     def __init__(self, db):
         super().__init__(db, "mensajes", Message)
 
-    def crear_mensaje(self, mensaje: dict):
-        self.collection.insert_one(mensaje)
+    def crear_mensajes_nuevos(self, mensajes: List[dict]) -> Set[str]:
+        """
+        Inserta el lote ignorando los mensajes ya registrados (índice único en "id").
+        Retorna los IDs que realmente eran nuevos.
+        """
+        if not mensajes:
+            return set()
+        ids = {mensaje["id"] for mensaje in mensajes}
+        try:
+            self.collection.insert_many(mensajes, ordered=False)
+            return ids
+        except BulkWriteError as e:
+            errores = e.details.get("writeErrors", [])
+            if any(error["code"] != CODIGO_DUPLICADO for error in errores):
+                raise
+            duplicados = {mensajes[error["index"]]["id"] for error in errores}
+            return ids - duplicados
 
-    def obtener_mensajes(self, usuario_id):
-        return self.collection.find({"to": usuario_id})
+    def obtener_mensajes(self, usuario_id: str, limite: int = 50) -> List[dict]:
+        """Últimos mensajes recibidos de un usuario, más recientes primero (el remitente se guarda en "from_")"""
+        return list(self.collection.find({"from_": usuario_id}, sort=[("recibido_en", -1)], limit=limite))
 
     def eliminar_mensaje(self, mensaje_id):
         self.collection.delete_one({"_id": mensaje_id})
\ No newline at end of file
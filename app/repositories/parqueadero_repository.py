@@ -1,35 +1,146 @@
 from app.repositories.base_repository import BaseRepository
 from app.models.database_models import Parqueadero
-from app.utils.tiempo_utils import obtener_tiempo_bogota
+from app.utils.tiempo_utils import ahora, normalizar_fecha
+from pymongo import IndexModel, ReturnDocument
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+def punto_geojson(latitud: float, longitud: float) -> dict:
+    """Punto GeoJSON (MongoDB espera [longitud, latitud])"""
+    return {"type": "Point", "coordinates": [float(longitud), float(latitud)]}
+
+
 class ParqueaderoRepository(BaseRepository):   
+    indices = [
+        IndexModel([("name", 1)], name="name"),
+        # find_pagina_con_cupos: filtra por tiene_cupos y ordena por (ultima_actualizacion, _id)
+        # para paginar por keyset
+        IndexModel([("tiene_cupos", 1), ("ultima_actualizacion", -1), ("_id", -1)], name="disponibles_keyset"),
+        # find_cambiados_desde (refresco incremental de la foto de disponibilidad)
+        IndexModel([("version", 1)], name="version"),
+        # find_cercanos_con_cupos ($geoNear); los parqueaderos sin coordenadas no entran al índice
+        IndexModel([("coordenadas", "2dsphere")], name="coordenadas_geo")
+    ]
+
     def __init__(self, db):
           super().__init__(db, "parqueaderos", Parqueadero)
 
     def find_by_name(self, name: str) -> Parqueadero:
         data = self.collection.find_one({"name": name})
         if data:
-            return self.model(**data)
+            return self.construir(data)
         return None
     
+    def find_many_by_ids(self, ids: Iterable[str], campos: Optional[List[str]] = None) -> Dict[str, dict]:
+        """
+        Busca varios parqueaderos en una sola consulta ($in sobre _id).
+        Con campos se proyecta solo lo necesario (ej. ["name"]); por eso retorna
+        documentos y no modelos. Resultado: {_id: documento}
+        """
+        ids = list(dict.fromkeys(i for i in ids if i))
+        if not ids:
+            return {}
+        proyeccion = {campo: 1 for campo in campos} if campos else None
+        documents = self.collection.find({"_id": {"$in": ids}}, proyeccion)
+        return {doc["_id"]: doc for doc in documents}
+
     def create(self, data) -> Parqueadero | dict:
          if self.find_by_name(data["name"]):
              return {"error": "Parqueadero con este nombre ya existe"}
-         data["ultima_actualizacion"] = obtener_tiempo_bogota()
+         data["ultima_actualizacion"] = ahora()
+         data["version"] = self._siguiente_version()
          return super().create(data)
 
-    def find_with_available_spots(self) -> list[Parqueadero]:
-        documents = self.collection.find({"tiene_cupos": True}, sort=[("ultima_actualizacion", -1)])
-        parqueaderos = []
-        for doc in documents:
-            doc["_id"] = str(doc["_id"])  # Convertir ObjectId a string
-            parqueaderos.append(Parqueadero(**doc))
-        return parqueaderos
-    
+    def _siguiente_version(self) -> int:
+        """
+        Incrementa el contador global de versión de parqueaderos (colección "contadores").
+        Cada escritura marca el documento con la nueva versión; así la foto en memoria
+        (app.logic.parqueaderos) solo relee lo que cambió.
+        """
+        contador = self.db["contadores"].find_one_and_update(
+            {"_id": "parqueaderos"}, {"$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return contador["version"]
+
+    def obtener_version(self) -> int:
+        """Versión actual del contador (0 si nunca hubo escrituras)"""
+        contador = self.db["contadores"].find_one({"_id": "parqueaderos"})
+        return contador["version"] if contador else 0
+
+    def find_cambiados_desde(self, version: int) -> List[Parqueadero]:
+        """Parqueaderos escritos después de la versión indicada"""
+        documents = self.collection.find({"version": {"$gt": version}})
+        return [self.construir(doc) for doc in documents]
+
+    def find_pagina_con_cupos(self, limite: int, despues_de: Optional[Sequence] = None,
+                              desde: Optional[Sequence] = None,
+                              antes_de: Optional[Sequence] = None) -> Tuple[List[Parqueadero], bool]:
+        """
+        Página de parqueaderos con cupos ordenados por (ultima_actualizacion, _id) descendente,
+        paginando por keyset: el cursor es la clave (ultima_actualizacion, _id) de un parqueadero.
+        - despues_de: los siguientes al cursor (página siguiente)
+        - desde: a partir del cursor, incluido (repetir la página actual)
+        - antes_de: los anteriores al cursor (página anterior)
+        Lee como máximo limite + 1 documentos. Retorna (parqueaderos, hay_mas en esa dirección).
+        """
+        filtro = {"tiene_cupos": True}
+        orden = -1
+        # Sin fecha el cursor trae None y el documento null (que ordena antes que cualquier fecha)
+        if despues_de or desde:
+            ultima, _id = despues_de or desde
+            ultima = normalizar_fecha(ultima)
+            filtro["$or"] = [{"ultima_actualizacion": ultima, "_id": {"$lt" if despues_de else "$lte": _id}}]
+            if ultima:
+                # $lt con una fecha no alcanza a los null: los sin fecha siguen después de cualquier fecha
+                filtro["$or"] += [{"ultima_actualizacion": {"$lt": ultima}}, {"ultima_actualizacion": None}]
+        elif antes_de:
+            ultima, _id = antes_de
+            ultima = normalizar_fecha(ultima)
+            filtro["$or"] = [
+                {"ultima_actualizacion": {"$gt": ultima} if ultima else {"$ne": None}},
+                {"ultima_actualizacion": ultima, "_id": {"$gt": _id}}
+            ]
+            orden = 1
+        documents = self.collection.find(
+            filtro, sort=[("ultima_actualizacion", orden), ("_id", orden)], limit=limite + 1
+        )
+        parqueaderos = [self.construir(doc) for doc in documents]
+        hay_mas = len(parqueaderos) > limite
+        parqueaderos = parqueaderos[:limite]
+        if orden == 1:
+            parqueaderos.reverse()
+        return parqueaderos, hay_mas
+
+    def find_cercanos_con_cupos(self, latitud: float, longitud: float, limite: int,
+                                distancia_maxima: Optional[float] = None) -> List[Tuple[Parqueadero, float]]:
+        """
+        Los parqueaderos con cupos más cercanos a un punto, en una sola consulta $geoNear
+        sobre el índice 2dsphere. Retorna [(parqueadero, distancia en metros)], del más cercano al más lejano.
+        """
+        geo_near = {
+            "near": punto_geojson(latitud, longitud),
+            "distanceField": "distancia_m",
+            "query": {"tiene_cupos": True},
+            "spherical": True
+        }
+        if distancia_maxima:
+            geo_near["maxDistance"] = distancia_maxima
+        documents = self.collection.aggregate([{"$geoNear": geo_near}, {"$limit": limite}])
+        return [(self.construir(doc), doc["distancia_m"]) for doc in documents]
+
+    def actualizar_coordenadas(self, parking_id: str, latitud: float, longitud: float) -> Optional[Parqueadero]:
+        """Guarda la ubicación del parqueadero como punto GeoJSON"""
+        return self.update(parking_id, {
+            "coordenadas": punto_geojson(latitud, longitud),
+            "version": self._siguiente_version()
+        })
+
     def actualizar_cupos(self, parking_id: str, cupos_libres: str, tiene_cupos: bool) -> Parqueadero:
         update_data = {
             "cupos_libres": cupos_libres,
             "tiene_cupos": tiene_cupos,
-            "ultima_actualizacion": obtener_tiempo_bogota()
+            "ultima_actualizacion": ahora(),
+            "version": self._siguiente_version()
         }
         self.collection.update_one({"_id": parking_id}, {"$set": update_data})
         return self.find_by_id(parking_id)
@@ -42,24 +153,30 @@ class ParqueaderoRepository(BaseRepository):
             "tiene_cupos": tiene_cupos,
             "rango_cupos": rango_cupos,
             "estado_ocupacion": estado_ocupacion,
-            "ultima_actualizacion": obtener_tiempo_bogota()
+            "ultima_actualizacion": ahora(),
+            "version": self._siguiente_version()
         }
         self.collection.update_one({"_id": parking_id}, {"$set": update_data})
         return self.find_by_id(parking_id)
     
     def actualizar_cupos_con_notificacion(self, parking_id: str, cupos_libres: str, tiene_cupos: bool, 
-                                          rango_cupos: str, estado_ocupacion: str, notification_service) -> dict:
-        """Actualiza cupos con rango y envía notificaciones si hay cupos disponibles"""
+                                          rango_cupos: str, estado_ocupacion: str, cola_service,
+                                          gestor_id: str = None) -> dict:
+        """
+        Actualiza cupos con rango y, si hay cupos disponibles, encola la notificación a suscriptores.
+        El envío lo realiza el worker de la cola (app.worker), fuera del request.
+        """
         parqueadero = self.actualizar_cupos_con_rango(
             parking_id, cupos_libres, tiene_cupos, rango_cupos, estado_ocupacion
         )
         
-        # Si hay cupos disponibles, notificar a suscriptores
-        notificaciones_enviadas = 0
+        # Si hay cupos disponibles, encolar notificación a suscriptores
+        trabajo = None
         if tiene_cupos and int(cupos_libres) > 0:
-            notificaciones_enviadas = notification_service.notificar_cupo_liberado(parking_id)
+            trabajo = cola_service.encolar_cupo_liberado(parking_id, gestor_id)
         
         return {
             "parqueadero": parqueadero.model_dump(by_alias=True),
-            "notificaciones_enviadas": notificaciones_enviadas
-        }
\ No newline at end of file
+            "notificacion_encolada": trabajo is not None,
+            "trabajo_id": trabajo.id if trabajo else None
+        }
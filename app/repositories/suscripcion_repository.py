@@ -1,12 +1,49 @@
 from app.repositories.base_repository import BaseRepository
 from app.models.database_models import Suscripcion
+from app.repositories.suscriptores_repository import SuscriptoresRepository
+from pymongo import IndexModel
 from pymongo.database import Database
-from app.utils.tiempo_utils import obtener_tiempo_bogota
+from app.utils.tiempo_utils import ahora
 from typing import List, Optional
 
+
+def soporta_transacciones(db: Database) -> bool:
+    """MongoDB solo admite transacciones en un replica set o detrás de mongos (sharding)"""
+    hello = db.client.admin.command("hello")
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
 class SuscripcionRepository(BaseRepository):
-    def __init__(self, db: Database):
+    # Parciales sobre activa: las inactivas se conservan como histórico pero nunca se consultan
+    indices = [
+        # find_suscripciones_by_parqueadero (cada rama del $or, incluida parqueadero_id None)
+        IndexModel([("parqueadero_id", 1)], name="parqueadero_activas",
+                   partialFilterExpression={"activa": True}),
+        # find_active_suscripcion, find_suscripciones_by_conductor y desactivaciones
+        IndexModel([("conductor_id", 1), ("parqueadero_id", 1)], name="conductor_parqueadero_activas",
+                   partialFilterExpression={"activa": True}),
+        # Rangos por fecha de la exportación (app.database.exportar_archivo), activas e inactivas
+        IndexModel([("fecha_suscripcion", 1)], name="fecha_suscripcion")
+    ]
+
+    def __init__(self, db: Database, transacciones: Optional[bool] = None):
+        """
+        transacciones: si el servidor las admite (lo detecta inicializar_base_datos y lo
+        pasa ContenedorServicios); None lo consulta al servidor al construir el repositorio.
+        """
         super().__init__(db, "suscripciones", Suscripcion)
+        self.suscriptores_repo = SuscriptoresRepository(db)
+        self.transacciones = soporta_transacciones(db) if transacciones is None else transacciones
+
+    def _en_transaccion(self, operacion):
+        """
+        Ejecuta operacion(session) en una transacción: la suscripción y la vista de
+        suscriptores cambian juntas. Sin replica set se ejecuta sin transacción.
+        """
+        if not self.transacciones:
+            return operacion(None)
+        with self.db.client.start_session() as session:
+            return session.with_transaction(operacion)
 
     def create_suscripcion(self, conductor_id: str, parqueadero_id: Optional[str] = None) -> Suscripcion:
         """Crea una nueva suscripción"""
@@ -15,13 +52,19 @@ class SuscripcionRepository(BaseRepository):
         if existing:
             return existing
         
-        data = {
+        suscripcion = self.model(**{
             "conductor_id": conductor_id,
             "parqueadero_id": parqueadero_id,
-            "fecha_suscripcion": obtener_tiempo_bogota(),
+            "fecha_suscripcion": ahora(),
             "activa": True
-        }
-        return super().create(data)
+        })
+        
+        def crear(session):
+            self.collection.insert_one(suscripcion.model_dump(by_alias=True), session=session)
+            self.suscriptores_repo.agregar(parqueadero_id, conductor_id, session)
+        
+        self._en_transaccion(crear)
+        return suscripcion
 
     def find_active_suscripcion(self, conductor_id: str, parqueadero_id: Optional[str] = None) -> Optional[Suscripcion]:
         """Busca una suscripción activa específica"""
@@ -32,22 +75,25 @@ class SuscripcionRepository(BaseRepository):
             filter_dict["parqueadero_id"] = None
             
         document = self.collection.find_one(filter_dict)
-        return self.model(**document) if document else None
+        return self.construir(document) if document else None
 
     def find_suscripciones_by_conductor(self, conductor_id: str) -> List[Suscripcion]:
         """Obtiene todas las suscripciones activas de un conductor"""
         documents = self.collection.find({"conductor_id": conductor_id, "activa": True})
-        return [self.model(**doc) for doc in documents]
+        return [self.construir(doc) for doc in documents]
 
     def find_suscripciones_by_parqueadero(self, parqueadero_id: str) -> List[Suscripcion]:
-        """Obtiene todas las suscripciones activas para un parqueadero específico"""
+        """
+        Obtiene todas las suscripciones activas para un parqueadero específico.
+        Para el fan-out solo se necesitan los conductores: usar app.logic.suscriptores.
+        """
         documents = self.collection.find({
             "$or": [
                 {"parqueadero_id": parqueadero_id, "activa": True},
                 {"parqueadero_id": None, "activa": True}  # Suscripciones globales
             ]
         })
-        return [self.model(**doc) for doc in documents]
+        return [self.construir(doc) for doc in documents]
 
     def desactivar_suscripcion(self, conductor_id: str, parqueadero_id: Optional[str] = None) -> bool:
         """Desactiva una suscripción específica"""
@@ -57,13 +103,25 @@ class SuscripcionRepository(BaseRepository):
         else:
             filter_dict["parqueadero_id"] = None
             
-        result = self.collection.update_one(filter_dict, {"$set": {"activa": False}})
-        return result.modified_count > 0
+        
+        def desactivar(session):
+            result = self.collection.update_one(filter_dict, {"$set": {"activa": False}}, session=session)
+            if result.modified_count:
+                self.suscriptores_repo.quitar([parqueadero_id], conductor_id, session)
+            return result.modified_count > 0
+        
+        return self._en_transaccion(desactivar)
 
     def desactivar_todas_suscripciones(self, conductor_id: str) -> int:
         """Desactiva todas las suscripciones de un conductor"""
-        result = self.collection.update_many(
-            {"conductor_id": conductor_id, "activa": True},
-            {"$set": {"activa": False}}
-        )
-        return result.modified_count
\ No newline at end of file
+        filtro = {"conductor_id": conductor_id, "activa": True}
+        
+        def desactivar(session):
+            parqueadero_ids = [doc.get("parqueadero_id") for doc in
+                               self.collection.find(filtro, {"parqueadero_id": 1}, session=session)]
+            result = self.collection.update_many(filtro, {"$set": {"activa": False}}, session=session)
+            if result.modified_count:
+                self.suscriptores_repo.quitar(parqueadero_ids, conductor_id, session)
+            return result.modified_count
+        
+        return self._en_transaccion(desactivar)
\ No newline at end of file
@@ -0,0 +1,84 @@
+from pymongo import IndexModel, ReturnDocument
+from pymongo.database import Database
+from app.database.verificar_planes import coleccion
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+# Clave de la vista para las suscripciones globales (parqueadero_id None)
+GLOBAL = "*"
+
+class SuscriptoresRepository:
+    """
+    Vista materializada de las suscripciones activas: un documento por parqueadero
+    {_id: parqueadero_id, conductores: [conductor_id, ...], version: int}, y uno con _id "*"
+    para las globales. La mantiene SuscripcionRepository en la misma transacción que
+    cada alta o baja; así el fan-out no decodifica un documento por suscripción.
+    """
+    indices = [IndexModel([("version", 1)], name="version")]
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.collection = coleccion(db, "suscriptores")
+
+    def crear_indices(self) -> List[str]:
+        return self.collection.create_indexes(self.indices)
+
+    def _siguiente_version(self, session=None) -> int:
+        contador = self.db["contadores"].find_one_and_update(
+            {"_id": "suscriptores"}, {"$inc": {"version": 1}},
+            upsert=True, return_document=ReturnDocument.AFTER, session=session
+        )
+        return contador["version"]
+
+    def obtener_version(self) -> int:
+        """Versión actual del contador (0 si nunca hubo escrituras)"""
+        contador = self.db["contadores"].find_one({"_id": "suscriptores"})
+        return contador["version"] if contador else 0
+
+    def agregar(self, parqueadero_id: Optional[str], conductor_id: str, session=None):
+        self.collection.update_one(
+            {"_id": parqueadero_id or GLOBAL},
+            {"$addToSet": {"conductores": conductor_id}, "$set": {"version": self._siguiente_version(session)}},
+            upsert=True, session=session
+        )
+
+    def quitar(self, parqueadero_ids: Iterable[Optional[str]], conductor_id: str, session=None):
+        claves = list({parqueadero_id or GLOBAL for parqueadero_id in parqueadero_ids})
+        if not claves:
+            return
+        self.collection.update_many(
+            {"_id": {"$in": claves}},
+            {"$pull": {"conductores": conductor_id}, "$set": {"version": self._siguiente_version(session)}},
+            session=session
+        )
+
+    def find_cambiados_desde(self, version: int) -> List[Tuple[str, FrozenSet[str], int]]:
+        """Conjuntos escritos después de la versión indicada: [(clave, conductores, version)]"""
+        documents = self.collection.find({"version": {"$gt": version}})
+        return [(doc["_id"], frozenset(doc.get("conductores", ())), doc["version"]) for doc in documents]
+
+    def find_conductores(self, parqueadero_id: str) -> FrozenSet[str]:
+        """Conductores del parqueadero más los globales, en una consulta"""
+        documents = self.collection.find({"_id": {"$in": [parqueadero_id, GLOBAL]}}, {"conductores": 1})
+        conductores = set()
+        for doc in documents:
+            conductores.update(doc.get("conductores", ()))
+        return frozenset(conductores)
+
+    def reconstruir(self) -> int:
+        """
+        Recalcula la vista desde la colección suscripciones (migración o reparación).
+        Retorna la cantidad de conjuntos escritos.
+        """
+        version = self._siguiente_version()
+        self.db["suscripciones"].aggregate([
+            {"$match": {"activa": True}},
+            {"$group": {"_id": {"$ifNull": ["$parqueadero_id", GLOBAL]}, "conductores": {"$addToSet": "$conductor_id"}}},
+            {"$set": {"version": version}},
+            {"$merge": {"into": "suscriptores", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ])
+        # Los conjuntos que no salieron en la agregación ya no tienen suscripciones activas
+        self.collection.update_many({"version": {"$ne": version}}, {"$set": {"conductores": [], "version": version}})
+        return self.collection.count_documents({"version": version})
+
+    def esta_vacia(self) -> bool:
+        return self.collection.find_one({}, {"_id": 1}) is None
@@ -0,0 +1,99 @@
+from app.repositories.base_repository import BaseRepository
+from app.models.database_models import Trabajo
+from pymongo import IndexModel, ReturnDocument
+from pymongo.database import Database
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+class TrabajoRepository(BaseRepository):
+    """Cola de trabajos en segundo plano persistida en MongoDB"""
+    # Una rama del $or de reclamar_siguiente por índice
+    indices = [
+        IndexModel([("estado", 1), ("disponible_en", 1)], name="pendientes_disponibles"),
+        IndexModel([("estado", 1), ("bloqueado_hasta", 1)], name="procesando_lease")
+    ]
+
+    def __init__(self, db: Database):
+        super().__init__(db, "trabajos", Trabajo)
+
+    def encolar(self, tipo: str, datos: dict, max_intentos: int = 5) -> Trabajo:
+        """Crea un trabajo pendiente listo para procesarse de inmediato"""
+        ahora = datetime.now(timezone.utc)
+        return super().create({
+            "tipo": tipo,
+            "datos": datos,
+            "max_intentos": max_intentos,
+            "disponible_en": ahora,
+            "creado_en": ahora,
+            "actualizado_en": ahora
+        })
+
+    def reclamar_siguiente(self, trabajador: str, duracion_lease: int) -> Optional[Trabajo]:
+        """
+        Toma atómicamente el siguiente trabajo disponible.
+        También recupera trabajos 'procesando' cuyo lease expiró (trabajador caído).
+        """
+        ahora = datetime.now(timezone.utc)
+        document = self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"estado": "pendiente", "disponible_en": {"$lte": ahora}},
+                    {"estado": "procesando", "bloqueado_hasta": {"$lt": ahora}}
+                ]
+            },
+            {
+                "$set": {
+                    "estado": "procesando",
+                    "trabajador": trabajador,
+                    "bloqueado_hasta": ahora + timedelta(seconds=duracion_lease),
+                    "actualizado_en": ahora
+                },
+                "$inc": {"intentos": 1}
+            },
+            sort=[("disponible_en", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        return self.construir(document) if document else None
+
+    def completar(self, trabajo_id: str, resultado: dict) -> bool:
+        """Marca el trabajo como completado"""
+        result = self.collection.update_one(
+            {"_id": trabajo_id},
+            {"$set": {
+                "estado": "completado",
+                "resultado": resultado,
+                "bloqueado_hasta": None,
+                "actualizado_en": datetime.now(timezone.utc)
+            }}
+        )
+        return result.modified_count > 0
+
+    def reprogramar(self, trabajo_id: str, error: str, espera_segundos: float, datos: dict) -> bool:
+        """Devuelve el trabajo a la cola para reintentarlo después de la espera"""
+        ahora = datetime.now(timezone.utc)
+        result = self.collection.update_one(
+            {"_id": trabajo_id},
+            {"$set": {
+                "estado": "pendiente",
+                "datos": datos,
+                "ultimo_error": error,
+                "disponible_en": ahora + timedelta(seconds=espera_segundos),
+                "bloqueado_hasta": None,
+                "actualizado_en": ahora
+            }}
+        )
+        return result.modified_count > 0
+
+    def marcar_fallido(self, trabajo_id: str, error: str, resultado: Optional[dict] = None) -> bool:
+        """Envía el trabajo a dead-letter: no se vuelve a reintentar"""
+        result = self.collection.update_one(
+            {"_id": trabajo_id},
+            {"$set": {
+                "estado": "fallido",
+                "ultimo_error": error,
+                "resultado": resultado,
+                "bloqueado_hasta": None,
+                "actualizado_en": datetime.now(timezone.utc)
+            }}
+        )
+        return result.modified_count > 0
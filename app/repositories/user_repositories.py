@@ -1,20 +1,17 @@
-from app.repositories.base_repository import BaseRepository
+from app.repositories.base_repository import BaseRepository, ITER_BATCH_SIZE
 from app.models.database_models import User, Conductor, GestorParqueadero, EstadoChat
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Iterator, Optional
+from pymongo import IndexModel, ReturnDocument
 from pymongo.database import Database
-from app.utils.tiempo_utils import obtener_tiempo_bogota
+from app.utils.tiempo_utils import ahora
 
 class ConductorRepository(BaseRepository):
     def __init__(self, db: Database):
         super().__init__(db, "usuarios", Conductor)
 
-    def find_all(self) -> list[Conductor]:
-        documents = self.collection.find()
-        users = []
-        for doc in documents:
-            if doc["rol"] == "conductor":
-                users.append(Conductor(**doc))
-        return users
+    def iter_all(self, filtro: Optional[Dict[str, Any]] = None, batch_size: int = ITER_BATCH_SIZE) -> Iterator[Conductor]:
+        """Solo conductores: el filtro por rol se resuelve en MongoDB (índice rol_id)"""
+        return super().iter_all({**(filtro or {}), "rol": "conductor"}, batch_size)
 
     def create(self, data: Conductor) -> Conductor:
         validated_data = Conductor(**data.model_dump(by_alias=True))
@@ -26,13 +23,10 @@ class GestorParqueaderoRepository(BaseRepository):
     def __init__(self, db: Database):
         super().__init__(db, "usuarios", GestorParqueadero)
 
-    def find_all(self) -> list[GestorParqueadero]:
-        documents = self.collection.find()
-        users = []
-        for doc in documents:
-            if doc["rol"] == "gestor_parqueadero":
-                users.append(GestorParqueadero(**doc))
-        return users
+    def iter_all(self, filtro: Optional[Dict[str, Any]] = None,
+                 batch_size: int = ITER_BATCH_SIZE) -> Iterator[GestorParqueadero]:
+        """Solo gestores: el filtro por rol se resuelve en MongoDB (índice rol_id)"""
+        return super().iter_all({**(filtro or {}), "rol": "gestor_parqueadero"}, batch_size)
 
     def create(self, data: GestorParqueadero) -> GestorParqueadero:
         validated_data = GestorParqueadero(**data.model_dump(by_alias=True))
@@ -40,55 +34,75 @@ class GestorParqueaderoRepository(BaseRepository):
         resultado = self.find_by_id(str(result.inserted_id))
         return resultado
 
-    def obtener_parqueadero_id(self, gestor_id: str):
-        gestor = self.find_by_id(gestor_id)
-        return gestor.parqueadero_id if gestor else None
+    def obtener_parqueadero_id(self, gestor_id: str) -> Optional[str]:
+        """Solo el parqueadero_id del gestor (proyección), sin leer ni construir el usuario completo"""
+        fila = self.find_fila_by_id(gestor_id, ["parqueadero_id"])
+        return fila.parqueadero_id if fila else None
     def update(self, gestor: GestorParqueadero) -> GestorParqueadero:
         update_data = gestor.model_dump(by_alias=True)
         self.collection.update_one({"_id": gestor.id}, {"$set": update_data})
         return self.find_by_id(gestor.id)
 
 class UserRepository(BaseRepository):
+    indices = [
+        # Listados por rol (ConductorRepository/GestorParqueaderoRepository.iter_all) y
+        # paginación por keyset de GET /usuarios?rol=...
+        IndexModel([("rol", 1), ("_id", 1)], name="rol_id")
+    ]
+
     def __init__(self, db: Database):
         super().__init__(db, "usuarios", User)
 
-    def find_all(self) -> list[User]:
-        documents = self.collection.find()
-        users = [User(**doc) for doc in documents]
-        return users
-
     def create(self, data: Union[Conductor, GestorParqueadero]) -> User:
         validated_data = User(**data.model_dump(by_alias=True))
         result = self.collection.insert_one(validated_data.model_dump(by_alias=True))
         resultado = self.find_by_id(str(result.inserted_id))
         return resultado
     
+    def _actualizar(self, filtro: Dict[str, Any], update_data: Dict[str, Any]) -> Optional[User]:
+        """Aplica el $set y retorna el usuario actualizado en un solo round-trip"""
+        document = self.collection.find_one_and_update(
+            filtro, {"$set": update_data}, return_document=ReturnDocument.AFTER
+        )
+        return self.construir(document) if document else None
+
+    def transicionar_estado(self, user_id: str, paso_actual: Optional[str] = None,
+                            contexto: Optional[dict] = None, paso_esperado: Optional[str] = None) -> Optional[User]:
+        """
+        Cambia el estado de la conversación de forma atómica: paso_actual, contexto_temporal
+        (None = sin cambios, {} = limpiar) y ultima_interaccion en una sola operación.
+        Con paso_esperado solo se aplica si el usuario sigue en ese paso (concurrencia optimista);
+        retorna None si no se aplicó.
+        """
+        update_data = {"estado_chat.ultima_interaccion": ahora()}
+        if paso_actual is not None:
+            update_data["estado_chat.paso_actual"] = paso_actual
+        if contexto is not None:
+            update_data["estado_chat.contexto_temporal"] = contexto
+        filtro = {"_id": user_id}
+        if paso_esperado is not None:
+            filtro["estado_chat.paso_actual"] = paso_esperado
+        return self._actualizar(filtro, update_data)
+
     def actualizar_estado_chat(self, user_id: str, paso_actual: str) -> User:
-        update_data = {
-            "estado_chat.ultima_interaccion": obtener_tiempo_bogota(),
-            "estado_chat.paso_actual": paso_actual
-        }
-        self.collection.update_one({"_id": user_id}, {"$set": update_data})
-        return self.find_by_id(user_id)
+        return self.transicionar_estado(user_id, paso_actual)
 
     def actualizar_estado_registro(self, user_id: str, estado_registro: str) -> User:
         update_data = {
             "estado_registro": estado_registro
         }
-        self.collection.update_one({"_id": user_id}, {"$set": update_data})
-        return self.find_by_id(user_id)
+        return self._actualizar({"_id": user_id}, update_data)
+
     def actualizar_nombre(self, user_id: str, nombre: str) -> User:
         update_data = {
             "name": nombre,
             "estado_registro": "completo"  
         }
-        self.collection.update_one({"_id": user_id}, {"$set": update_data})
-        return self.find_by_id(user_id)
+        return self._actualizar({"_id": user_id}, update_data)
     
     def actualizar_contexto_temporal(self, user_id: str, contexto: dict) -> User:
         """Actualiza el contexto temporal del usuario"""
         update_data = {
             "estado_chat.contexto_temporal": contexto
         }
-        self.collection.update_one({"_id": user_id}, {"$set": update_data})
-        return self.find_by_id(user_id)
\ No newline at end of file
+        return self._actualizar({"_id": user_id}, update_data)
@@ -1,16 +1,22 @@
 import os
-from fastapi import APIRouter, Depends, Request
+from concurrent.futures import Future
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import PlainTextResponse
-from requests import request as http_request
 from app.database.db_conn import get_db
 from app.models.whatsapp_webhook import WebhookPayload
-from app.logic.send_message import send_message
-from app.logic.whatsapp import handle_message
+from app.logic.whatsapp import es_mensaje_procesable, handle_message
+from app.logic.despachador import ColaLlenaError, despachador
+from app.logic.deduplicador import deduplicador
+from app.logic.registro_mensajes import REGISTRO_DIFERIDO, registro_mensajes
 from app.repositories.message_repository import MessageRepository
+from app.services.contenedor_servicios import ContenedorServicios, obtener_servicios
+from app.utils.tiempo_utils import ahora
 
 VERIFY_TOKEN = "ClaveSuperSecreta123NoNosRoben"  
-PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
-WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
+# Si es "0", el flujo se procesa antes de responder a Meta (comportamiento anterior)
+WEBHOOK_ASINCRONO = os.getenv("WEBHOOK_ASINCRONO", "1") == "1"
+ESPERA_REGISTRO = 30  # segundos que una tarea espera a que el mensaje quede registrado
 
 router = APIRouter(prefix="/webhook")
 
@@ -28,45 +34,78 @@ async def verify_webhook(request: Request):
 
 
 @router.post("/")
-async def obtener_mensaje(payload: WebhookPayload, db= Depends(get_db)):
-    print("LLEGÓ UN MENSAJE NUEVO")
-    print(payload)
+async def obtener_mensaje(payload: WebhookPayload, db= Depends(get_db),
+                          servicios: ContenedorServicios = Depends(obtener_servicios)):
+    """
+    Recibe el webhook de Meta: valida (pydantic), persiste los mensajes y responde de inmediato.
+    Es idempotente por ID de mensaje: los reintentos de Meta no vuelven a ejecutar el flujo.
+    Se procesan todos los mensajes del payload (Meta agrupa varios bajo carga);
+    el flujo de cada uno corre en el despachador, en orden por wa_id.
+    Con REGISTRO_DIFERIDO=1 el registro en "mensajes" se escribe por lotes en segundo plano y
+    solo el LRU del proceso decide qué es nuevo (ver app.logic.registro_mensajes).
+    """
     message_repo = MessageRepository(db)
-    msg = payload.get_mensaje()
-    
-    # Procesar tanto mensajes de texto como interactivos
-    if msg and (msg.text or msg.interactive):
-        print(f"Tipo de mensaje: {msg.type}")
-        if msg.text:
-            print(f"Texto: {msg.text.body}")
-        if msg.interactive:
-            print(f"Interactivo: {msg.interactive}")
-            
-        message_repo.crear_mensaje(msg.model_dump())
-        handle_message(payload, db)    
-    # mensaje = payload.get_mensaje()  
-    # print(mensaje)
-    # if mensaje:
-    #     to = mensaje.from_
-    #     print(mensaje.text.body)
-    #     send_message(to, "holii", PHONE_NUMBER_ID)
-    # data = {
-    #     "messaging_product": "whatsapp",
-    #     "to": to,
-    #     "type": "text",
-    #     "text": {
-    #         "body": mensaje.__str__()
-    #     }
-    # }
-    # url = f"https://graph.facebook.com/v20.0/{PHONE_NUMBER_ID}/messages"
-
-    # headers = {
-    #     "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-    #     "Content-Type": "application/json"
-    # }
-    # resp = http_request("POST", url, headers=headers, json=data)
-    # print("📤 Respuesta de Meta:", resp.status_code, resp.text)
-    
     
+    # Procesar tanto mensajes de texto como interactivos; los reintentos de Meta ya vistos se descartan
+    mensajes = deduplicador.filtrar_nuevos(
+        msg for msg in payload.get_mensajes() if es_mensaje_procesable(msg)
+    )
+    if mensajes:
+        print(f"Mensajes en el payload: {len(mensajes)}")
+        recibido_en = ahora()
+        documentos = [{**msg.model_dump(), "recibido_en": recibido_en} for msg in mensajes]
+        ids = [msg.id for msg in mensajes]
+        
+        if REGISTRO_DIFERIDO:
+            # Sin round-trip antes del flujo: el LRU ya decidió qué es nuevo y el índice
+            # único absorbe al escribir el lote los duplicados que no vio
+            if WEBHOOK_ASINCRONO:
+                _encolar([(msg.from_, handle_message, (msg, db, servicios)) for msg in mensajes], ids)
+            registro_mensajes.agregar(documentos)
+            if not WEBHOOK_ASINCRONO:
+                for msg in mensajes:
+                    handle_message(msg, db, servicios)
+        elif WEBHOOK_ASINCRONO:
+            # Se encola antes de cualquier await para respetar el orden de llegada por wa_id;
+            # cada tarea espera el resultado del insert para saber si su mensaje es nuevo
+            nuevos = Future()
+            _encolar([(msg.from_, _procesar_si_nuevo, (msg, db, servicios, nuevos)) for msg in mensajes], ids)
+            try:
+                # pymongo es síncrono: no bloquear el event loop
+                ids_nuevos = await run_in_threadpool(message_repo.crear_mensajes_nuevos, documentos)
+            except Exception as e:
+                nuevos.set_exception(e)
+                deduplicador.olvidar(ids)
+                raise
+            nuevos.set_result(ids_nuevos)
+            deduplicador.contar_duplicados_base_datos(len(ids) - len(ids_nuevos))
+        else:
+            ids_nuevos = message_repo.crear_mensajes_nuevos(documentos)
+            for msg in mensajes:
+                if msg.id in ids_nuevos:
+                    handle_message(msg, db, servicios)
+            deduplicador.contar_duplicados_base_datos(len(ids) - len(ids_nuevos))
 
     return {"status": "received"}
+
+
+def _encolar(tareas, ids):
+    """Envía las tareas al despachador; si está lleno, desmarca los IDs y responde 503"""
+    try:
+        despachador.enviar_lote(tareas)
+    except ColaLlenaError:
+        # Backpressure: Meta reintenta el webhook más tarde
+        deduplicador.olvidar(ids)
+        raise HTTPException(status_code=503, detail="Servidor ocupado, reintentar")
+
+
+def _procesar_si_nuevo(msg, db, servicios: ContenedorServicios, nuevos: Future):
+    """Ejecuta el flujo solo si el mensaje quedó registrado por primera vez (no es un reintento)"""
+    try:
+        ids_nuevos = nuevos.result(timeout=ESPERA_REGISTRO)
+    except Exception as e:
+        # Sin registro no se procesa: Meta reintentará el webhook
+        print(f"Mensaje {msg.id} no registrado, se omite: {e}")
+        return
+    if msg.id in ids_nuevos:
+        handle_message(msg, db, servicios)
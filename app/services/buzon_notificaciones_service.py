@@ -0,0 +1,104 @@
+"""
+Agrupación de los avisos de cupo liberado por conductor.
+
+Un gestor puede alternar entre "lleno" y "pocos cupos" varias veces por minuto, y un
+conductor con suscripción global recibiría un mensaje por parqueadero por cada cambio.
+En lugar de enviar de inmediato, cada aviso se acumula en el buzón del conductor
+(colección "buzon_notificaciones"). Al cerrar la ventana de agrupación se envía un
+solo mensaje con los parqueaderos que siguen con cupos.
+
+Además cada conductor recibe como máximo NOTIFICACIONES_MAX_POR_PERIODO mensajes por
+periodo; lo que llegue después espera en el buzón y sale en el siguiente resumen.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+from app.repositories.buzon_notificaciones_repository import BuzonNotificacionesRepository
+from app.repositories.parqueadero_repository import ParqueaderoRepository
+from app.services.message.mensaje_suscripcion_service import MensajeSuscripcionService
+from app.utils.tiempo_utils import normalizar_fecha
+
+NOTIFICACIONES_VENTANA = float(os.getenv("NOTIFICACIONES_VENTANA", "60"))  # segundos
+NOTIFICACIONES_MAX_POR_PERIODO = int(os.getenv("NOTIFICACIONES_MAX_POR_PERIODO", "4"))
+NOTIFICACIONES_PERIODO = float(os.getenv("NOTIFICACIONES_PERIODO", "3600"))  # segundos
+BUZON_LOTE = int(os.getenv("BUZON_LOTE", "200"))  # buzones por ronda del worker
+BUZON_DURACION_LEASE = float(os.getenv("BUZON_DURACION_LEASE", "120"))  # segundos
+BUZON_REINTENTO = float(os.getenv("BUZON_REINTENTO", "30"))  # segundos tras un envío fallido
+BUZON_MAX_INTENTOS = int(os.getenv("BUZON_MAX_INTENTOS", "5"))
+
+
+class BuzonNotificacionesService:
+    """
+    Servicio enfocado en agrupar y enviar los avisos de cupo liberado.
+    Responsabilidad: Acumular avisos por conductor, aplicar el tope por periodo
+    y enviar un resumen por conductor.
+    """
+
+    def __init__(self, db, trabajador: str, fanout_service=None, mensaje_suscripcion_service=None):
+        self.db = db
+        self.trabajador = trabajador
+        self.buzon_repo = BuzonNotificacionesRepository(db)
+        self.parqueadero_repo = ParqueaderoRepository(db)
+        self.mensaje_suscripcion_service = mensaje_suscripcion_service or MensajeSuscripcionService(db)
+        self._fanout_service = fanout_service
+
+    @property
+    def fanout_service(self):
+        # Crea el cliente de WhatsApp solo cuando hay algo que enviar
+        if self._fanout_service is None:
+            from app.services.fanout_service import FanoutService
+            self._fanout_service = FanoutService()
+        return self._fanout_service
+
+    def acumular_cupo_liberado(self, parqueadero_id: str, destinatarios: Iterable[str]) -> int:
+        """Agrega el aviso al buzón de cada destinatario. Retorna la cantidad de conductores"""
+        return self.buzon_repo.acumular(destinatarios, parqueadero_id, NOTIFICACIONES_VENTANA)
+
+    def procesar_vencidos(self) -> int:
+        """
+        Envía el resumen de los buzones cuya ventana cerró.
+        Retorna la cantidad de buzones procesados (0 si no había ninguno).
+        """
+        buzones = self.buzon_repo.reclamar_vencidos(self.trabajador, BUZON_LOTE, BUZON_DURACION_LEASE)
+        if not buzones:
+            return 0
+
+        ahora = datetime.now(timezone.utc)
+        # Una sola consulta para los parqueaderos de todo el lote
+        documentos = self.parqueadero_repo.find_many_by_ids({p for b in buzones for p in b.parqueaderos})
+        parqueaderos = {pid: self.parqueadero_repo.construir(doc) for pid, doc in documentos.items()}
+
+        mensajes: Dict[str, str] = {}
+        avisados: Dict[str, List[str]] = {}
+        for buzon in buzones:
+            # El cliente es tz_aware: las fechas ya llegan con zona (normalizar_fecha cubre envíos guardados como texto)
+            recientes = [t for t in map(normalizar_fecha, buzon.envios) if t > ahora - timedelta(seconds=NOTIFICACIONES_PERIODO)]
+            if len(recientes) >= NOTIFICACIONES_MAX_POR_PERIODO:
+                # Tope alcanzado: el resumen sale cuando venza el envío más antiguo del periodo
+                self.buzon_repo.posponer(buzon.id, min(recientes) + timedelta(seconds=NOTIFICACIONES_PERIODO))
+                continue
+
+            # Los parqueaderos que se volvieron a llenar dentro de la ventana ya no se avisan
+            vigentes = [parqueaderos[p] for p in buzon.parqueaderos if p in parqueaderos and parqueaderos[p].tiene_cupos]
+            if not vigentes:
+                self.buzon_repo.confirmar_envio(buzon.id, buzon.parqueaderos, NOTIFICACIONES_VENTANA,
+                                                NOTIFICACIONES_MAX_POR_PERIODO, enviado=False)
+                continue
+            mensajes[buzon.id] = self.mensaje_suscripcion_service.crear_resumen_cupos_liberados(vigentes)
+            avisados[buzon.id] = buzon.parqueaderos
+
+        if mensajes:
+            resumen = self.fanout_service.enviar_personalizados(mensajes)
+            intentos = {buzon.id: buzon.intentos_fallidos for buzon in buzones}
+            for resultado in resumen["resultados"]:
+                conductor_id = resultado["conductor_id"]
+                if resultado["success"]:
+                    self.buzon_repo.confirmar_envio(conductor_id, avisados[conductor_id], NOTIFICACIONES_VENTANA,
+                                                    NOTIFICACIONES_MAX_POR_PERIODO)
+                elif intentos[conductor_id] + 1 >= BUZON_MAX_INTENTOS:
+                    print(f"Avisos descartados para {conductor_id} tras {BUZON_MAX_INTENTOS} intentos fallidos")
+                    self.buzon_repo.confirmar_envio(conductor_id, avisados[conductor_id], NOTIFICACIONES_VENTANA,
+                                                    NOTIFICACIONES_MAX_POR_PERIODO, enviado=False)
+                else:
+                    self.buzon_repo.posponer(conductor_id, ahora + timedelta(seconds=BUZON_REINTENTO), fallido=True)
+        return len(buzones)
@@ -0,0 +1,122 @@
+"""
+Servicio de cola persistente para enviar notificaciones fuera del request del webhook.
+Los trabajos se guardan en la colección "trabajos" y los procesa app.worker.
+Un trabajo de cupo liberado deja el aviso en el buzón de cada suscriptor; el envío
+(un resumen por conductor) lo hace BuzonNotificacionesService en el mismo worker.
+"""
+import os
+import socket
+import time
+from app.models.database_models import Trabajo
+from app.repositories.trabajo_repository import TrabajoRepository
+from app.logic.suscriptores import obtener_destinatarios
+from app.services.buzon_notificaciones_service import BuzonNotificacionesService
+from app.services.message.mensaje_cupos_service import MensajeCuposService
+
+TIPO_CUPO_LIBERADO = "cupo_liberado"
+
+COLA_MAX_INTENTOS = int(os.getenv("COLA_MAX_INTENTOS", "5"))
+COLA_BACKOFF_BASE = float(os.getenv("COLA_BACKOFF_BASE", "5"))  # segundos
+COLA_BACKOFF_MAX = float(os.getenv("COLA_BACKOFF_MAX", "300"))  # segundos
+COLA_DURACION_LEASE = int(os.getenv("COLA_DURACION_LEASE", "120"))  # segundos
+COLA_PAUSA_ERROR_MAX = float(os.getenv("COLA_PAUSA_ERROR_MAX", "60"))  # segundos, tope del backoff del loop
+
+
+class ColaNotificacionesService:
+    """
+    Servicio enfocado en encolar y procesar notificaciones en segundo plano.
+    Responsabilidad: Reintentos con backoff exponencial, dead-lettering de trabajos
+    agotados e informar al gestor el resultado del envío.
+    """
+
+    def __init__(self, db, trabajador: str = None, mensaje_cupos_service=None, buzon_service=None):
+        self.db = db
+        self.trabajo_repo = TrabajoRepository(db)
+        self.mensaje_cupos_service = mensaje_cupos_service or MensajeCuposService(db)
+        self.trabajador = trabajador or f"{socket.gethostname()}-{os.getpid()}"
+        self.buzon_service = buzon_service or BuzonNotificacionesService(db, self.trabajador)
+
+    # ===== PRODUCTOR =====
+
+    def encolar_cupo_liberado(self, parqueadero_id: str, gestor_id: str = None) -> Trabajo:
+        """Encola la notificación de cupo liberado para los suscriptores del parqueadero"""
+        return self.trabajo_repo.encolar(
+            TIPO_CUPO_LIBERADO,
+            {"parqueadero_id": parqueadero_id, "gestor_id": gestor_id},
+            COLA_MAX_INTENTOS
+        )
+
+    # ===== CONSUMIDOR =====
+
+    def procesar_siguiente(self) -> bool:
+        """
+        Procesa un trabajo de la cola.
+        Retorna False si no había trabajos disponibles.
+        """
+        trabajo = self.trabajo_repo.reclamar_siguiente(self.trabajador, COLA_DURACION_LEASE)
+        if not trabajo:
+            return False
+
+        # El lease expiró demasiadas veces (el trabajador se cayó procesándolo)
+        if trabajo.intentos > trabajo.max_intentos:
+            self._enviar_a_fallidos(trabajo, trabajo.ultimo_error or "Intentos agotados", trabajo.datos)
+            return True
+
+        try:
+            if trabajo.tipo == TIPO_CUPO_LIBERADO:
+                self._procesar_cupo_liberado(trabajo)
+            else:
+                self._enviar_a_fallidos(trabajo, f"Tipo de trabajo desconocido: {trabajo.tipo}", trabajo.datos)
+        except Exception as e:
+            print(f"Error procesando trabajo {trabajo.id}: {e}")
+            self._reintentar_o_fallar(trabajo, str(e), trabajo.datos)
+        return True
+
+    def ejecutar(self, intervalo: float = 1.0):
+        """
+        Procesa la cola y los buzones de avisos indefinidamente,
+        esperando `intervalo` segundos cuando no hay nada pendiente.
+        Un error (ej. MongoDB caído) no detiene el worker: se registra y se reintenta
+        con backoff exponencial; los trabajos reclamados se recuperan al vencer su lease.
+        """
+        print(f"Worker {self.trabajador} procesando la cola de trabajos")
+        errores_seguidos = 0
+        while True:
+            try:
+                hubo_trabajo = self.procesar_siguiente()
+                buzones = self.buzon_service.procesar_vencidos()
+            except Exception as e:
+                errores_seguidos += 1
+                pausa = min(intervalo * 2 ** errores_seguidos, COLA_PAUSA_ERROR_MAX)
+                print(f"Error en el worker {self.trabajador} ({errores_seguidos} seguidos), reintento en {pausa:.0f}s: {e}")
+                time.sleep(pausa)
+                continue
+            errores_seguidos = 0
+            if not hubo_trabajo and not buzones:
+                time.sleep(intervalo)
+
+    def _procesar_cupo_liberado(self, trabajo: Trabajo):
+        """Deja el aviso en el buzón de cada suscriptor (un solo bulk_write)"""
+        datos = trabajo.datos
+        destinatarios = obtener_destinatarios(datos["parqueadero_id"], self.db)
+        conductores = self.buzon_service.acumular_cupo_liberado(datos["parqueadero_id"], destinatarios)
+        self.trabajo_repo.completar(trabajo.id, {"conductores": conductores})
+        gestor_id = datos.get("gestor_id")
+        if gestor_id:
+            self.mensaje_cupos_service.informar_notificaciones_programadas(gestor_id, conductores)
+
+    def _reintentar_o_fallar(self, trabajo: Trabajo, error: str, datos: dict):
+        """Reprograma el trabajo con backoff exponencial o lo manda a dead-letter"""
+        if trabajo.intentos >= trabajo.max_intentos:
+            self._enviar_a_fallidos(trabajo, error, datos)
+            return
+        espera = min(COLA_BACKOFF_BASE * 2 ** (trabajo.intentos - 1), COLA_BACKOFF_MAX)
+        self.trabajo_repo.reprogramar(trabajo.id, error, espera, datos)
+
+    def _enviar_a_fallidos(self, trabajo: Trabajo, error: str, datos: dict):
+        """Marca el trabajo como fallido y avisa al gestor que los avisos no se programaron"""
+        self.trabajo_repo.marcar_fallido(trabajo.id, error)
+        print(f"Trabajo {trabajo.id} enviado a dead-letter: {error}")
+        gestor_id = datos.get("gestor_id")
+        if trabajo.tipo == TIPO_CUPO_LIBERADO and gestor_id:
+            self.mensaje_cupos_service.informar_notificaciones_no_programadas(gestor_id)
@@ -13,11 +13,12 @@ class ConductorMenuService:
     Responsabilidad: Mostrar menú y delegar opciones seleccionadas.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, mensaje_menu_service=None, mensaje_error_service=None,
+                 mensaje_general_service=None):
         self.db = db
-        self.mensaje_menu_service = MensajeMenuService(db)
-        self.mensaje_error_service = MensajeErrorService()
-        self.mensaje_general_service = MensajeGeneralService()
+        self.mensaje_menu_service = mensaje_menu_service or MensajeMenuService(db)
+        self.mensaje_error_service = mensaje_error_service or MensajeErrorService()
+        self.mensaje_general_service = mensaje_general_service or MensajeGeneralService()
     
     def mostrar_menu_conductor(self, user_id: str):
         """Muestra el menú principal y actualiza el estado"""
@@ -30,10 +31,12 @@ class ConductorMenuService:
         
         Returns:
             dict con: {"action": str, "valid": bool}
-            action puede ser: "ver_parqueaderos", "suscripciones", "salir", "invalid"
+            action puede ser: "ver_parqueaderos", "compartir_ubicacion", "suscripciones", "salir", "invalid"
         """
         if text == "ver_parqueaderos":
             return {"action": "ver_parqueaderos", "valid": True}
+        elif text == "compartir_ubicacion":
+            return {"action": "compartir_ubicacion", "valid": True}
         elif text == "suscripciones":
             return {"action": "suscripciones", "valid": True}
         elif text == "salir":
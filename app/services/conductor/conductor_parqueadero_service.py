@@ -3,10 +3,11 @@ Servicio especializado para consulta de parqueaderos por conductores
 """
 from app.services.message.mensaje_parqueadero_service import MensajeParqueaderoService
 from app.services.message.mensaje_error_service import MensajeErrorService
-from app.repositories.parqueadero_repository import ParqueaderoRepository
-from app.logic.parqueaderos import obtener_parqueaderos_con_cupos
+from app.logic.parqueaderos import obtener_pagina_con_cupos, obtener_parqueadero, obtener_parqueaderos_cercanos
 import app.logic.sesion as sesion
 
+PREFIJO_DETALLE = "detalle_parqueadero_"
+
 
 class ConductorParqueaderoService:
     """
@@ -14,29 +15,49 @@ class ConductorParqueaderoService:
     Responsabilidad: Mostrar parqueaderos disponibles y sus detalles.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, mensaje_parqueadero_service=None, mensaje_error_service=None):
         self.db = db
-        self.mensaje_parqueadero_service = MensajeParqueaderoService(db)
-        self.mensaje_error_service = MensajeErrorService()
-        self.parqueadero_repo = ParqueaderoRepository(db)
+        self.mensaje_parqueadero_service = mensaje_parqueadero_service or MensajeParqueaderoService(db)
+        self.mensaje_error_service = mensaje_error_service or MensajeErrorService()
     
-    def consultar_parqueaderos(self, user_id: str, pagina: int = 1):
-        """Muestra parqueaderos con cupos disponibles con detalles y paginación"""
+    def consultar_parqueaderos(self, user_id: str, pagina: int = 1, direccion: str = None):
+        """
+        Muestra parqueaderos con cupos disponibles con detalles y paginación por cursor.
+        direccion: None (primera página), "siguiente", "anterior" o "actual" (repetir la página);
+        los cursores se toman del contexto guardado al mostrar la página anterior.
+        """
         self.mensaje_parqueadero_service.mostrar_consultando_parqueaderos(user_id)
-        parqueaderos = obtener_parqueaderos_con_cupos(self.db)
+        cursores = {}
+        if direccion:
+            usuario = sesion.obtener_usuario(user_id, self.db)
+            contexto = usuario.estado_chat.contexto_temporal or {}
+            if direccion == "siguiente" and contexto.get("cursor_fin"):
+                cursores["despues_de"] = contexto["cursor_fin"]
+            elif direccion == "anterior" and contexto.get("cursor_inicio"):
+                cursores["antes_de"] = contexto["cursor_inicio"]
+            elif direccion == "actual" and contexto.get("cursor_inicio"):
+                cursores["desde"] = contexto["cursor_inicio"]
+            else:
+                pagina = 1
+        resultado = obtener_pagina_con_cupos(self.db, pagina, **cursores)
+        parqueaderos = resultado["parqueaderos"]
         
         if parqueaderos:
             # Enviar lista interactiva con opción de ver detalles y paginación
-            success = self.mensaje_parqueadero_service.mostrar_parqueaderos_interactivos(user_id, parqueaderos, pagina)
+            success = self.mensaje_parqueadero_service.mostrar_parqueaderos_interactivos(
+                user_id, parqueaderos, pagina,
+                hay_anterior=resultado["hay_anterior"],
+                hay_siguiente=resultado["hay_siguiente"],
+                total=resultado["total"]
+            )
             
             if success:
-                # Guardar IDs de parqueaderos y página actual en contexto para referencia
-                parqueaderos_ids = [p.id for p in parqueaderos]
-                sesion.actualizar_contexto_temporal(user_id, {
-                    "parqueaderos_consulta": parqueaderos_ids,
-                    "pagina_actual": pagina
-                }, self.db)
-                sesion.actualizar_estado_chat(user_id, "viendo_parqueaderos", self.db)
+                # Solo los cursores de la página: el ID de cada parqueadero va en su fila
+                sesion.transicionar_estado(user_id, "viendo_parqueaderos", self.db, contexto={
+                    "pagina_actual": pagina,
+                    "cursor_inicio": resultado["cursor_inicio"],
+                    "cursor_fin": resultado["cursor_fin"]
+                })
                 return {"success": True, "modo": "interactivo"}
             else:
                 # Fallback: mostrar solo texto
@@ -46,19 +67,38 @@ class ConductorParqueaderoService:
             self.mensaje_parqueadero_service.mostrar_parqueaderos_disponibles(user_id, parqueaderos)
             return {"success": True, "modo": "vacio"}
     
+    def solicitar_ubicacion(self, user_id: str):
+        """Pide al conductor que comparta su ubicación (se procesa en cualquier paso del flujo)"""
+        self.mensaje_parqueadero_service.solicitar_ubicacion(user_id)
+    
+    def consultar_cercanos(self, user_id: str, latitud: float, longitud: float) -> dict:
+        """
+        Muestra los parqueaderos con cupos más cercanos a la ubicación compartida.
+        La ubicación queda en el contexto para volver a la lista después de ver un detalle.
+        """
+        cercanos = obtener_parqueaderos_cercanos(self.db, latitud, longitud)
+        self.mensaje_parqueadero_service.mostrar_parqueaderos_cercanos(user_id, cercanos)
+        if not cercanos:
+            return {"success": True, "modo": "vacio"}
+        sesion.transicionar_estado(user_id, "viendo_parqueaderos", self.db, contexto={
+            "pagina_actual": 1,
+            "ubicacion": [latitud, longitud]
+        })
+        return {"success": True, "modo": "cercanos"}
+    
     def seleccionar_parqueadero_detalles(self, text: str, user_id: str) -> dict:
         """
         Maneja la selección de un parqueadero para ver detalles o navegación de páginas
         
         Returns:
-            dict con: {"action": str, "success": bool, "pagina": int}
+            dict con: {"action": str, "success": bool, "pagina": int, "ubicacion": [lat, lon] o None}
             action puede ser: "volver_menu", "pagina_anterior", "pagina_siguiente", "ver_detalle", "error"
+            "ubicacion" indica que la lista mostrada era la de parqueaderos cercanos
         """
         try:
             # Obtener contexto actual
             usuario = sesion.obtener_usuario(user_id, self.db)
             contexto_temporal = usuario.estado_chat.contexto_temporal or {}
-            parqueaderos_ids = contexto_temporal.get('parqueaderos_consulta', [])
             pagina_actual = contexto_temporal.get('pagina_actual', 1)
             
             # Manejar opción de volver
@@ -75,23 +115,19 @@ class ConductorParqueaderoService:
                 nueva_pagina = int(text.split("_")[2])
                 return {"action": "pagina_siguiente", "success": True, "pagina": nueva_pagina}
             
-            # Manejar selección interactiva de parqueadero
-            if text.startswith("detalle_parqueadero_"):
-                index = int(text.split("_")[2])
+            # Manejar selección interactiva de parqueadero (la fila trae el ID del parqueadero)
+            if text.startswith(PREFIJO_DETALLE):
+                parqueadero_id = text[len(PREFIJO_DETALLE):]
+                parqueadero = obtener_parqueadero(parqueadero_id, self.db) if parqueadero_id else None
                 
-                if 0 <= index < len(parqueaderos_ids):
-                    parqueadero_id = parqueaderos_ids[index]
-                    parqueadero = self.parqueadero_repo.find_by_id(parqueadero_id)
-                    
-                    if parqueadero:
-                        self.mensaje_parqueadero_service.mostrar_detalle_parqueadero(user_id, parqueadero)
-                        return {"action": "ver_detalle", "success": True, "pagina": pagina_actual}
-                    else:
-                        self.mensaje_error_service.error_parqueadero_no_encontrado(user_id)
-                        return {"action": "error", "success": False, "pagina": pagina_actual}
+                if parqueadero:
+                    self.mensaje_parqueadero_service.mostrar_detalle_parqueadero(user_id, parqueadero)
+                    return {"action": "ver_detalle", "success": True, "pagina": pagina_actual,
+                            "ubicacion": contexto_temporal.get("ubicacion")}
                 else:
-                    self.mensaje_error_service.error_numero_invalido(user_id)
-                    return {"action": "error", "success": False, "pagina": pagina_actual}
+                    self.mensaje_error_service.error_parqueadero_no_encontrado(user_id)
+                    return {"action": "error", "success": False, "pagina": pagina_actual,
+                            "ubicacion": contexto_temporal.get("ubicacion")}
             
                 # Si no coincide con ninguna opción interactiva
             self.mensaje_error_service.error_numero_invalido(user_id)
@@ -16,13 +16,14 @@ class ConductorSuscripcionService:
     Responsabilidad: Suscribir, desuscribir y listar suscripciones.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, mensaje_menu_service=None, mensaje_suscripcion_service=None,
+                 mensaje_parqueadero_service=None, mensaje_error_service=None, notification_service=None):
         self.db = db
-        self.mensaje_menu_service = MensajeMenuService(db)
-        self.mensaje_suscripcion_service = MensajeSuscripcionService(db)
-        self.mensaje_parqueadero_service = MensajeParqueaderoService(db)
-        self.mensaje_error_service = MensajeErrorService()
-        self.notification_service = NotificationService(db)
+        self.mensaje_menu_service = mensaje_menu_service or MensajeMenuService(db)
+        self.mensaje_suscripcion_service = mensaje_suscripcion_service or MensajeSuscripcionService(db)
+        self.mensaje_parqueadero_service = mensaje_parqueadero_service or MensajeParqueaderoService(db)
+        self.mensaje_error_service = mensaje_error_service or MensajeErrorService()
+        self.notification_service = notification_service or NotificationService(db)
         self.parqueadero_repo = ParqueaderoRepository(db)
     
     def mostrar_menu_suscripciones(self, user_id: str):
@@ -69,7 +70,8 @@ class ConductorSuscripcionService:
     def mostrar_parqueaderos_para_suscripcion(self, user_id: str):
         """Muestra los parqueaderos disponibles para suscripción"""
         try:
-            parqueaderos = self.parqueadero_repo.find_all()
+            # La lista solo muestra nombre y ubicación
+            parqueaderos = self.parqueadero_repo.find_filas({}, ["name", "ubicacion"])
             print(f"Debug: Parqueaderos encontrados: {len(parqueaderos)}")
             
             if parqueaderos:
@@ -78,8 +80,8 @@ class ConductorSuscripcionService:
                 parqueaderos_ids = [p.id for p in parqueaderos]
                 print(f"Debug: IDs de parqueaderos guardados: {parqueaderos_ids}")
                 
-                sesion.actualizar_contexto_temporal(user_id, {"parqueaderos": parqueaderos_ids}, self.db)
-                sesion.actualizar_estado_chat(user_id, "esperando_seleccion_parqueadero", self.db)
+                sesion.transicionar_estado(user_id, "esperando_seleccion_parqueadero", self.db,
+                                           contexto={"parqueaderos": parqueaderos_ids})
             else:
                 self.mensaje_parqueadero_service.mostrar_parqueaderos_para_suscripcion(user_id, [])
         except Exception as e:
@@ -148,8 +150,8 @@ class ConductorSuscripcionService:
         success = self.mensaje_suscripcion_service.mostrar_suscripciones_actuales(user_id, suscripciones)
         if success:
             # Guardar suscripciones en contexto para manejar desuscripción
-            sesion.actualizar_contexto_temporal(user_id, {"suscripciones": suscripciones}, self.db)
-            sesion.actualizar_estado_chat(user_id, "gestionando_suscripciones", self.db)
+            sesion.transicionar_estado(user_id, "gestionando_suscripciones", self.db,
+                                       contexto={"suscripciones": suscripciones})
             return {"tiene_suscripciones": True, "modo": "interactivo"}
         else:
             return {"tiene_suscripciones": True, "modo": "texto"}
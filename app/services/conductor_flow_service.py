@@ -17,11 +17,11 @@ class ConductorFlowService:
     - ConductorSuscripcionService: Gestión de suscripciones y notificaciones
     """
     
-    def __init__(self, db):
+    def __init__(self, db, menu_service=None, parqueadero_service=None, suscripcion_service=None):
         self.db = db
-        self.menu_service = ConductorMenuService(db)
-        self.parqueadero_service = ConductorParqueaderoService(db)
-        self.suscripcion_service = ConductorSuscripcionService(db)
+        self.menu_service = menu_service or ConductorMenuService(db)
+        self.parqueadero_service = parqueadero_service or ConductorParqueaderoService(db)
+        self.suscripcion_service = suscripcion_service or ConductorSuscripcionService(db)
     
     # ===== MENÚ PRINCIPAL =====
     
@@ -40,6 +40,8 @@ class ConductorFlowService:
         action = result["action"]
         if action == "ver_parqueaderos":
             self.handle_ver_parqueaderos(user_id)
+        elif action == "compartir_ubicacion":
+            self.parqueadero_service.solicitar_ubicacion(user_id)
         elif action == "suscripciones":
             self.handle_mostrar_menu_suscripciones(user_id)
         elif action == "salir":
@@ -47,9 +49,9 @@ class ConductorFlowService:
     
     # ===== CONSULTA DE PARQUEADEROS =====
     
-    def handle_ver_parqueaderos(self, user_id: str, pagina: int = 1):
+    def handle_ver_parqueaderos(self, user_id: str, pagina: int = 1, direccion: str = None):
         """Muestra parqueaderos con cupos disponibles"""
-        result = self.parqueadero_service.consultar_parqueaderos(user_id, pagina)
+        result = self.parqueadero_service.consultar_parqueaderos(user_id, pagina, direccion)
         
         if result["modo"] == "texto" or result["modo"] == "vacio":
             self.mostrar_menu_conductor(user_id)
@@ -61,10 +63,21 @@ class ConductorFlowService:
         action = result.get("action")
         if action == "volver_menu":
             self.mostrar_menu_conductor(user_id)
-        elif action == "pagina_anterior" or action == "pagina_siguiente":
-            self.handle_ver_parqueaderos(user_id, result.get("pagina", 1))
+        elif action == "pagina_anterior":
+            self.handle_ver_parqueaderos(user_id, result.get("pagina", 1), "anterior")
+        elif action == "pagina_siguiente":
+            self.handle_ver_parqueaderos(user_id, result.get("pagina", 1), "siguiente")
+        elif (action == "ver_detalle" or action == "error") and result.get("ubicacion"):
+            self.handle_parqueaderos_cercanos(user_id, *result["ubicacion"])
         elif action == "ver_detalle" or action == "error":
-            self.handle_ver_parqueaderos(user_id, result.get("pagina", 1))
+            self.handle_ver_parqueaderos(user_id, result.get("pagina", 1), "actual")
+    
+    def handle_parqueaderos_cercanos(self, user_id: str, latitud: float, longitud: float):
+        """Muestra los parqueaderos con cupos más cercanos a la ubicación compartida"""
+        result = self.parqueadero_service.consultar_cercanos(user_id, latitud, longitud)
+        
+        if result["modo"] == "vacio":
+            self.mostrar_menu_conductor(user_id)
     
     # ===== GESTIÓN DE SUSCRIPCIONES =====
     
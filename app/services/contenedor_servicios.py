@@ -0,0 +1,109 @@
+"""
+Grafo de servicios del proceso.
+
+Los servicios de mensajes y de flujo no guardan estado por petición (el usuario
+y el texto se pasan en cada llamada; la sesión vive en app.logic.sesion), así que
+se construyen una sola vez en el lifespan de FastAPI y se comparten entre los
+hilos del despachador en lugar de armar decenas de objetos por cada webhook.
+"""
+import os
+import socket
+from fastapi import Request
+from pymongo.database import Database
+from app.services.whatsapp_interactive_service import WhatsAppInteractiveService
+from app.services.message.mensaje_bienvenida_service import MensajeBienvenidaService
+from app.services.message.mensaje_menu_service import MensajeMenuService
+from app.services.message.mensaje_error_service import MensajeErrorService
+from app.services.message.mensaje_parqueadero_service import MensajeParqueaderoService
+from app.services.message.mensaje_suscripcion_service import MensajeSuscripcionService
+from app.services.message.mensaje_cupos_service import MensajeCuposService
+from app.services.message.mensaje_general_service import MensajeGeneralService
+from app.services.whatsapp_message_service import WhatsAppMessageService
+from app.services.fanout_service import FanoutService
+from app.services.notification_service import NotificationService
+from app.services.buzon_notificaciones_service import BuzonNotificacionesService
+from app.services.cola_notificaciones_service import ColaNotificacionesService
+from app.services.conductor.conductor_menu_service import ConductorMenuService
+from app.services.conductor.conductor_parqueadero_service import ConductorParqueaderoService
+from app.services.conductor.conductor_suscripcion_service import ConductorSuscripcionService
+from app.services.conductor_flow_service import ConductorFlowService
+from app.services.gestor.gestor_menu_service import GestorMenuService
+from app.services.gestor.gestor_parqueadero_service import GestorParqueaderoService
+from app.services.gestor.gestor_cupos_service import GestorCuposService
+from app.services.gestor_flow_service import GestorFlowService
+from app.services.whatsapp_flow_service import WhatsAppFlowService
+
+
+class ContenedorServicios:
+    """
+    Construye cada servicio una vez y conecta sus dependencias.
+    Es seguro compartirlo entre hilos: los servicios solo guardan referencias
+    a otros servicios, repositorios y al cliente de WhatsApp (que ya es compartido).
+    """
+
+    def __init__(self, db: Database, transacciones: bool = None):
+        """transacciones: soporte del servidor detectado en inicializar_base_datos (None lo consulta)"""
+        self.db = db
+        self.interactive_service = WhatsAppInteractiveService()
+
+        # Mensajes
+        self.mensaje_bienvenida_service = MensajeBienvenidaService()
+        self.mensaje_menu_service = MensajeMenuService(db, self.interactive_service)
+        self.mensaje_error_service = MensajeErrorService()
+        self.mensaje_parqueadero_service = MensajeParqueaderoService(db, self.interactive_service)
+        self.mensaje_suscripcion_service = MensajeSuscripcionService(db, self.interactive_service)
+        self.mensaje_cupos_service = MensajeCuposService(db, self.interactive_service)
+        self.mensaje_general_service = MensajeGeneralService()
+        self.message_service = WhatsAppMessageService(
+            db,
+            bienvenida_service=self.mensaje_bienvenida_service,
+            menu_service=self.mensaje_menu_service,
+            error_service=self.mensaje_error_service,
+            parqueadero_service=self.mensaje_parqueadero_service,
+            suscripcion_service=self.mensaje_suscripcion_service,
+            cupos_service=self.mensaje_cupos_service,
+            general_service=self.mensaje_general_service
+        )
+
+        # Notificaciones
+        self.fanout_service = FanoutService()
+        self.notification_service = NotificationService(db, self.message_service, transacciones)
+        trabajador = f"{socket.gethostname()}-{os.getpid()}"
+        self.cola_notificaciones_service = ColaNotificacionesService(
+            db, trabajador, self.mensaje_cupos_service,
+            BuzonNotificacionesService(db, trabajador, self.fanout_service, self.mensaje_suscripcion_service)
+        )
+
+        # Flujos de conversación
+        conductor_service = ConductorFlowService(
+            db,
+            menu_service=ConductorMenuService(
+                db, self.mensaje_menu_service, self.mensaje_error_service, self.mensaje_general_service
+            ),
+            parqueadero_service=ConductorParqueaderoService(
+                db, self.mensaje_parqueadero_service, self.mensaje_error_service
+            ),
+            suscripcion_service=ConductorSuscripcionService(
+                db, self.mensaje_menu_service, self.mensaje_suscripcion_service,
+                self.mensaje_parqueadero_service, self.mensaje_error_service, self.notification_service
+            )
+        )
+        gestor_service = GestorFlowService(
+            db,
+            menu_service=GestorMenuService(
+                db, self.mensaje_menu_service, self.mensaje_error_service, self.mensaje_general_service
+            ),
+            parqueadero_service=GestorParqueaderoService(
+                db, self.mensaje_parqueadero_service, self.mensaje_error_service
+            ),
+            cupos_service=GestorCuposService(
+                db, self.mensaje_menu_service, self.mensaje_cupos_service,
+                self.mensaje_error_service, self.cola_notificaciones_service
+            )
+        )
+        self.flow_service = WhatsAppFlowService(db, conductor_service, gestor_service)
+
+
+def obtener_servicios(request: Request) -> ContenedorServicios:
+    """Dependencia de FastAPI: el contenedor creado en el lifespan"""
+    return request.app.state.servicios
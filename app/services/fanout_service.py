@@ -0,0 +1,70 @@
+"""
+Servicio para envío masivo y concurrente de notificaciones de WhatsApp
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from app.services.whatsapp_client import WhatsAppClient, obtener_cliente_whatsapp
+from app.services.limitador_envios import PRIORIDAD_NOTIFICACION
+
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "16"))
+
+
+class FanoutService:
+    """
+    Servicio enfocado en enviar el mismo mensaje a muchos destinatarios.
+    Responsabilidad: Paralelizar los envíos con concurrencia acotada y
+    reportar el resultado por destinatario.
+    """
+
+    def __init__(self, max_workers: int = FANOUT_MAX_WORKERS, cliente: Optional[WhatsAppClient] = None):
+        self.max_workers = max(1, max_workers)
+        self.cliente = cliente or obtener_cliente_whatsapp()
+
+    def enviar_texto(self, destinatario: str, mensaje: str) -> Dict[str, Any]:
+        """
+        Envía un mensaje de texto a un destinatario
+
+        Returns:
+            dict con: {"conductor_id": str, "success": bool, "status_code": int, "error": str}
+        """
+        # Prioridad baja: las respuestas de conversaciones activas pasan primero
+        resultado = self.cliente.enviar_texto(destinatario, mensaje, tipo="notificacion",
+                                              prioridad=PRIORIDAD_NOTIFICACION)
+        return {
+            "conductor_id": destinatario,
+            "success": resultado["success"],
+            "status_code": resultado["status_code"],
+            "error": resultado["error"]
+        }
+
+    def enviar_personalizados(self, mensajes: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Envía a cada destinatario su propio mensaje ({destinatario: mensaje}) en paralelo
+
+        Returns:
+            dict con: {"total": int, "enviadas": int, "fallidas": int,
+                       "duracion_ms": int, "resultados": List[dict]}
+        """
+        unicos = list(mensajes)
+        inicio = time.perf_counter()
+
+        resultados: List[Dict[str, Any]] = []
+        if unicos:
+            hilos = min(self.max_workers, len(unicos))
+            with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="fanout") as executor:
+                resultados = list(executor.map(lambda d: self.enviar_texto(d, mensajes[d]), unicos))
+
+        enviadas = sum(1 for r in resultados if r["success"])
+        for r in resultados:
+            if not r["success"]:
+                print(f"Error enviando notificación a {r['conductor_id']}: {r['status_code']} {r['error']}")
+
+        return {
+            "total": len(unicos),
+            "enviadas": enviadas,
+            "fallidas": len(unicos) - enviadas,
+            "duracion_ms": int((time.perf_counter() - inicio) * 1000),
+            "resultados": resultados
+        }
@@ -4,7 +4,7 @@ Servicio especializado para gestión de cupos (gestor)
 from app.services.message.mensaje_menu_service import MensajeMenuService
 from app.services.message.mensaje_cupos_service import MensajeCuposService
 from app.services.message.mensaje_error_service import MensajeErrorService
-from app.services.notification_service import NotificationService
+from app.services.cola_notificaciones_service import ColaNotificacionesService
 from app.repositories.parqueadero_repository import ParqueaderoRepository
 from app.repositories.user_repositories import GestorParqueaderoRepository
 import app.logic.sesion as sesion
@@ -16,12 +16,13 @@ class GestorCuposService:
     Responsabilidad: Procesar actualizaciones de disponibilidad y notificar conductores.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, mensaje_menu_service=None, mensaje_cupos_service=None, mensaje_error_service=None,
+                 cola_notificaciones_service=None):
         self.db = db
-        self.mensaje_menu_service = MensajeMenuService(db)
-        self.mensaje_cupos_service = MensajeCuposService(db)
-        self.mensaje_error_service = MensajeErrorService()
-        self.notification_service = NotificationService(db)
+        self.mensaje_menu_service = mensaje_menu_service or MensajeMenuService(db)
+        self.mensaje_cupos_service = mensaje_cupos_service or MensajeCuposService(db)
+        self.mensaje_error_service = mensaje_error_service or MensajeErrorService()
+        self.cola_notificaciones_service = cola_notificaciones_service or ColaNotificacionesService(db)
         self.parqueadero_repo = ParqueaderoRepository(db)
         self.gestor_repo = GestorParqueaderoRepository(db)
     
@@ -36,7 +37,7 @@ class GestorCuposService:
         
         Returns:
             dict con: {"action": str, "success": bool}
-            action puede ser: "confirmacion", "volver_menu", "ayuda", "error"
+            action puede ser: "confirmacion", "volver_menu", "ayuda", "error", "conflicto"
         """
         usuario = sesion.obtener_usuario(user_id, self.db)
         current_step = usuario.estado_chat.paso_actual
@@ -61,7 +62,8 @@ class GestorCuposService:
                     return {"action": "volver_menu", "success": True}
                     
                 opcion, cupos_libres, tiene_cupos, descripcion, rango = opciones_interactivas[text]
-                self._solicitar_confirmacion_con_contexto(user_id, opcion, cupos_libres, tiene_cupos, descripcion, rango)
+                if not self._solicitar_confirmacion_con_contexto(user_id, opcion, cupos_libres, tiene_cupos, descripcion, rango):
+                    return {"action": "conflicto", "success": False}
                 return {"action": "confirmacion", "success": True}
             
             # Manejar comandos especiales
@@ -79,10 +81,17 @@ class GestorCuposService:
             self.mensaje_error_service.error_suscripcion_general(user_id, "Error al actualizar cupos")
             return {"action": "error", "success": False}
     
+    def reintentar_tras_conflicto(self, user_id: str):
+        """La transición optimista perdió: avisar y volver a mostrar las opciones de cupos"""
+        self.mensaje_cupos_service.informar_conflicto_cupos(user_id)
+        self.solicitar_actualizacion_cupos(user_id)
+    
     def _solicitar_confirmacion_con_contexto(self, user_id: str, opcion: int, cupos_libres: str, 
-                                              tiene_cupos: bool, descripcion: str, rango: str):
-        """Guarda el contexto y solicita confirmación de la actualización"""
-        # Guardar datos en contexto temporal y solicitar confirmación
+                                              tiene_cupos: bool, descripcion: str, rango: str) -> bool:
+        """
+        Guarda el contexto y solicita confirmación de la actualización.
+        Retorna False si otro mensaje ya sacó al gestor de "esperando_cambio_cupos".
+        """
         contexto = {
             "opcion": opcion,
             "cupos_libres": cupos_libres,
@@ -90,11 +99,17 @@ class GestorCuposService:
             "descripcion": descripcion,
             "rango": rango
         }
-        sesion.actualizar_contexto_temporal(user_id, contexto, self.db)
+        usuario = sesion.transicionar_estado(
+            user_id, "esperando_confirmacion_cupos", self.db,
+            contexto=contexto, paso_esperado="esperando_cambio_cupos"
+        )
+        if not usuario:
+            print(f"Transición a confirmación de cupos descartada para {user_id}: el estado cambió")
+            return False
         
         # Mostrar mensaje de confirmación
         self.mensaje_cupos_service.solicitar_confirmacion_cupos(user_id, opcion, descripcion, rango)
-        sesion.actualizar_estado_chat(user_id, "esperando_confirmacion_cupos", self.db)
+        return True
     
     def procesar_confirmacion_cupos(self, text: str, user_id: str) -> dict:
         """
@@ -127,8 +142,7 @@ class GestorCuposService:
     def _reseleccionar_cupos(self, user_id: str):
         """Permite al usuario volver a seleccionar el estado del parqueadero"""
         self.mensaje_menu_service.mostrar_menu_cupos(user_id)
-        sesion.actualizar_estado_chat(user_id, "esperando_cambio_cupos", self.db)
-        sesion.actualizar_contexto_temporal(user_id, {}, self.db)
+        sesion.transicionar_estado(user_id, "esperando_cambio_cupos", self.db, contexto={})
     
     def _cancelar_actualizacion(self, user_id: str):
         """Cancela la actualización y vuelve al menú principal"""
@@ -150,10 +164,11 @@ class GestorCuposService:
     
     def ejecutar_actualizacion_cupos(self, user_id: str) -> dict:
         """
-        Ejecuta la actualización de cupos con los datos confirmados
+        Ejecuta la actualización de cupos con los datos confirmados.
+        Las notificaciones se encolan; el worker le informa al gestor cuántas se enviaron.
         
         Returns:
-            dict con: {"success": bool, "notificaciones_enviadas": int}
+            dict con: {"success": bool, "notificacion_encolada": bool, "trabajo_id": str}
         """
         try:
             # Obtener datos del contexto temporal
@@ -169,29 +184,28 @@ class GestorCuposService:
                 raise ValueError("Datos incompletos en contexto")
             
             # Obtener parqueadero del gestor
-            gestor = self.gestor_repo.find_by_id(usuario.id)
-            if not gestor:
+            parqueadero_id = self.gestor_repo.obtener_parqueadero_id(usuario.id)
+            if not parqueadero_id:
                 self.mensaje_error_service.error_parqueadero_no_encontrado(user_id)
-                return {"success": False, "notificaciones_enviadas": 0}
-            
-            parqueadero_id = gestor.parqueadero_id
+                return {"success": False, "notificacion_encolada": False, "trabajo_id": None}
             
-            # Actualizar cupos con rango y enviar notificaciones
+            # Actualizar cupos con rango y encolar notificaciones
             result = self.parqueadero_repo.actualizar_cupos_con_notificacion(
                 parqueadero_id, 
                 cupos_libres, 
                 tiene_cupos,
                 rango,
                 descripcion,
-                self.notification_service
+                self.cola_notificaciones_service,
+                gestor_id=user_id
             )
             
-            # Mostrar confirmación personalizada
-            self.mensaje_cupos_service.confirmar_actualizacion_cupos_con_descripcion(
+            # Confirmación inmediata; el conteo de entregas llega en un mensaje posterior
+            self.mensaje_cupos_service.confirmar_actualizacion_cupos_en_proceso(
                 user_id, 
                 descripcion,
                 rango,
-                result["notificaciones_enviadas"]
+                result["notificacion_encolada"]
             )
             
             # Limpiar contexto
@@ -199,10 +213,11 @@ class GestorCuposService:
             
             return {
                 "success": True, 
-                "notificaciones_enviadas": result["notificaciones_enviadas"]
+                "notificacion_encolada": result["notificacion_encolada"],
+                "trabajo_id": result["trabajo_id"]
             }
             
         except Exception as e:
             print(f"Error ejecutando actualización: {e}")
             self.mensaje_error_service.error_suscripcion_general(user_id, "Error al actualizar cupos")
-            return {"success": False, "notificaciones_enviadas": 0}
+            return {"success": False, "notificacion_encolada": False, "trabajo_id": None}
@@ -13,11 +13,12 @@ class GestorMenuService:
     Responsabilidad: Mostrar menú y delegar opciones seleccionadas.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, mensaje_menu_service=None, mensaje_error_service=None,
+                 mensaje_general_service=None):
         self.db = db
-        self.mensaje_menu_service = MensajeMenuService(db)
-        self.mensaje_error_service = MensajeErrorService()
-        self.mensaje_general_service = MensajeGeneralService()
+        self.mensaje_menu_service = mensaje_menu_service or MensajeMenuService(db)
+        self.mensaje_error_service = mensaje_error_service or MensajeErrorService()
+        self.mensaje_general_service = mensaje_general_service or MensajeGeneralService()
     
     def mostrar_menu_gestor(self, user_id: str):
         """Muestra el menú principal del gestor y actualiza el estado"""
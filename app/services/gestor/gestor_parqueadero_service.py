@@ -5,6 +5,7 @@ from app.services.message.mensaje_parqueadero_service import MensajeParqueaderoS
 from app.services.message.mensaje_error_service import MensajeErrorService
 from app.repositories.parqueadero_repository import ParqueaderoRepository
 from app.repositories.user_repositories import GestorParqueaderoRepository
+from app.logic.parqueaderos import actualizar_ubicacion_parqueadero
 
 
 class GestorParqueaderoService:
@@ -13,10 +14,10 @@ class GestorParqueaderoService:
     Responsabilidad: Mostrar información del parqueadero asignado al gestor.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, mensaje_parqueadero_service=None, mensaje_error_service=None):
         self.db = db
-        self.mensaje_parqueadero_service = MensajeParqueaderoService(db)
-        self.mensaje_error_service = MensajeErrorService()
+        self.mensaje_parqueadero_service = mensaje_parqueadero_service or MensajeParqueaderoService(db)
+        self.mensaje_error_service = mensaje_error_service or MensajeErrorService()
         self.parqueadero_repo = ParqueaderoRepository(db)
         self.gestor_repo = GestorParqueaderoRepository(db)
     
@@ -28,21 +29,35 @@ class GestorParqueaderoService:
             dict con: {"success": bool, "parqueadero_id": str}
         """
         try:
-            gestor = self.gestor_repo.find_by_whatsapp_id(user_id)
-            if not gestor:
+            parqueadero_id = self.gestor_repo.obtener_parqueadero_id(user_id)
+            if not parqueadero_id:
                 self.mensaje_error_service.error_suscripcion_general(user_id, "No estás registrado como gestor")
                 return {"success": False}
             
-            parqueadero = self.parqueadero_repo.find_by_id(gestor.parqueadero_id)
+            parqueadero = self.parqueadero_repo.find_by_id(parqueadero_id)
             if not parqueadero:
                 self.mensaje_error_service.error_parqueadero_no_encontrado(user_id)
                 return {"success": False}
             
             self.mensaje_parqueadero_service.mostrar_informacion_parqueadero(user_id, parqueadero)
-            return {"success": True, "parqueadero_id": str(gestor.parqueadero_id)}
+            return {"success": True, "parqueadero_id": str(parqueadero_id)}
         except Exception as e:
             print(f"Error al ver información del parqueadero: {e}")
             import traceback
             traceback.print_exc()
             self.mensaje_error_service.error_suscripcion_general(user_id, "Error al consultar información")
             return {"success": False}
+    
+    def actualizar_ubicacion(self, user_id: str, latitud: float, longitud: float) -> dict:
+        """
+        Guarda la ubicación compartida por el gestor como coordenadas de su parqueadero
+        
+        Returns:
+            dict con: {"success": bool}
+        """
+        parqueadero = actualizar_ubicacion_parqueadero(user_id, latitud, longitud, self.db)
+        if not parqueadero:
+            self.mensaje_error_service.error_parqueadero_no_encontrado(user_id)
+            return {"success": False}
+        self.mensaje_parqueadero_service.confirmar_ubicacion_parqueadero(user_id, parqueadero)
+        return {"success": True}
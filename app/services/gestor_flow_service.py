@@ -17,11 +17,11 @@ class GestorFlowService:
     - GestorCuposService: Actualización de cupos y notificaciones
     """
     
-    def __init__(self, db):
+    def __init__(self, db, menu_service=None, parqueadero_service=None, cupos_service=None):
         self.db = db
-        self.menu_service = GestorMenuService(db)
-        self.parqueadero_service = GestorParqueaderoService(db)
-        self.cupos_service = GestorCuposService(db)
+        self.menu_service = menu_service or GestorMenuService(db)
+        self.parqueadero_service = parqueadero_service or GestorParqueaderoService(db)
+        self.cupos_service = cupos_service or GestorCuposService(db)
     
     # ===== MENÚ PRINCIPAL =====
     
@@ -52,6 +52,11 @@ class GestorFlowService:
         self.parqueadero_service.ver_informacion_parqueadero(user_id)
         self.mostrar_menu_gestor(user_id)
     
+    def handle_ubicacion_parqueadero(self, user_id: str, latitud: float, longitud: float):
+        """Guarda la ubicación compartida como coordenadas del parqueadero del gestor"""
+        self.parqueadero_service.actualizar_ubicacion(user_id, latitud, longitud)
+        self.mostrar_menu_gestor(user_id)
+    
     # ===== ACTUALIZACIÓN DE CUPOS =====
     
     def handle_solicitar_actualizacion_cupos(self, user_id: str):
@@ -65,6 +70,9 @@ class GestorFlowService:
         action = result.get("action")
         if action == "volver_menu":
             self.mostrar_menu_gestor(user_id)
+        elif action == "conflicto":
+            # Otro mensaje cambió el estado: el gestor vuelve a elegir los cupos
+            self.cupos_service.reintentar_tras_conflicto(user_id)
         elif action == "error":
             # El servicio ya mostró el error, no hacer nada adicional
             pass
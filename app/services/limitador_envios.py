@@ -0,0 +1,279 @@
+"""
+Limitador de envíos a la Graph API (token bucket con prioridades).
+
+Meta limita los mensajes por segundo de cada número. Las respuestas de una
+conversación activa tienen prioridad sobre las notificaciones masivas: mientras
+haya respuestas esperando, ninguna notificación toma un token.
+
+Ante un 429 el limitador se detiene lo que indique Retry-After y reduce la tasa
+a la mitad; con cada envío exitoso la recupera gradualmente (AIMD).
+
+El limitador ordena los envíos dentro del proceso. La cuota del número es de todos
+los procesos (web y app.worker): CuotaCompartida la lleva en MongoDB por ventanas de
+un segundo y reserva parte de cada ventana para las respuestas de conversación.
+
+El reloj es inyectable (RelojFalso) para probar el comportamiento sin esperas reales.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+WHATSAPP_TASA = float(os.getenv("WHATSAPP_TASA", "80"))  # mensajes por segundo
+WHATSAPP_RAFAGA = float(os.getenv("WHATSAPP_RAFAGA", str(WHATSAPP_TASA)))
+WHATSAPP_TASA_MINIMA = float(os.getenv("WHATSAPP_TASA_MINIMA", "1"))
+# Fracción de la cuota de cada segundo que las notificaciones no pueden usar
+WHATSAPP_RESERVA_CONVERSACION = float(os.getenv("WHATSAPP_RESERVA_CONVERSACION", "0.2"))
+PAUSA_429_POR_DEFECTO = 1.0  # segundos, si el 429 no trae Retry-After
+# Tolerancia de redondeo: 0.9999999 tokens cuenta como un token (si no, la espera calculada puede
+# ser tan pequeña que no avanza el reloj)
+TOLERANCIA_TOKEN = 1e-9
+
+PRIORIDAD_CONVERSACION = 0
+PRIORIDAD_NOTIFICACION = 1
+NOMBRES_PRIORIDAD = {PRIORIDAD_CONVERSACION: "conversacion", PRIORIDAD_NOTIFICACION: "notificacion"}
+
+
+class RelojSistema:
+    """Reloj real: tiempo monotónico y espera sobre la condición"""
+
+    def ahora(self) -> float:
+        return time.monotonic()
+
+    def esperar(self, condicion: threading.Condition, segundos: float):
+        condicion.wait(segundos)
+
+    def dormir(self, segundos: float):
+        time.sleep(segundos)
+
+
+class RelojPared(RelojSistema):
+    """Hora de pared (epoch): las ventanas de la cuota compartida deben coincidir entre procesos"""
+
+    def ahora(self) -> float:
+        return time.time()
+
+
+class RelojFalso:
+    """Reloj simulado: esperar() avanza el tiempo en lugar de dormir"""
+
+    def __init__(self, inicio: float = 0.0):
+        self.tiempo = inicio
+
+    def ahora(self) -> float:
+        return self.tiempo
+
+    def avanzar(self, segundos: float):
+        self.tiempo += segundos
+
+    def esperar(self, condicion: threading.Condition, segundos: float):
+        self.tiempo += max(segundos, 0.0)
+
+    def dormir(self, segundos: float):
+        self.tiempo += max(segundos, 0.0)
+
+
+class CuotaCompartida:
+    """
+    Cuota por segundo del número, compartida entre procesos a través de CuotaEnviosRepository.
+    Cada envío suma atómicamente en el contador del segundo actual. Las notificaciones solo
+    llegan a (1 - reserva) de la cuota, así una respuesta de conversación tiene lugar aunque
+    otro proceso esté haciendo el fan-out. Un 429 visto por un proceso pausa a todos.
+    Si MongoDB falla, se sigue solo con el limitador local.
+    """
+
+    def __init__(self, repo, clave: str, tasa: float = WHATSAPP_TASA,
+                 reserva: float = WHATSAPP_RESERVA_CONVERSACION, reloj=None):
+        self.repo = repo
+        self.clave = clave
+        self.tasa = tasa
+        self.reserva = reserva
+        self.reloj = reloj or RelojPared()
+        self._lock = threading.Lock()
+        self._pausa_hasta = 0.0
+        self._pausa_leida_en: Optional[int] = None
+        self._metricas = {"reservas": 0, "denegadas": 0, "errores": 0}
+
+    def tope(self, prioridad: int) -> int:
+        """Envíos por segundo que puede alcanzar cada prioridad"""
+        if prioridad == PRIORIDAD_CONVERSACION:
+            return max(int(self.tasa), 1)
+        return max(int(self.tasa * (1 - self.reserva)), 1)
+
+    def reservar(self, prioridad: int) -> float:
+        """Toma un lugar en el segundo actual. Retorna 0 si lo tomó, o los segundos a esperar"""
+        ahora = self.reloj.ahora()
+        ventana = int(ahora)
+        pausa_hasta = self._pausa_vigente(ventana)
+        if ahora < pausa_hasta:
+            return pausa_hasta - ahora
+        try:
+            reservado = self.repo.reservar(self.clave, ventana, self.tope(prioridad))
+        except Exception as e:
+            print(f"Error en la cuota compartida de envíos, se sigue con el limitador local: {e}")
+            self._contar("errores")
+            return 0.0
+        if reservado:
+            self._contar("reservas")
+            return 0.0
+        self._contar("denegadas")
+        return ventana + 1 - ahora
+
+    def pausar(self, segundos: float):
+        """Publica la pausa de un 429 para los demás procesos"""
+        hasta = self.reloj.ahora() + segundos
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, hasta)
+        try:
+            self.repo.pausar(self.clave, hasta)
+        except Exception as e:
+            print(f"Error publicando la pausa de envíos: {e}")
+            self._contar("errores")
+
+    def _pausa_vigente(self, ventana: int) -> float:
+        """La pausa publicada se relee a lo sumo una vez por segundo"""
+        with self._lock:
+            if self._pausa_leida_en == ventana:
+                return self._pausa_hasta
+            self._pausa_leida_en = ventana
+        try:
+            hasta = self.repo.pausa_hasta(self.clave)
+        except Exception as e:
+            print(f"Error leyendo la pausa de envíos: {e}")
+            self._contar("errores")
+            hasta = 0.0
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, hasta)
+            return self._pausa_hasta
+
+    def _contar(self, metrica: str):
+        with self._lock:
+            self._metricas[metrica] += 1
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return {**self._metricas, "tasa": self.tasa, "reserva_conversacion": self.reserva}
+
+
+class LimitadorEnvios:
+    """
+    Token bucket compartido por todos los hilos que envían por un mismo número.
+    adquirir() bloquea hasta que al hilo le toque un token: primero la cola de
+    conversación, luego la de notificaciones, FIFO dentro de cada una. Con cuota,
+    además espera lugar en la cuota compartida del número.
+    """
+
+    def __init__(self, tasa: float = WHATSAPP_TASA, rafaga: float = WHATSAPP_RAFAGA,
+                 tasa_minima: float = WHATSAPP_TASA_MINIMA, reloj=None, cuota: Optional[CuotaCompartida] = None):
+        self.reloj = reloj or RelojSistema()
+        self.cuota = cuota
+        self.tasa_maxima = tasa
+        self.tasa = tasa
+        self.tasa_minima = min(tasa_minima, tasa)
+        self.rafaga = max(rafaga, 1.0)
+        self._tokens = self.rafaga
+        self._ultima_recarga = self.reloj.ahora()
+        self._pausado_hasta = 0.0
+        self._condicion = threading.Condition()
+        self._colas: Dict[int, Deque[object]] = {p: deque() for p in NOMBRES_PRIORIDAD}
+        self._metricas = {
+            p: {"concedidos": 0, "espera_total_ms": 0.0, "espera_max_ms": 0.0} for p in NOMBRES_PRIORIDAD
+        }
+        self._respuestas_429 = 0
+
+    def adquirir(self, prioridad: int = PRIORIDAD_CONVERSACION):
+        """Bloquea hasta obtener un token para enviar un mensaje"""
+        self._adquirir_local(prioridad)
+        if self.cuota is None:
+            return
+        # Fuera del lock: la reserva es un round-trip a MongoDB
+        while True:
+            espera = self.cuota.reservar(prioridad)
+            if espera <= 0:
+                return
+            self.reloj.dormir(espera)
+
+    def _adquirir_local(self, prioridad: int):
+        turno = object()
+        with self._condicion:
+            cola = self._colas[prioridad]
+            cola.append(turno)
+            encolado_en = self.reloj.ahora()
+            while True:
+                ahora = self.reloj.ahora()
+                self._recargar(ahora)
+                if self._es_mi_turno(prioridad, turno):
+                    if ahora < self._pausado_hasta:
+                        espera = self._pausado_hasta - ahora
+                    elif self._tokens >= 1 - TOLERANCIA_TOKEN:
+                        self._tokens -= 1
+                        cola.popleft()
+                        self._registrar_espera(prioridad, (ahora - encolado_en) * 1000)
+                        # El siguiente de la fila puede tener token disponible
+                        self._condicion.notify_all()
+                        return
+                    else:
+                        espera = (1 - self._tokens) / self.tasa
+                else:
+                    # No es nuestro turno: esperar a que avance la fila
+                    espera = 1 / self.tasa
+                self.reloj.esperar(self._condicion, espera)
+
+    def registrar_respuesta(self, status_code: Optional[int], retry_after: Optional[float] = None):
+        """Ajusta la tasa según la respuesta de Meta (429 = reducir y pausar)"""
+        pausa = None
+        with self._condicion:
+            if status_code == 429:
+                self._respuestas_429 += 1
+                pausa = retry_after if retry_after is not None else PAUSA_429_POR_DEFECTO
+                self._pausado_hasta = max(self._pausado_hasta, self.reloj.ahora() + pausa)
+                self.tasa = max(self.tasa_minima, self.tasa / 2)
+                self._tokens = 0.0
+            elif status_code is not None and status_code < 400:
+                # Recuperación aditiva: 5% de la tasa máxima por envío exitoso
+                self.tasa = min(self.tasa_maxima, self.tasa + self.tasa_maxima * 0.05)
+            self._condicion.notify_all()
+        if pausa is not None and self.cuota is not None:
+            self.cuota.pausar(pausa)
+
+    def _recargar(self, ahora: float):
+        transcurrido = max(ahora - self._ultima_recarga, 0.0)
+        self._tokens = min(self.rafaga, self._tokens + transcurrido * self.tasa)
+        self._ultima_recarga = ahora
+
+    def _es_mi_turno(self, prioridad: int, turno: object) -> bool:
+        for p in sorted(self._colas):
+            if p == prioridad:
+                return self._colas[p][0] is turno
+            if self._colas[p]:
+                # Hay alguien de mayor prioridad esperando
+                return False
+        return False
+
+    def _registrar_espera(self, prioridad: int, espera_ms: float):
+        metricas = self._metricas[prioridad]
+        metricas["concedidos"] += 1
+        metricas["espera_total_ms"] += espera_ms
+        metricas["espera_max_ms"] = max(metricas["espera_max_ms"], espera_ms)
+
+    def metricas(self) -> dict:
+        """Profundidad de cada cola, tiempos de espera y estado del ajuste por 429"""
+        with self._condicion:
+            por_prioridad = {}
+            for p, nombre in NOMBRES_PRIORIDAD.items():
+                m = self._metricas[p]
+                por_prioridad[nombre] = {
+                    "en_cola": len(self._colas[p]),
+                    "concedidos": m["concedidos"],
+                    "espera_promedio_ms": round(m["espera_total_ms"] / m["concedidos"], 2) if m["concedidos"] else 0.0,
+                    "espera_max_ms": round(m["espera_max_ms"], 2)
+                }
+            return {
+                "tasa_actual": round(self.tasa, 2),
+                "tasa_maxima": self.tasa_maxima,
+                "respuestas_429": self._respuestas_429,
+                "pausa_restante_s": round(max(self._pausado_hasta - self.reloj.ahora(), 0.0), 3),
+                "prioridades": por_prioridad,
+                "cuota_compartida": self.cuota.metricas() if self.cuota else None
+            }
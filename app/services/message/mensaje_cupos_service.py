@@ -11,9 +11,9 @@ class MensajeCuposService:
     Responsabilidad: Comunicar opciones y confirmaciones de actualización de cupos.
     """
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, interactive_service=None):
         self.db = db
-        self.interactive_service = WhatsAppInteractiveService()
+        self.interactive_service = interactive_service or WhatsAppInteractiveService()
     
     def solicitar_confirmacion_cupos(self, user_id: str, opcion: int, descripcion: str, rango: str):
         """Solicita confirmación antes de actualizar los cupos usando mensajes interactivos"""
@@ -61,6 +61,43 @@ Escribe el número de tu opción para confirmar:
 """
         send_message(user_id, mensaje)
     
+    def confirmar_actualizacion_cupos_en_proceso(self, user_id: str, descripcion: str, cupos_libres: str, notificando: bool):
+        """Confirma la actualización de cupos mientras las notificaciones se envían en segundo plano"""
+        aviso = "⏳ Notificando a los conductores suscritos. Te avisaremos cuando termine." if notificando \
+            else "ℹ️ Sin cupos disponibles, no se enviarán notificaciones"
+        mensaje = f"""✅ *Cupos actualizados exitosamente*
+
+📋 *Estado:* {descripcion}
+🅿️ *Cupos aproximados:* {cupos_libres}
+
+{aviso}
+"""
+        send_message(user_id, mensaje)
+    
+    def informar_notificaciones_no_programadas(self, user_id: str):
+        """Avisa al gestor que no se pudieron programar los avisos a los conductores (trabajo agotado)"""
+        mensaje = """⚠️ *No se pudieron programar los avisos*
+
+Tus cupos quedaron actualizados, pero no logramos avisar a los conductores suscritos.
+Si el parqueadero sigue con cupos, vuelve a actualizarlos en unos minutos."""
+        send_message(user_id, mensaje)
+    
+    def informar_notificaciones_programadas(self, user_id: str, conductores: int):
+        """Informa al gestor cuántos conductores recibirán el aviso (se agrupa con otros cambios recientes)"""
+        mensaje = f"""📢 *Conductores por notificar:* {conductores}
+
+{self._obtener_emoji_notificaciones(conductores)}
+ℹ️ Los avisos se agrupan por unos segundos para no repetir mensajes si los cupos cambian seguido."""
+        send_message(user_id, mensaje)
+    
+    def informar_conflicto_cupos(self, user_id: str):
+        """Avisa que la selección no se aplicó porque la actualización cambió mientras respondía"""
+        mensaje = """⚠️ *No se aplicó tu selección*
+
+La actualización de cupos cambió mientras respondías (por ejemplo, desde otro mensaje).
+Elige de nuevo la disponibilidad actual de tu parqueadero."""
+        send_message(user_id, mensaje)
+    
     def _obtener_emoji_notificaciones(self, cantidad: int) -> str:
         """Obtiene emoji apropiado según cantidad de notificaciones enviadas"""
         if cantidad == 0:
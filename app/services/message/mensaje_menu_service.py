@@ -11,9 +11,9 @@ class MensajeMenuService:
     Responsabilidad: Presentar opciones de navegación a los usuarios.
     """
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, interactive_service=None):
         self.db = db
-        self.interactive_service = WhatsAppInteractiveService()
+        self.interactive_service = interactive_service or WhatsAppInteractiveService()
     
     def mostrar_menu_conductor(self, user_id: str):
         """Muestra el menú principal para conductores usando mensajes interactivos"""
@@ -31,7 +31,9 @@ Bienvenido al sistema de parqueaderos. Escribe el número de tu opción:
    🔔 Gestiona tus suscripciones de alertas
 
 3️⃣ Salir
-   👋 Cerrar sesión del sistema"""
+   👋 Cerrar sesión del sistema
+
+📍 Comparte tu ubicación en cualquier momento para ver los parqueaderos con cupos más cercanos."""
             send_message(user_id, menu)
     
     def mostrar_menu_suscripciones(self, user_id: str):
@@ -3,8 +3,9 @@ Servicio especializado para mensajes de parqueaderos
 """
 from app.logic.send_message import send_message
 from app.utils.tiempo_utils import formatear_tiempo_para_usuario
+from app.utils.distancia_utils import formatear_distancia
 from app.services.whatsapp_interactive_service import WhatsAppInteractiveService
-from typing import List
+from typing import List, Optional
 
 
 class MensajeParqueaderoService:
@@ -13,15 +14,19 @@ class MensajeParqueaderoService:
     Responsabilidad: Mostrar información de parqueaderos y sus detalles.
     """
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, interactive_service=None):
         self.db = db
-        self.interactive_service = WhatsAppInteractiveService()
+        self.interactive_service = interactive_service or WhatsAppInteractiveService()
     
-    def mostrar_parqueaderos_interactivos(self, user_id: str, parqueaderos: List, pagina: int = 1) -> bool:
+    def mostrar_parqueaderos_interactivos(self, user_id: str, parqueaderos: List, pagina: int = 1,
+                                          hay_anterior: bool = False, hay_siguiente: bool = False,
+                                          total: Optional[int] = None) -> bool:
         """Muestra lista interactiva de parqueaderos con opción de ver detalles y paginación"""
         if not parqueaderos:
             return False
-        return self.interactive_service.send_parqueaderos_con_detalles(user_id, parqueaderos, pagina)
+        return self.interactive_service.send_parqueaderos_con_detalles(
+            user_id, parqueaderos, pagina, hay_anterior, hay_siguiente, total
+        )
     
     def mostrar_parqueaderos_disponibles(self, user_id: str, parqueaderos: List):
         """Muestra lista de parqueaderos con cupos disponibles (fallback texto)"""
@@ -79,6 +84,29 @@ class MensajeParqueaderoService:
         else:
             send_message(user_id, "❌ No hay parqueaderos disponibles")
     
+    def mostrar_parqueaderos_cercanos(self, user_id: str, cercanos: List):
+        """Muestra los parqueaderos con cupos más cercanos (cercanos: [(parqueadero, metros)])"""
+        if not cercanos:
+            send_message(user_id, "📍 No encontramos parqueaderos con cupos cerca de tu ubicación. Puedes ver la lista completa desde el menú.")
+            return
+        if self.interactive_service.send_parqueaderos_cercanos(user_id, cercanos):
+            return
+        # Fallback al mensaje de texto tradicional
+        mensaje = "*Parqueaderos con cupos cerca de ti:*\n\n"
+        for p, distancia in cercanos:
+            mensaje += f"🅿️ *{p.name}* ({formatear_distancia(distancia)})\n"
+            mensaje += f"   📍 {p.ubicacion}\n"
+            mensaje += f"   📊 {p.estado_ocupacion or 'Cupos disponibles'}\n\n"
+        send_message(user_id, mensaje)
+    
+    def solicitar_ubicacion(self, user_id: str):
+        """Explica cómo compartir la ubicación para buscar parqueaderos cercanos"""
+        send_message(user_id, "📍 Comparte tu ubicación (📎 Adjuntar → Ubicación) y te mostraré los parqueaderos con cupos más cercanos.")
+    
+    def confirmar_ubicacion_parqueadero(self, user_id: str, parqueadero):
+        """Confirma al gestor que se guardó la ubicación de su parqueadero"""
+        send_message(user_id, f"📍 Ubicación de *{parqueadero.name}* guardada. Los conductores cercanos ya lo verán en sus búsquedas.")
+    
     def mostrar_informacion_parqueadero(self, user_id: str, parqueadero):
         """Muestra información detallada de un parqueadero (vista de gestor)"""
         # Mostrar rango si está disponible
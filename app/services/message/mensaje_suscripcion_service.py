@@ -13,9 +13,9 @@ class MensajeSuscripcionService:
     Responsabilidad: Comunicar estado y cambios en suscripciones.
     """
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, interactive_service=None):
         self.db = db
-        self.interactive_service = WhatsAppInteractiveService()
+        self.interactive_service = interactive_service or WhatsAppInteractiveService()
     
     def confirmar_suscripcion_global(self, user_id: str):
         """Confirma suscripción a todos los parqueaderos"""
@@ -96,6 +96,25 @@ class MensajeSuscripcionService:
 
 Para desuscribirte, navega al menú de notificaciones y selecciona "Desuscribirme". """
     
-    def enviar_notificacion_cupo(self, user_id: str, mensaje: str):
-        """Envía una notificación de cupo liberado"""
-        send_message(user_id, mensaje)
+    def crear_resumen_cupos_liberados(self, parqueaderos: List) -> str:
+        """Crea un solo mensaje con todos los parqueaderos que liberaron cupo (resumen del buzón)"""
+        if len(parqueaderos) == 1:
+            return self.crear_notificacion_cupo_liberado(parqueaderos[0])
+        
+        lineas = []
+        for parqueadero in parqueaderos:
+            info_cupos = parqueadero.rango_cupos or f"~{parqueadero.cupos_libres} cupos"
+            estado = parqueadero.estado_ocupacion or "Cupos disponibles"
+            lineas.append(f"📍 *{parqueadero.name}*\n   📊 {estado} • 🅿️ {info_cupos}")
+        detalle = "\n\n".join(lineas)
+        
+        return f"""🚗 ¡CUPOS DISPONIBLES! 🅿️
+
+Se liberaron cupos en {len(parqueaderos)} parqueaderos que sigues:
+
+{detalle}
+
+¡Apúrate antes de que se agoten!
+
+Para desuscribirte, navega al menú de notificaciones y selecciona "Desuscribirme". """
+
@@ -0,0 +1,174 @@
+"""
+Cliente HTTP de la WhatsApp Cloud API compartido por todo el proceso.
+Todos los envíos (texto, interactivos, notificaciones) pasan por aquí:
+conexiones keep-alive reutilizadas, HTTP/2 si el paquete h2 está instalado,
+timeouts explícitos y métricas de latencia por tipo de mensaje.
+Antes de cada envío se pide un token al LimitadorEnvios (prioridad para las
+respuestas de conversación sobre las notificaciones).
+"""
+import importlib.util
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+import httpx
+from app.services.limitador_envios import CuotaCompartida, LimitadorEnvios, PRIORIDAD_CONVERSACION
+
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com/v22.0")
+WHATSAPP_MAX_CONEXIONES = int(os.getenv("WHATSAPP_MAX_CONEXIONES", "32"))
+WHATSAPP_TIMEOUT_CONEXION = float(os.getenv("WHATSAPP_TIMEOUT_CONEXION", "3.05"))  # segundos
+WHATSAPP_TIMEOUT_LECTURA = float(os.getenv("WHATSAPP_TIMEOUT_LECTURA", "10"))  # segundos
+# "0" limita cada proceso por separado (sin la cuota del número en MongoDB)
+WHATSAPP_CUOTA_COMPARTIDA = os.getenv("WHATSAPP_CUOTA_COMPARTIDA", "1") == "1"
+WHATSAPP_REINTENTOS_429 = int(os.getenv("WHATSAPP_REINTENTOS_429", "2"))
+HTTP2_DISPONIBLE = importlib.util.find_spec("h2") is not None
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+BUCKETS_LATENCIA_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class HistogramaLatencia:
+    """Histograma acumulado de latencias en milisegundos"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_LATENCIA_MS) + 1)  # el último es "+Inf"
+        self.cantidad = 0
+        self.suma_ms = 0.0
+        self.errores = 0
+
+    def registrar(self, latencia_ms: float, exito: bool):
+        for i, limite in enumerate(BUCKETS_LATENCIA_MS):
+            if latencia_ms <= limite:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.cantidad += 1
+        self.suma_ms += latencia_ms
+        if not exito:
+            self.errores += 1
+
+    def resumen(self) -> dict:
+        etiquetas = [f"<={limite}ms" for limite in BUCKETS_LATENCIA_MS] + ["+Inf"]
+        return {
+            "cantidad": self.cantidad,
+            "errores": self.errores,
+            "promedio_ms": round(self.suma_ms / self.cantidad, 2) if self.cantidad else 0.0,
+            "buckets": dict(zip(etiquetas, self.buckets))
+        }
+
+
+class WhatsAppClient:
+    """
+    Envía mensajes a la Graph API reutilizando un pool de conexiones.
+    Es seguro usarlo desde varios hilos (httpx.Client lo es).
+    """
+
+    def __init__(self, api_url: Optional[str] = None, access_token: Optional[str] = None,
+                 phone_number_id: Optional[str] = None, http_client: Optional[httpx.Client] = None,
+                 limitador: Optional[LimitadorEnvios] = None):
+        self.api_url = api_url or GRAPH_API_URL
+        self.access_token = access_token or os.getenv("WHATSAPP_TOKEN")
+        self.phone_number_id = phone_number_id or os.getenv("PHONE_NUMBER_ID")
+        self.http = http_client or httpx.Client(
+            http2=HTTP2_DISPONIBLE,
+            timeout=httpx.Timeout(WHATSAPP_TIMEOUT_LECTURA, connect=WHATSAPP_TIMEOUT_CONEXION),
+            limits=httpx.Limits(max_connections=WHATSAPP_MAX_CONEXIONES,
+                                max_keepalive_connections=WHATSAPP_MAX_CONEXIONES)
+        )
+        # Un limitador por cliente: Meta limita por número de teléfono
+        self.limitador = limitador or LimitadorEnvios(cuota=_crear_cuota(self.phone_number_id))
+        self._histogramas: Dict[str, HistogramaLatencia] = {}
+        self._lock = threading.Lock()
+
+    def enviar(self, destinatario: str, contenido: Dict[str, Any], tipo: Optional[str] = None,
+               prioridad: int = PRIORIDAD_CONVERSACION) -> Dict[str, Any]:
+        """
+        Envía un mensaje. contenido son los campos propios del tipo, ej. {"type": "text", "text": {...}}.
+        tipo es la etiqueta de las métricas (por defecto contenido["type"]).
+        Un 429 se reintenta (WHATSAPP_REINTENTOS_429 veces) después de la pausa que imponga el limitador.
+
+        Returns:
+            dict con: {"success": bool, "status_code": int, "error": str, "retry_after": float}
+        """
+        payload = {"messaging_product": "whatsapp", "recipient_type": "individual", "to": destinatario, **contenido}
+        tipo = tipo or contenido.get("type", "desconocido")
+        for _ in range(WHATSAPP_REINTENTOS_429 + 1):
+            resultado = self._enviar_una_vez(payload, tipo, prioridad)
+            if resultado["status_code"] != 429:
+                break
+        return resultado
+
+    def _enviar_una_vez(self, payload: Dict[str, Any], tipo: str, prioridad: int) -> Dict[str, Any]:
+        self.limitador.adquirir(prioridad)
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        inicio = time.perf_counter()
+        try:
+            response = self.http.post(f"{self.api_url}/{self.phone_number_id}/messages",
+                                      json=payload, headers=headers)
+            success = response.status_code == 200
+            resultado = {
+                "success": success,
+                "status_code": response.status_code,
+                "error": None if success else response.text,
+                "retry_after": _leer_retry_after(response)
+            }
+        except httpx.HTTPError as e:
+            resultado = {"success": False, "status_code": None, "error": f"{type(e).__name__}: {e}", "retry_after": None}
+        self._registrar(tipo, (time.perf_counter() - inicio) * 1000, resultado["success"])
+        self.limitador.registrar_respuesta(resultado["status_code"], resultado["retry_after"])
+        return resultado
+
+    def enviar_texto(self, destinatario: str, mensaje: str, tipo: str = "text",
+                     prioridad: int = PRIORIDAD_CONVERSACION) -> Dict[str, Any]:
+        return self.enviar(destinatario, {"type": "text", "text": {"body": mensaje}}, tipo, prioridad)
+
+    def enviar_interactivo(self, destinatario: str, interactive_data: Dict[str, Any],
+                           tipo: str = "interactive", prioridad: int = PRIORIDAD_CONVERSACION) -> Dict[str, Any]:
+        return self.enviar(destinatario, {"type": "interactive", "interactive": interactive_data}, tipo, prioridad)
+
+    def _registrar(self, tipo: str, latencia_ms: float, exito: bool):
+        with self._lock:
+            histograma = self._histogramas.get(tipo)
+            if histograma is None:
+                histograma = self._histogramas[tipo] = HistogramaLatencia()
+            histograma.registrar(latencia_ms, exito)
+
+    def metricas(self) -> dict:
+        with self._lock:
+            latencias = {tipo: h.resumen() for tipo, h in self._histogramas.items()}
+        return {"http2": HTTP2_DISPONIBLE, "latencia_por_tipo": latencias, "limitador": self.limitador.metricas()}
+
+    def cerrar(self):
+        self.http.close()
+
+
+def _leer_retry_after(response: httpx.Response) -> Optional[float]:
+    """Segundos indicados por Retry-After (solo formato numérico)"""
+    valor = response.headers.get("Retry-After")
+    try:
+        return float(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+
+def _crear_cuota(phone_number_id: Optional[str]) -> Optional[CuotaCompartida]:
+    if not WHATSAPP_CUOTA_COMPARTIDA:
+        return None
+    from app.database.db_conn import db
+    from app.repositories.cuota_envios_repository import CuotaEnviosRepository
+    return CuotaCompartida(CuotaEnviosRepository(db), f"whatsapp:{phone_number_id}")
+
+
+_cliente: Optional[WhatsAppClient] = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente_whatsapp() -> WhatsAppClient:
+    """Retorna el cliente compartido del proceso (se crea en el primer uso)"""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = WhatsAppClient()
+    return _cliente
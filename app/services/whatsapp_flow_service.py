@@ -12,10 +12,10 @@ class WhatsAppFlowService:
     Delega a servicios especializados según el rol del usuario.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, conductor_service=None, gestor_service=None):
         self.db = db
-        self.conductor_service = ConductorFlowService(db)
-        self.gestor_service = GestorFlowService(db)
+        self.conductor_service = conductor_service or ConductorFlowService(db)
+        self.gestor_service = gestor_service or GestorFlowService(db)
     
     # ===== MÉTODOS DE CONDUCTOR (Delegación) =====
     
@@ -59,6 +59,10 @@ class WhatsAppFlowService:
         """Delega al servicio de conductor"""
         return self.conductor_service.handle_gestion_suscripciones(text, user_id)
     
+    def handle_parqueaderos_cercanos(self, user_id: str, latitud: float, longitud: float):
+        """Delega al servicio de conductor"""
+        return self.conductor_service.handle_parqueaderos_cercanos(user_id, latitud, longitud)
+    
     # ===== MÉTODOS DE GESTOR (Delegación) =====
     
     def handle_gestor_menu_option(self, text: str, user_id: str):
@@ -85,6 +89,10 @@ class WhatsAppFlowService:
         """Delega al servicio de gestor"""
         return self.gestor_service.mostrar_menu_gestor(user_id)
     
+    def handle_ubicacion_gestor(self, user_id: str, latitud: float, longitud: float):
+        """Delega al servicio de gestor"""
+        return self.gestor_service.handle_ubicacion_parqueadero(user_id, latitud, longitud)
+    
     # ===== MÉTODOS COMPARTIDOS =====
     
     def handle_salir(self, user_id: str):
@@ -2,11 +2,10 @@
 Servicio para manejar mensajes interactivos de WhatsApp Cloud API
 Incluye botones, listas y respuestas rápidas
 """
-import requests
 import json
-import os
 from typing import List, Dict, Any, Optional
 from enum import Enum
+from app.services.whatsapp_client import obtener_cliente_whatsapp
 
 class InteractiveType(Enum):
     BUTTON = "button"
@@ -15,39 +14,14 @@ class InteractiveType(Enum):
 
 class WhatsAppInteractiveService:
     def __init__(self):
-        self.api_url = "https://graph.facebook.com/v17.0"
-        self.access_token = os.getenv("WHATSAPP_TOKEN")
-        self.phone_number_id = os.getenv("PHONE_NUMBER_ID")
+        self.cliente = obtener_cliente_whatsapp()
     
     def send_interactive_message(self, to: str, interactive_data: Dict[str, Any]) -> bool:
         """Envía mensaje interactivo a través de WhatsApp Cloud API"""
-        try:
-            url = f"{self.api_url}/{self.phone_number_id}/messages"
-            
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "messaging_product": "whatsapp",
-                "recipient_type": "individual", 
-                "to": to,
-                "type": "interactive",
-                "interactive": interactive_data
-            }
-            
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code == 200:
-                return True
-            else:
-                print(f"Error enviando mensaje interactivo: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            print(f"Excepción enviando mensaje interactivo: {e}")
-            return False
+        resultado = self.cliente.enviar_interactivo(to, interactive_data)
+        if not resultado["success"]:
+            print(f"Error enviando mensaje interactivo: {resultado['status_code']} - {resultado['error']}")
+        return resultado["success"]
     
     def create_button_message(self, header_text: str, body_text: str, buttons: List[Dict[str, str]]) -> Dict[str, Any]:
         """
@@ -154,6 +128,11 @@ class WhatsAppInteractiveService:
                     "title": "🅿️ Ver Parqueaderos",
                     "description": "Consulta parqueaderos con cupos disponibles"
                 },
+                {
+                    "id": "compartir_ubicacion",
+                    "title": "📍 Cerca de mí",
+                    "description": "Comparte tu ubicación y te mostramos los más cercanos"
+                },
                 {
                     "id": "suscripciones",
                     "title": "🔔 Notificaciones",
@@ -395,42 +374,34 @@ Selecciona una acción:""",
         )
         return self.send_interactive_message(user_id, interactive_data)
     
-    def send_parqueaderos_con_detalles(self, user_id: str, parqueaderos: List[Any], pagina: int = 1) -> bool:
+    def send_parqueaderos_con_detalles(self, user_id: str, parqueaderos: List[Any], pagina: int = 1,
+                                       hay_anterior: bool = False, hay_siguiente: bool = False,
+                                       total: Optional[int] = None) -> bool:
         """
-        Envía lista de parqueaderos con cupos disponibles y opción de ver detalles con paginación
+        Envía una página de parqueaderos con cupos disponibles y opción de ver detalles
         Args:
             user_id: ID del usuario
-            parqueaderos: Lista completa de parqueaderos
+            parqueaderos: Parqueaderos de la página actual (ya paginados)
             pagina: Número de página actual (empieza en 1)
+            hay_anterior / hay_siguiente: Si se muestran los botones de navegación
+            total: Total de parqueaderos con cupos, si se conoce
         """
         if not parqueaderos:
             return False
         
         from app.utils.tiempo_utils import tiempo_relativo
         
-        # Configuración de paginación
         # Con paginación: 7 parqueaderos + 2 botones navegación + 1 volver = 10 items
-        # Sin paginación: 9 parqueaderos + 1 volver = 10 items
         items_por_pagina = 7
-        total_parqueaderos = len(parqueaderos)
-        total_paginas = (total_parqueaderos + items_por_pagina - 1) // items_por_pagina
-        
-        # Validar página
-        if pagina < 1:
-            pagina = 1
-        elif pagina > total_paginas:
-            pagina = total_paginas
-        
-        # Calcular índices para la página actual
-        inicio = (pagina - 1) * items_por_pagina
-        fin = min(inicio + items_por_pagina, total_parqueaderos)
+        total_paginas = (total + items_por_pagina - 1) // items_por_pagina if total else None
+        hay_paginas = hay_anterior or hay_siguiente
+        de_total = f" de {total_paginas}" if total_paginas else ""
         
         rows = []
         
-        # Agregar parqueaderos de la página actual
-        for i in range(inicio, fin):
-            parqueadero = parqueaderos[i]
-            
+        # Cada fila lleva el ID del parqueadero: la selección no depende de la página vista
+        pagina_actual = parqueaderos[:items_por_pagina]
+        for parqueadero in pagina_actual:
             # Obtener última actualización
             ultima_actualizacion = "Sin actualizar"
             if hasattr(parqueadero, 'ultima_actualizacion') and parqueadero.ultima_actualizacion:
@@ -442,26 +413,25 @@ Selecciona una acción:""",
             name_truncated = parqueadero.name[:19] + "..." if len(parqueadero.name) > 19 else parqueadero.name
             
             rows.append({
-                "id": f"detalle_parqueadero_{i}",
+                "id": f"detalle_parqueadero_{parqueadero.id}",
                 "title": f"🅿️ {name_truncated}",
                 "description": f"{estado} • {ultima_actualizacion}"
             })
         
-        # Agregar botones de navegación si hay múltiples páginas
-        if total_paginas > 1:
-            if pagina > 1:
-                rows.append({
-                    "id": f"pagina_anterior_{pagina - 1}",
-                    "title": "⬅️ Página anterior",
-                    "description": f"Ver página {pagina - 1} de {total_paginas}"
-                })
-            
-            if pagina < total_paginas:
-                rows.append({
-                    "id": f"pagina_siguiente_{pagina + 1}",
-                    "title": "➡️ Página siguiente",
-                    "description": f"Ver página {pagina + 1} de {total_paginas}"
-                })
+        # Agregar botones de navegación si hay más páginas
+        if hay_anterior and pagina > 1:
+            rows.append({
+                "id": f"pagina_anterior_{pagina - 1}",
+                "title": "⬅️ Página anterior",
+                "description": f"Ver página {pagina - 1}{de_total}"
+            })
+        
+        if hay_siguiente:
+            rows.append({
+                "id": f"pagina_siguiente_{pagina + 1}",
+                "title": "➡️ Página siguiente",
+                "description": f"Ver página {pagina + 1}{de_total}"
+            })
         
         # Agregar opción para volver
         rows.append({
@@ -471,11 +441,14 @@ Selecciona una acción:""",
         })
         
         sections = [{
-            "title": f"Parqueaderos (Pág. {pagina}/{total_paginas})" if total_paginas > 1 else "Parqueaderos con Cupos",
+            "title": f"Parqueaderos (Pág. {pagina}{'/' + str(total_paginas) if total_paginas else ''})" if hay_paginas else "Parqueaderos con Cupos",
             "rows": rows
         }]
         
-        body_text = f"Mostrando {fin - inicio} de {total_parqueaderos} parqueaderos. Selecciona uno para ver más detalles:" if total_paginas > 1 else "Selecciona un parqueadero para ver más detalles:"
+        if hay_paginas and total:
+            body_text = f"Mostrando {len(pagina_actual)} de {total} parqueaderos. Selecciona uno para ver más detalles:"
+        else:
+            body_text = "Selecciona un parqueadero para ver más detalles:"
         
         interactive_data = self.create_list_message(
             header_text="🅿️ Parqueaderos Disponibles",
@@ -485,6 +458,48 @@ Selecciona una acción:""",
         )
         return self.send_interactive_message(user_id, interactive_data)
     
+    def send_parqueaderos_cercanos(self, user_id: str, cercanos: List[Any]) -> bool:
+        """
+        Envía los parqueaderos con cupos más cercanos a la ubicación del conductor
+        Args:
+            user_id: ID del usuario
+            cercanos: Lista de (parqueadero, distancia en metros), del más cercano al más lejano
+        """
+        if not cercanos:
+            return False
+        
+        from app.utils.distancia_utils import formatear_distancia
+        
+        rows = []
+        for parqueadero, distancia in cercanos[:9]:  # Máximo 9 para dejar espacio al botón volver
+            estado = parqueadero.estado_ocupacion or "Disponible"
+            name_truncated = parqueadero.name[:19] + "..." if len(parqueadero.name) > 19 else parqueadero.name
+            
+            rows.append({
+                "id": f"detalle_parqueadero_{parqueadero.id}",
+                "title": f"🅿️ {name_truncated}",
+                "description": f"📏 {formatear_distancia(distancia)} • {estado}"
+            })
+        
+        rows.append({
+            "id": "volver_menu_conductor",
+            "title": "⬅️ Volver al menú",
+            "description": "Regresar al menú principal"
+        })
+        
+        sections = [{
+            "title": "Más cercanos con cupos",
+            "rows": rows
+        }]
+        
+        interactive_data = self.create_list_message(
+            header_text="📍 Parqueaderos Cercanos",
+            body_text="Estos son los parqueaderos con cupos más cercanos a tu ubicación. Selecciona uno para ver más detalles:",
+            button_text="📋 Ver opciones",
+            sections=sections
+        )
+        return self.send_interactive_message(user_id, interactive_data)
+    
     def send_parqueaderos_list(self, user_id: str, parqueaderos: List[Any]) -> bool:
         """Envía lista de parqueaderos para suscripción"""
         if not parqueaderos:
@@ -9,7 +9,7 @@ from app.services.message.mensaje_parqueadero_service import MensajeParqueaderoS
 from app.services.message.mensaje_suscripcion_service import MensajeSuscripcionService
 from app.services.message.mensaje_cupos_service import MensajeCuposService
 from app.services.message.mensaje_general_service import MensajeGeneralService
-from typing import List
+from typing import List, Optional
 
 
 class WhatsAppMessageService:
@@ -26,15 +26,17 @@ class WhatsAppMessageService:
     - MensajeGeneralService: Mensajes generales del sistema
     """
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, bienvenida_service=None, menu_service=None, error_service=None,
+                 parqueadero_service=None, suscripcion_service=None, cupos_service=None,
+                 general_service=None):
         self.db = db
-        self.bienvenida_service = MensajeBienvenidaService()
-        self.menu_service = MensajeMenuService(db)
-        self.error_service = MensajeErrorService()
-        self.parqueadero_service = MensajeParqueaderoService(db)
-        self.suscripcion_service = MensajeSuscripcionService(db)
-        self.cupos_service = MensajeCuposService(db)
-        self.general_service = MensajeGeneralService()
+        self.bienvenida_service = bienvenida_service or MensajeBienvenidaService()
+        self.menu_service = menu_service or MensajeMenuService(db)
+        self.error_service = error_service or MensajeErrorService()
+        self.parqueadero_service = parqueadero_service or MensajeParqueaderoService(db)
+        self.suscripcion_service = suscripcion_service or MensajeSuscripcionService(db)
+        self.cupos_service = cupos_service or MensajeCuposService(db)
+        self.general_service = general_service or MensajeGeneralService()
     
     # ===== MENSAJES DE BIENVENIDA Y REGISTRO =====
     
@@ -74,9 +76,13 @@ class WhatsAppMessageService:
     
     # ===== MENSAJES DE PARQUEADEROS =====
     
-    def mostrar_parqueaderos_interactivos(self, user_id: str, parqueaderos: List, pagina: int = 1) -> bool:
+    def mostrar_parqueaderos_interactivos(self, user_id: str, parqueaderos: List, pagina: int = 1,
+                                          hay_anterior: bool = False, hay_siguiente: bool = False,
+                                          total: Optional[int] = None) -> bool:
         """Muestra lista interactiva de parqueaderos"""
-        return self.parqueadero_service.mostrar_parqueaderos_interactivos(user_id, parqueaderos, pagina)
+        return self.parqueadero_service.mostrar_parqueaderos_interactivos(
+            user_id, parqueaderos, pagina, hay_anterior, hay_siguiente, total
+        )
     
     def mostrar_parqueaderos_disponibles(self, user_id: str, parqueaderos: List):
         """Muestra lista de parqueaderos con cupos disponibles"""
@@ -132,14 +138,6 @@ class WhatsAppMessageService:
         """Informa sobre limitación de desuscripción específica"""
         self.suscripcion_service.informar_desuscripcion_especifica_limitada(user_id)
     
-    def crear_notificacion_cupo_liberado(self, parqueadero) -> str:
-        """Crea el mensaje de notificación cuando se libera un cupo"""
-        return self.suscripcion_service.crear_notificacion_cupo_liberado(parqueadero)
-    
-    def enviar_notificacion_cupo(self, user_id: str, mensaje: str):
-        """Envía una notificación de cupo liberado"""
-        self.suscripcion_service.enviar_notificacion_cupo(user_id, mensaje)
-    
     # ===== MENSAJES DE ERROR Y VALIDACIÓN =====
     
     def error_opcion_invalida_menu_principal(self, user_id: str):
@@ -188,14 +186,6 @@ class WhatsAppMessageService:
         """Solicita confirmación antes de actualizar los cupos"""
         self.cupos_service.solicitar_confirmacion_cupos(user_id, opcion, descripcion, rango)
     
-    def confirmar_actualizacion_cupos(self, user_id: str, cupos_libres: str, notificaciones_enviadas: int):
-        """Confirma la actualización de cupos"""
-        self.cupos_service.confirmar_actualizacion_cupos(user_id, cupos_libres, notificaciones_enviadas)
-    
-    def confirmar_actualizacion_cupos_con_descripcion(self, user_id: str, descripcion: str, cupos_libres: str, notificaciones_enviadas: int):
-        """Confirma la actualización de cupos con descripción del estado"""
-        self.cupos_service.confirmar_actualizacion_cupos_con_descripcion(user_id, descripcion, cupos_libres, notificaciones_enviadas)
-    
     def mostrar_ayuda_cupos(self, user_id: str):
         """Muestra ayuda detallada sobre las opciones de cupos"""
         self.cupos_service.mostrar_ayuda_cupos(user_id)
@@ -0,0 +1,13 @@
+"""
+Utilidades para mostrar distancias a los usuarios
+"""
+
+def formatear_distancia(metros: float) -> str:
+    """
+    Formatea una distancia en metros para mostrarla al usuario
+    Returns:
+        str: "350 m" por debajo de un kilómetro, "1.2 km" desde ahí
+    """
+    if metros < 1000:
+        return f"{int(round(metros, -1))} m"
+    return f"{metros / 1000:.1f} km"
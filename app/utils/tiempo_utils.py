@@ -1,8 +1,54 @@
 """
 Utilidades para manejo de fechas y tiempo con zona horaria de Bogotá
+
+Las fechas se guardan en MongoDB como datetime nativos (BSON date, en UTC) y solo se
+convierten a la hora de Bogotá al mostrarlas. La zona se construye una sola vez.
+Los documentos antiguos guardaban texto "YYYY-MM-DD HH:MM:SS" en hora de Bogotá
+(ver app.database.migrar_fechas); las funciones de formato aceptan ambos.
 """
-from datetime import datetime
-import pytz
+from datetime import datetime, timezone
+from typing import Optional, Union
+from zoneinfo import ZoneInfo
+
+ZONA_BOGOTA = ZoneInfo("America/Bogota")
+FORMATO_LEGADO = "%Y-%m-%d %H:%M:%S"
+
+Momento = Union[datetime, str, None]
+
+def ahora() -> datetime:
+    """
+    Momento actual para guardar en MongoDB
+    Returns:
+        datetime: Fecha y hora actual en UTC (con zona)
+    """
+    return datetime.now(timezone.utc)
+
+def parsear_legado(timestamp: str) -> Optional[datetime]:
+    """
+    Convierte un timestamp de texto antiguo (hora de Bogotá) a datetime en UTC
+    Returns:
+        datetime o None si el texto no tiene el formato "YYYY-MM-DD HH:MM:SS"
+    """
+    try:
+        return datetime.strptime(timestamp, FORMATO_LEGADO).replace(tzinfo=ZONA_BOGOTA).astimezone(timezone.utc)
+    except (ValueError, TypeError):
+        return None
+
+def normalizar_fecha(valor: Momento) -> Optional[datetime]:
+    """
+    Normaliza lo que venga de MongoDB o de la API a datetime con zona:
+    texto antiguo -> UTC, datetime sin zona -> UTC (así los devuelve pymongo sin tz_aware)
+    """
+    if isinstance(valor, str):
+        return parsear_legado(valor)
+    if isinstance(valor, datetime) and valor.tzinfo is None:
+        return valor.replace(tzinfo=timezone.utc)
+    return valor
+
+def a_bogota(valor: Momento) -> Optional[datetime]:
+    """Convierte una fecha (datetime o texto antiguo) a la hora de Bogotá"""
+    momento = normalizar_fecha(valor)
+    return momento.astimezone(ZONA_BOGOTA) if momento else None
 
 def obtener_tiempo_bogota() -> str:
     """
@@ -10,11 +56,9 @@ def obtener_tiempo_bogota() -> str:
     Returns:
         str: Timestamp en formato "YYYY-MM-DD HH:MM:SS" en zona horaria de Bogotá
     """
-    zona_bogota = pytz.timezone('America/Bogota')
-    tiempo_actual = datetime.now(zona_bogota)
-    return tiempo_actual.strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.now(ZONA_BOGOTA).strftime(FORMATO_LEGADO)
 
-def obtener_tiempo_bogota_formato(formato: str = "%Y-%m-%d %H:%M:%S") -> str:
+def obtener_tiempo_bogota_formato(formato: str = FORMATO_LEGADO) -> str:
     """
     Obtiene el tiempo actual en la zona horaria de Bogotá con formato personalizado
     Args:
@@ -22,9 +66,7 @@ def obtener_tiempo_bogota_formato(formato: str = "%Y-%m-%d %H:%M:%S") -> str:
     Returns:
         str: Timestamp formateado en zona horaria de Bogotá
     """
-    zona_bogota = pytz.timezone('America/Bogota')
-    tiempo_actual = datetime.now(zona_bogota)
-    return tiempo_actual.strftime(formato)
+    return datetime.now(ZONA_BOGOTA).strftime(formato)
 
 def obtener_fecha_bogota() -> str:
     """
@@ -42,60 +84,48 @@ def obtener_hora_bogota() -> str:
     """
     return obtener_tiempo_bogota_formato("%H:%M:%S")
 
-def formatear_tiempo_para_usuario(timestamp: str) -> str:
+def formatear_tiempo_para_usuario(timestamp: Momento) -> str:
     """
-    Formatea un timestamp para mostrar al usuario de manera más legible
+    Formatea una fecha para mostrar al usuario de manera más legible
     Args:
-        timestamp (str): Timestamp en formato "YYYY-MM-DD HH:MM:SS"
+        timestamp: datetime (UTC) o texto antiguo "YYYY-MM-DD HH:MM:SS"
     Returns:
-        str: Timestamp formateado para el usuario
+        str: Fecha en hora de Bogotá, "DD/MM/YYYY HH:MM"
     """
-    try:
-        # Parsear el timestamp
-        dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-        # Formatear para mostrar al usuario (más legible)
-        return dt.strftime("%d/%m/%Y %H:%M")
-    except (ValueError, TypeError):
+    dt = a_bogota(timestamp)
+    if dt is None:
+        # Texto ya formateado o vacío: se muestra tal cual
         return timestamp or "N/A"
+    # Formato directo con los campos (strftime es bastante más lento)
+    return f"{dt.day:02d}/{dt.month:02d}/{dt.year} {dt.hour:02d}:{dt.minute:02d}"
 
-def tiempo_relativo(timestamp: str) -> str:
+def tiempo_relativo(timestamp: Momento) -> str:
     """
-    Convierte un timestamp en texto relativo (hace cuánto tiempo)
+    Convierte una fecha en texto relativo (hace cuánto tiempo)
     Args:
-        timestamp (str): Timestamp en formato "YYYY-MM-DD HH:MM:SS"
+        timestamp: datetime (UTC) o texto antiguo "YYYY-MM-DD HH:MM:SS"
     Returns:
         str: Tiempo relativo (ej: "Hace 5 min", "Hace 2 horas")
     """
-    try:
-        zona_bogota = pytz.timezone('America/Bogota')
-        
-        # Parsear el timestamp y asignar zona horaria de Bogotá
-        dt = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-        dt = zona_bogota.localize(dt)
-        
-        # Obtener tiempo actual en Bogotá
-        ahora = datetime.now(zona_bogota)
-        
-        # Calcular diferencia
-        diferencia = ahora - dt
-        
-        # Convertir a formato legible
-        segundos = int(diferencia.total_seconds())
-        
-        if segundos < 60:
-            return "Hace unos segundos"
-        elif segundos < 3600:  # Menos de 1 hora
-            minutos = segundos // 60
-            return f"Hace {minutos} min"
-        elif segundos < 86400:  # Menos de 1 día
-            horas = segundos // 3600
-            return f"Hace {horas}h"
-        elif segundos < 604800:  # Menos de 1 semana
-            dias = segundos // 86400
-            return f"Hace {dias}d"
-        else:
-            # Más de 1 semana, mostrar fecha
-            return dt.strftime("%d/%m/%Y")
-            
-    except (ValueError, TypeError):
-        return "Desconocido"
\ No newline at end of file
+    momento = normalizar_fecha(timestamp)
+    if momento is None:
+        return "Desconocido"
+    
+    # La diferencia no depende de la zona: se calcula en UTC
+    segundos = int((ahora() - momento).total_seconds())
+    
+    if segundos < 60:
+        return "Hace unos segundos"
+    elif segundos < 3600:  # Menos de 1 hora
+        minutos = segundos // 60
+        return f"Hace {minutos} min"
+    elif segundos < 86400:  # Menos de 1 día
+        horas = segundos // 3600
+        return f"Hace {horas}h"
+    elif segundos < 604800:  # Menos de 1 semana
+        dias = segundos // 86400
+        return f"Hace {dias}d"
+    else:
+        # Más de 1 semana, mostrar fecha
+        dt = momento.astimezone(ZONA_BOGOTA)
+        return f"{dt.day:02d}/{dt.month:02d}/{dt.year}"
@@ -0,0 +1,25 @@
+"""
+Worker que procesa la cola de trabajos en segundo plano (notificaciones de cupos).
+
+Uso:
+    python -m app.worker
+"""
+import os
+from app.database.db_conn import get_db, inicializar_base_datos, imprimir_reporte
+from app.services.cola_notificaciones_service import ColaNotificacionesService
+
+WORKER_INTERVALO = float(os.getenv("WORKER_INTERVALO", "1"))
+
+
+def main():
+    db = get_db()
+    imprimir_reporte(inicializar_base_datos(db))
+    cola_service = ColaNotificacionesService(db)
+    try:
+        cola_service.ejecutar(WORKER_INTERVALO)
+    except KeyboardInterrupt:
+        print("Worker detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Prueba de carga del limitador de envíos contra un endpoint local que simula la
+Graph API (no se contacta a Meta).
+
+Lanza una ráfaga de notificaciones y, en paralelo, respuestas de conversación;
+el stub responde 429 con Retry-After a partir de --limite-stub mensajes por segundo.
+Reporta la espera por prioridad y cuántos 429 se recibieron.
+
+Uso:
+    python -m bench.bench_limitador --notificaciones 300 --respuestas 20 --tasa 50
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.fanout_service import FanoutService
+from app.services.limitador_envios import LimitadorEnvios
+from app.services.whatsapp_client import WhatsAppClient
+
+
+def crear_stub(limite_por_segundo: int) -> ThreadingHTTPServer:
+    """Servidor local: 200, o 429 con Retry-After si se supera el límite por segundo"""
+    recientes = deque()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                ahora = time.monotonic()
+                while recientes and ahora - recientes[0] > 1:
+                    recientes.popleft()
+                excedido = len(recientes) >= limite_por_segundo
+                if not excedido:
+                    recientes.append(ahora)
+            cuerpo = json.dumps({"error": "rate limit"} if excedido else {"messages": [{"id": "stub"}]}).encode()
+            self.send_response(429 if excedido else 200)
+            if excedido:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notificaciones", type=int, default=300)
+    parser.add_argument("--respuestas", type=int, default=20)
+    parser.add_argument("--tasa", type=float, default=50, help="tasa configurada en el limitador (msg/s)")
+    parser.add_argument("--limite-stub", type=int, default=40, help="msg/s que acepta el stub antes de responder 429")
+    args = parser.parse_args()
+
+    servidor = crear_stub(args.limite_stub)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    cliente = WhatsAppClient(
+        api_url=f"http://127.0.0.1:{servidor.server_address[1]}",
+        access_token="bench",
+        phone_number_id="bench",
+        limitador=LimitadorEnvios(tasa=args.tasa, rafaga=args.tasa)
+    )
+
+    fanout = threading.Thread(
+        target=FanoutService(cliente=cliente).enviar_personalizados,
+        args=({f"57300{i:07d}": "Cupo liberado (bench)" for i in range(args.notificaciones)},)
+    )
+    inicio = time.perf_counter()
+    fanout.start()
+    time.sleep(0.5)  # la ráfaga ya está en curso cuando llegan las respuestas
+    for i in range(args.respuestas):
+        cliente.enviar_texto(f"57310{i:07d}", "Menú (bench)")
+        time.sleep(0.05)
+    fanout.join()
+
+    print(f"Duración total: {time.perf_counter() - inicio:.2f}s")
+    print(json.dumps(cliente.metricas()["limitador"], indent=2))
+    cliente.cerrar()
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
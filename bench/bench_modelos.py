@@ -0,0 +1,78 @@
+"""
+Costo por documento de convertir lo que devuelve pymongo en objetos de Python:
+validación completa de pydantic (Modelo(**doc), lo que hacían los repositorios),
+construcción confiable (construir_confiable) y fila liviana de una proyección.
+
+Los documentos son sintéticos con la forma de los de cada colección; no se consulta MongoDB.
+
+Uso:
+    python -m bench.bench_modelos --documentos 20000
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+from app.models.database_models import Parqueadero, Suscripcion, User
+from app.repositories.base_repository import construir_confiable, fila_para
+
+AHORA = datetime(2025, 3, 14, 13, 45, tzinfo=timezone.utc)
+
+
+def documento_parqueadero(i: int) -> dict:
+    return {
+        "_id": f"parqueadero-{i}", "name": f"Parqueadero {i}", "ubicacion": f"Calle {i} # 10-20",
+        "capacidad": 40, "cupos_libres": "10", "tiene_cupos": True, "rango_cupos": "6-15 cupos",
+        "estado_ocupacion": "Algunos cupos disponibles", "ultima_actualizacion": AHORA, "version": i,
+        "coordenadas": {"type": "Point", "coordinates": [-74.06, 4.65]}
+    }
+
+
+def documento_usuario(i: int) -> dict:
+    return {
+        "_id": f"57300{i:07d}", "name": f"Conductor {i}", "rol": "conductor", "estado_registro": "completo",
+        "estado_chat": {"ultima_interaccion": AHORA, "paso_actual": "viendo_parqueaderos",
+                        "contexto_temporal": {"pagina_actual": 1}}
+    }
+
+
+def documento_suscripcion(i: int) -> dict:
+    return {"_id": f"suscripcion-{i}", "conductor_id": f"57300{i:07d}", "parqueadero_id": f"parqueadero-{i % 50}",
+            "fecha_suscripcion": AHORA, "activa": True}
+
+
+def medir(funcion, documentos) -> float:
+    """Microsegundos por documento"""
+    inicio = time.perf_counter()
+    for doc in documentos:
+        funcion(doc)
+    return (time.perf_counter() - inicio) / len(documentos) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=20000)
+    args = parser.parse_args()
+
+    casos = [
+        ("parqueaderos", Parqueadero, documento_parqueadero, ("name",)),
+        ("usuarios", User, documento_usuario, ("estado_chat.paso_actual",)),
+        ("suscripciones", Suscripcion, documento_suscripcion, ("conductor_id",)),
+    ]
+    print(f"{'colección':<14} {'validado µs':>12} {'confiable µs':>13} {'fila µs':>9}   (por documento)")
+    for nombre, modelo, generar, campos in casos:
+        documentos = [generar(i) for i in range(args.documentos)]
+        fila = fila_para(campos)
+
+        def a_fila(doc):
+            valor = doc
+            for parte in campos[0].split("."):
+                valor = valor.get(parte)
+            return fila(doc["_id"], valor)
+
+        validado = medir(lambda doc: modelo(**doc), documentos)
+        confiable = medir(lambda doc: construir_confiable(modelo, doc), documentos)
+        liviano = medir(a_fila, documentos)
+        print(f"{nombre:<14} {validado:>12.2f} {confiable:>13.2f} {liviano:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
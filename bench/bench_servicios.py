@@ -0,0 +1,87 @@
+"""
+Costo por webhook de obtener los servicios de flujo: armar WhatsAppMessageService y
+WhatsAppFlowService en cada mensaje (antes) vs. tomarlos del ContenedorServicios
+creado en el lifespan (después).
+
+Mide bloques y bytes asignados por mensaje (tracemalloc), objetos de servicio y
+repositorio creados, y la latencia. No envía mensajes ni consulta MongoDB: pymongo
+conecta de forma perezosa y construir los servicios solo toca db[...].
+
+Uso:
+    python -m bench.bench_servicios --mensajes 2000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from app.database.db_conn import get_db
+from app.repositories.base_repository import BaseRepository
+from app.services.contenedor_servicios import ContenedorServicios
+from app.services.whatsapp_flow_service import WhatsAppFlowService
+from app.services.whatsapp_message_service import WhatsAppMessageService
+
+
+def por_mensaje_antes(db, contenedor):
+    return WhatsAppMessageService(db), WhatsAppFlowService(db)
+
+
+def por_mensaje_despues(db, contenedor):
+    return contenedor.message_service, contenedor.flow_service
+
+
+def _contar_instancias() -> dict:
+    servicios = repositorios = 0
+    for objeto in gc.get_objects():
+        if isinstance(objeto, BaseRepository):
+            repositorios += 1
+        elif type(objeto).__module__.startswith("app.services"):
+            servicios += 1
+    return {"servicios": servicios, "repositorios": repositorios}
+
+
+def contar_creados(funcion, db, contenedor) -> dict:
+    """Instancias de servicios y repositorios que crea una llamada"""
+    gc.collect()
+    antes = _contar_instancias()
+    resultado = funcion(db, contenedor)
+    despues = _contar_instancias()
+    del resultado
+    return {clave: despues[clave] - antes[clave] for clave in antes}
+
+
+def medir(nombre: str, funcion, db, contenedor, mensajes: int):
+    funcion(db, contenedor)  # calentamiento (imports, caches)
+    gc.collect()
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    retenidos = [funcion(db, contenedor) for _ in range(min(mensajes, 200))]
+    diferencia = tracemalloc.take_snapshot().compare_to(antes, "filename")
+    tracemalloc.stop()
+    bloques = sum(d.count_diff for d in diferencia) / len(retenidos)
+    bytes_ = sum(d.size_diff for d in diferencia) / len(retenidos)
+    del retenidos
+
+    inicio = time.perf_counter()
+    for _ in range(mensajes):
+        funcion(db, contenedor)
+    latencia_us = (time.perf_counter() - inicio) / mensajes * 1e6
+
+    objetos = contar_creados(funcion, db, contenedor)
+    print(f"{nombre:<12} {objetos['servicios']:>9} {objetos['repositorios']:>12} "
+          f"{bloques:>10.0f} {bytes_ / 1024:>10.1f} {latencia_us:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mensajes", type=int, default=2000)
+    args = parser.parse_args()
+
+    db = get_db()
+    contenedor = ContenedorServicios(db)
+    print(f"{'':<12} {'servicios':>9} {'repositorios':>12} {'bloques':>10} {'KiB':>10} {'µs/mensaje':>12}")
+    medir("antes", por_mensaje_antes, db, contenedor, args.mensajes)
+    medir("después", por_mensaje_despues, db, contenedor, args.mensajes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark del cálculo de destinatarios del fan-out con 100k suscriptores.
+
+Compara, para un parqueadero:
+  - antes: find_suscripciones_by_parqueadero ($or + un modelo Suscripcion por documento)
+  - vista: SuscriptoresRepository.find_conductores (dos documentos de la vista materializada)
+  - caché: CacheSuscriptores.destinatarios (unión de dos frozenset en memoria)
+
+Usa la base "bench_suscriptores" del MONGO_URL configurado (la borra y la vuelve a sembrar).
+Con --solo-memoria no se conecta a MongoDB: compara decodificar los modelos contra la unión de conjuntos.
+
+Uso:
+    python -m bench.bench_suscriptores --suscriptores 100000 --parqueaderos 200
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from app.models.database_models import Suscripcion
+from app.repositories.suscriptores_repository import GLOBAL
+
+
+def generar_suscripciones(suscriptores: int, parqueaderos: int, proporcion_global: float, semilla: int = 7):
+    """Documentos de suscripción: cada conductor es global o sigue de 1 a 3 parqueaderos"""
+    aleatorio = random.Random(semilla)
+    ids_parqueaderos = [f"parq-{i:04d}" for i in range(parqueaderos)]
+    documentos = []
+    for i in range(suscriptores):
+        conductor_id = f"57300{i:07d}"
+        if aleatorio.random() < proporcion_global:
+            seguidos = [None]
+        else:
+            seguidos = aleatorio.sample(ids_parqueaderos, aleatorio.randint(1, 3))
+        for parqueadero_id in seguidos:
+            documentos.append({
+                "_id": str(uuid.uuid4()),
+                "conductor_id": conductor_id,
+                "parqueadero_id": parqueadero_id,
+                "fecha_suscripcion": datetime(2025, 1, 1, tzinfo=timezone.utc),
+                "activa": True
+            })
+    return ids_parqueaderos, documentos
+
+
+def medir(nombre: str, funcion, repeticiones: int):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    print(f"{nombre:<34} mediana {statistics.median(tiempos):9.3f} ms   máx {max(tiempos):9.3f} ms   "
+          f"destinatarios {len(resultado)}")
+
+
+def bench_memoria(documentos, objetivo: str, repeticiones: int):
+    seleccion = [d for d in documentos if d["parqueadero_id"] in (objetivo, None)]
+    conjuntos = {}
+    for d in documentos:
+        conjuntos.setdefault(d["parqueadero_id"] or GLOBAL, set()).add(d["conductor_id"])
+    conjuntos = {clave: frozenset(valor) for clave, valor in conjuntos.items()}
+    medir("decodificar modelos Suscripcion", lambda: [Suscripcion(**d).conductor_id for d in seleccion], repeticiones)
+    medir("unión de conjuntos", lambda: conjuntos[objetivo] | conjuntos[GLOBAL], repeticiones)
+
+
+def bench_mongo(documentos, objetivo: str, repeticiones: int):
+    from pymongo import MongoClient
+    from app.database.db_conn import inicializar_base_datos
+    from app.logic.suscriptores import CacheSuscriptores
+    from app.repositories.suscripcion_repository import SuscripcionRepository
+    from app.repositories.suscriptores_repository import SuscriptoresRepository
+
+    client = MongoClient(os.getenv("MONGO_URL"), tz_aware=True)
+    client.drop_database("bench_suscriptores")
+    db = client["bench_suscriptores"]
+    inicializar_base_datos(db)
+    db["suscripciones"].insert_many(documentos, ordered=False)
+    inicio = time.perf_counter()
+    conjuntos = SuscriptoresRepository(db).reconstruir()
+    print(f"Vista reconstruida: {conjuntos} conjuntos en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    suscripciones = SuscripcionRepository(db)
+    vista = SuscriptoresRepository(db)
+    cache = CacheSuscriptores(intervalo=3600)
+    cache.conjuntos(db)  # carga inicial fuera de la medición
+
+    medir("antes: $or + modelos", lambda: [s.conductor_id for s in suscripciones.find_suscripciones_by_parqueadero(objetivo)], repeticiones)
+    medir("vista materializada", lambda: vista.find_conductores(objetivo), repeticiones)
+    medir("caché en memoria", lambda: cache.destinatarios(objetivo, db), repeticiones)
+    client.drop_database("bench_suscriptores")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suscriptores", type=int, default=100_000)
+    parser.add_argument("--parqueaderos", type=int, default=200)
+    parser.add_argument("--proporcion-global", type=float, default=0.2)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--solo-memoria", action="store_true")
+    args = parser.parse_args()
+
+    parqueaderos, documentos = generar_suscripciones(args.suscriptores, args.parqueaderos, args.proporcion_global)
+    print(f"{args.suscriptores} conductores, {len(documentos)} suscripciones, {args.parqueaderos} parqueaderos")
+    objetivo = parqueaderos[0]
+    if args.solo_memoria:
+        bench_memoria(documentos, objetivo, args.repeticiones)
+    else:
+        bench_mongo(documentos, objetivo, args.repeticiones)
+
+
+if __name__ == "__main__":
+    main()
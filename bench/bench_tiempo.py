@@ -0,0 +1,69 @@
+"""
+Micro-benchmark de las utilidades de tiempo.
+
+Compara la zona construida con pytz en cada llamada (implementación anterior) contra
+la zona zoneinfo cacheada, y el formateo desde texto (strptime) contra el formateo
+desde datetime nativo. pytz es opcional: si no está instalado se omite esa columna.
+
+Uso:
+    python -m bench.bench_tiempo --iteraciones 100000
+"""
+import argparse
+import timeit
+from datetime import datetime, timezone
+from app.utils import tiempo_utils
+
+try:
+    import pytz
+except ImportError:
+    pytz = None
+
+TEXTO = "2025-03-14 08:45:10"
+
+
+def ahora_pytz() -> str:
+    zona_bogota = pytz.timezone('America/Bogota')
+    return datetime.now(zona_bogota).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def formatear_desde_texto(timestamp: str) -> str:
+    return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
+
+
+def relativo_pytz(timestamp: str) -> int:
+    zona_bogota = pytz.timezone('America/Bogota')
+    dt = zona_bogota.localize(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S"))
+    return int((datetime.now(zona_bogota) - dt).total_seconds())
+
+
+def medir(nombre: str, funcion, iteraciones: int):
+    segundos = min(timeit.repeat(funcion, number=iteraciones, repeat=3))
+    print(f"{nombre:<44} {segundos / iteraciones * 1e6:8.3f} µs/llamada")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iteraciones", type=int, default=100_000)
+    args = parser.parse_args()
+    n = args.iteraciones
+    fecha = tiempo_utils.parsear_legado(TEXTO)
+
+    print("Momento actual")
+    if pytz:
+        medir("  pytz.timezone() por llamada + strftime", ahora_pytz, n)
+    medir("  zoneinfo cacheada + strftime", tiempo_utils.obtener_tiempo_bogota, n)
+    medir("  ahora() en UTC (lo que se guarda)", tiempo_utils.ahora, n)
+
+    print("Formato para el usuario")
+    medir("  strptime + strftime (texto)", lambda: formatear_desde_texto(TEXTO), n)
+    medir("  formatear_tiempo_para_usuario(texto)", lambda: tiempo_utils.formatear_tiempo_para_usuario(TEXTO), n)
+    medir("  formatear_tiempo_para_usuario(datetime)", lambda: tiempo_utils.formatear_tiempo_para_usuario(fecha), n)
+
+    print("Tiempo relativo")
+    if pytz:
+        medir("  pytz + strptime (implementación anterior)", lambda: relativo_pytz(TEXTO), n)
+    medir("  tiempo_relativo(datetime)", lambda: tiempo_utils.tiempo_relativo(fecha), n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de carga del webhook: requests/segundo procesando el flujo antes de
+responder (inline) vs. despachándolo a los hilos del despachador, con el registro
+en "mensajes" antes del flujo o diferido por lotes (registro_mensajes).
+
+El flujo se reemplaza por una espera de --latencia-ms que simula las llamadas a
+la Graph API; el insert en "mensajes" sí se hace contra MongoDB (MONGO_URL).
+
+Uso:
+    python -m bench.bench_webhook --peticiones 500 --concurrencia 50 --latencia-ms 150
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from app.main import app
+from app.database.db_conn import get_db
+from app.logic.despachador import despachador
+from app.logic.registro_mensajes import registro_mensajes
+from app.routers import webhook_router
+from app.services.contenedor_servicios import ContenedorServicios
+
+
+def crear_payload(i: int, usuarios: int) -> dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "bench",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "0", "phone_number_id": "0"},
+                    "messages": [{
+                        "from": f"57300{i % usuarios:07d}",
+                        "id": f"wamid.bench.{time.time_ns()}.{i}",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": "menu"}
+                    }]
+                }
+            }]
+        }]
+    }
+
+
+async def medir(peticiones: int, concurrencia: int, usuarios: int) -> float:
+    """Retorna requests/segundo"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def enviar(i: int):
+            async with semaforo:
+                response = await client.post("/webhook/", json=crear_payload(i, usuarios))
+                response.raise_for_status()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(enviar(i) for i in range(peticiones)))
+        return peticiones / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--latencia-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    def flujo_simulado(msg, db, servicios=None):
+        time.sleep(args.latencia_ms / 1000)
+
+    webhook_router.handle_message = flujo_simulado
+    # ASGITransport no ejecuta el lifespan
+    app.state.servicios = ContenedorServicios(get_db())
+
+    casos = (("inline", False, False), ("despachado", True, False), ("despachado + diferido", True, True))
+    for nombre, asincrono, diferido in casos:
+        webhook_router.WEBHOOK_ASINCRONO = asincrono
+        webhook_router.REGISTRO_DIFERIDO = diferido
+        rps = asyncio.run(medir(args.peticiones, args.concurrencia, args.usuarios))
+        print(f"{nombre:<22} {rps:10.1f} req/s")
+
+    despachador.cerrar()
+    registro_mensajes.cerrar()
+    metricas = registro_mensajes.metricas()
+    print(f"registro diferido: {metricas['escritos']} mensajes en {metricas['lotes']} lotes, "
+          f"escritura máx {metricas['escritura_max_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("pymongo")
+
+from app.logic.parqueaderos import FotoParqueaderos, cursor_de
+from app.models.database_models import Parqueadero
+
+BASE = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _parqueadero(_id, ultima=None, tiene_cupos=True):
+    return Parqueadero(**{"_id": _id, "name": _id, "ubicacion": "Calle 1", "capacidad": 10,
+                          "tiene_cupos": tiene_cupos, "ultima_actualizacion": ultima})
+
+
+def _foto(parqueaderos):
+    return FotoParqueaderos({p.id: p for p in parqueaderos}, version=1)
+
+
+def _ids(parqueaderos):
+    return [p.id for p in parqueaderos]
+
+
+def test_recorre_hacia_adelante_y_atras_sin_saltar_ni_repetir():
+    # p00 es el más reciente: el orden de la foto es p00, p01, ..., p09
+    foto = _foto([_parqueadero(f"p{i:02d}", BASE - timedelta(minutes=i)) for i in range(10)])
+    orden = [f"p{i:02d}" for i in range(10)]
+
+    paginas = []
+    pagina, hay_anterior, hay_siguiente = foto.pagina(3)
+    assert (hay_anterior, hay_siguiente) == (False, True)
+    paginas.append(pagina)
+    while hay_siguiente:
+        pagina, hay_anterior, hay_siguiente = foto.pagina(3, despues_de=cursor_de(paginas[-1][-1]))
+        assert hay_anterior
+        paginas.append(pagina)
+    assert [_ids(p) for p in paginas] == [orden[0:3], orden[3:6], orden[6:9], orden[9:]]
+
+    # Hacia atrás desde la última página se obtienen las mismas páginas
+    for esperada, actual in zip(reversed(paginas[:-1]), reversed(paginas[1:])):
+        pagina, hay_anterior, hay_siguiente = foto.pagina(3, antes_de=cursor_de(actual[0]))
+        assert _ids(pagina) == _ids(esperada)
+        assert hay_siguiente
+        assert hay_anterior == (esperada is not paginas[0])
+
+
+def test_repetir_pagina_incluye_el_cursor():
+    foto = _foto([_parqueadero(f"p{i:02d}", BASE - timedelta(minutes=i)) for i in range(10)])
+    pagina, _, _ = foto.pagina(3, despues_de=["2025-03-01 06:57:00", "p03"])  # texto: 11:57 UTC
+    repetida, hay_anterior, hay_siguiente = foto.pagina(3, desde=cursor_de(pagina[0]))
+    assert _ids(repetida) == _ids(pagina) == ["p04", "p05", "p06"]
+    assert (hay_anterior, hay_siguiente) == (True, True)
+
+
+def test_antes_de_la_segunda_pagina_corta_en_el_inicio():
+    foto = _foto([_parqueadero(f"p{i:02d}", BASE - timedelta(minutes=i)) for i in range(10)])
+    pagina, hay_anterior, hay_siguiente = foto.pagina(3, antes_de=cursor_de(foto.con_cupos[2]))
+    assert _ids(pagina) == ["p00", "p01"]
+    assert (hay_anterior, hay_siguiente) == (False, True)
+
+
+def test_misma_fecha_desempata_por_id():
+    foto = _foto([_parqueadero(_id, BASE) for _id in "abcde"])
+    assert _ids(foto.con_cupos) == ["e", "d", "c", "b", "a"]
+
+    pagina, _, hay_siguiente = foto.pagina(2, despues_de=[BASE, "d"])
+    assert _ids(pagina) == ["c", "b"] and hay_siguiente
+    pagina, hay_anterior, _ = foto.pagina(2, antes_de=[BASE, "b"])
+    assert _ids(pagina) == ["d", "c"] and hay_anterior
+    pagina, _, _ = foto.pagina(2, desde=[BASE, "c"])
+    assert _ids(pagina) == ["c", "b"]
+
+
+def test_sin_fecha_van_al_final():
+    foto = _foto([
+        _parqueadero("con-fecha", BASE),
+        _parqueadero("sin-fecha-a"),
+        _parqueadero("sin-fecha-b"),
+        _parqueadero("sin-cupos", BASE + timedelta(hours=1), tiene_cupos=False),
+    ])
+    assert _ids(foto.con_cupos) == ["con-fecha", "sin-fecha-b", "sin-fecha-a"]
+
+    pagina, hay_anterior, hay_siguiente = foto.pagina(1, despues_de=cursor_de(foto.con_cupos[0]))
+    assert _ids(pagina) == ["sin-fecha-b"] and (hay_anterior, hay_siguiente) == (True, True)
+    # El cursor de un parqueadero sin fecha guarda None
+    pagina, _, hay_siguiente = foto.pagina(1, despues_de=[None, "sin-fecha-b"])
+    assert _ids(pagina) == ["sin-fecha-a"] and not hay_siguiente
+    pagina, hay_anterior, _ = foto.pagina(1, antes_de=[None, "sin-fecha-b"])
+    assert _ids(pagina) == ["con-fecha"] and not hay_anterior
+
+
+def test_cursor_de_texto_legado():
+    # "2025-03-01 07:00:00" en hora de Bogotá es BASE (12:00 UTC)
+    foto = _foto([_parqueadero("nuevo", BASE + timedelta(minutes=1)), _parqueadero("actual", BASE),
+                  _parqueadero("viejo", BASE - timedelta(minutes=1))])
+    pagina, _, _ = foto.pagina(5, desde=["2025-03-01 07:00:00", "actual"])
+    assert _ids(pagina) == ["actual", "viejo"]
+    pagina, _, _ = foto.pagina(5, despues_de=["2025-03-01 07:00:00", "actual"])
+    assert _ids(pagina) == ["viejo"]
+    pagina, _, _ = foto.pagina(5, antes_de=["2025-03-01 07:00:00", "actual"])
+    assert _ids(pagina) == ["nuevo"]
+
+
+def test_foto_vacia():
+    assert _foto([]).pagina(7) == ([], False, False)
+
+
+@pytest.mark.skipif(not os.getenv("MONGO_URL"), reason="requiere MONGO_URL (servidor de MongoDB de prueba)")
+def test_find_pagina_con_cupos_coincide_con_la_foto():
+    from pymongo import MongoClient
+    from app.repositories.parqueadero_repository import ParqueaderoRepository
+
+    client = MongoClient(os.getenv("MONGO_URL"), tz_aware=True)
+    client.drop_database("test_paginacion")
+    try:
+        repo = ParqueaderoRepository(client["test_paginacion"])
+        repo.crear_indices()
+        parqueaderos = ([_parqueadero(f"p{i:02d}", BASE - timedelta(minutes=i // 2)) for i in range(9)]
+                        + [_parqueadero(f"s{i}") for i in range(3)] + [_parqueadero("x", BASE, tiene_cupos=False)])
+        repo.collection.insert_many([p.model_dump(by_alias=True) for p in parqueaderos])
+        foto = _foto(parqueaderos)
+
+        # Cada parqueadero como cursor, en los tres modos: mismas páginas que la foto
+        for cursor in [None] + [cursor_de(p) for p in foto.con_cupos]:
+            for modo in ("despues_de", "desde", "antes_de"):
+                if cursor is None and modo != "despues_de":
+                    continue
+                esperada, hay_anterior, hay_siguiente = foto.pagina(4, **{modo: cursor})
+                pagina, hay_mas = repo.find_pagina_con_cupos(4, **{modo: cursor})
+                assert _ids(pagina) == _ids(esperada), (modo, cursor)
+                assert hay_mas == (hay_anterior if modo == "antes_de" else hay_siguiente), (modo, cursor)
+    finally:
+        client.drop_database("test_paginacion")
+        client.close()
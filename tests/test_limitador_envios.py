@@ -0,0 +1,140 @@
+import threading
+import time
+import pytest
+from app.services.limitador_envios import (
+    CuotaCompartida, LimitadorEnvios, RelojFalso, PRIORIDAD_CONVERSACION, PRIORIDAD_NOTIFICACION
+)
+
+
+class RelojManual(RelojFalso):
+    """El tiempo solo avanza con avanzar(): los hilos bloqueados esperan de verdad"""
+
+    def esperar(self, condicion, segundos):
+        condicion.wait(0.005)
+
+
+class CuotaEnMemoria:
+    """Mismo contrato que CuotaEnviosRepository, sin MongoDB"""
+
+    def __init__(self):
+        self.enviados = {}
+        self.pausas = {}
+
+    def reservar(self, clave, ventana, tope):
+        actual = self.enviados.get((clave, ventana), 0)
+        if actual >= tope:
+            return False
+        self.enviados[(clave, ventana)] = actual + 1
+        return True
+
+    def pausar(self, clave, hasta):
+        self.pausas[clave] = max(self.pausas.get(clave, 0.0), hasta)
+
+    def pausa_hasta(self, clave):
+        return self.pausas.get(clave, 0.0)
+
+
+def _esperar_hasta(condicion, limite=2.0):
+    fin = time.monotonic() + limite
+    while not condicion():
+        assert time.monotonic() < fin, "timeout esperando al hilo"
+        time.sleep(0.002)
+
+
+def _en_cola(limitador, nombre):
+    return limitador.metricas()["prioridades"][nombre]["en_cola"]
+
+
+def test_conversacion_pasa_antes_que_notificacion_en_espera():
+    reloj = RelojManual()
+    limitador = LimitadorEnvios(tasa=1, rafaga=1, reloj=reloj)
+    limitador.adquirir(PRIORIDAD_NOTIFICACION)  # agota el único token
+    orden = []
+
+    def enviar(prioridad, nombre):
+        limitador.adquirir(prioridad)
+        orden.append(nombre)
+
+    notificacion = threading.Thread(target=enviar, args=(PRIORIDAD_NOTIFICACION, "notificacion"))
+    notificacion.start()
+    _esperar_hasta(lambda: _en_cola(limitador, "notificacion") == 1)
+    conversacion = threading.Thread(target=enviar, args=(PRIORIDAD_CONVERSACION, "conversacion"))
+    conversacion.start()
+    _esperar_hasta(lambda: _en_cola(limitador, "conversacion") == 1)
+
+    reloj.avanzar(1)
+    _esperar_hasta(lambda: len(orden) == 1)
+    reloj.avanzar(1)
+    notificacion.join(2)
+    conversacion.join(2)
+    assert orden == ["conversacion", "notificacion"]
+
+
+def test_recarga_a_la_tasa_configurada():
+    reloj = RelojFalso()
+    limitador = LimitadorEnvios(tasa=10, rafaga=5, reloj=reloj)
+    for _ in range(5):
+        limitador.adquirir()
+    assert reloj.tiempo == 0  # la ráfaga no espera
+
+    for _ in range(10):
+        limitador.adquirir()
+    assert reloj.tiempo == pytest.approx(1.0)
+
+
+def test_429_pausa_reduce_a_la_mitad_y_recupera():
+    reloj = RelojFalso()
+    limitador = LimitadorEnvios(tasa=10, rafaga=1, tasa_minima=1, reloj=reloj)
+    limitador.registrar_respuesta(429, retry_after=2)
+    assert limitador.tasa == 5
+
+    limitador.adquirir()
+    assert reloj.tiempo >= 2  # respetó Retry-After
+
+    limitador.registrar_respuesta(429, retry_after=0)
+    limitador.registrar_respuesta(429, retry_after=0)
+    limitador.registrar_respuesta(429, retry_after=0)
+    assert limitador.tasa == 1  # nunca baja de la mínima
+
+    for _ in range(18):
+        limitador.registrar_respuesta(200)
+    assert limitador.tasa == 10  # recuperación aditiva hasta la máxima
+    assert limitador.metricas()["respuestas_429"] == 4
+
+
+def test_cuota_compartida_limita_a_todos_los_procesos_y_reserva_conversacion():
+    reloj = RelojFalso(inicio=100.0)
+    repo = CuotaEnMemoria()
+    # Dos "procesos" con su propio limitador local y la misma cuota del número
+    procesos = [
+        LimitadorEnvios(tasa=100, rafaga=100, reloj=reloj,
+                        cuota=CuotaCompartida(repo, "numero", tasa=10, reserva=0.2, reloj=reloj))
+        for _ in range(2)
+    ]
+    for i in range(8):
+        procesos[i % 2].adquirir(PRIORIDAD_NOTIFICACION)
+    assert reloj.tiempo == 100.0
+    assert repo.enviados[("numero", 100)] == 8
+
+    # Las notificaciones llegaron a su tope (80%): la conversación todavía tiene lugar
+    procesos[0].adquirir(PRIORIDAD_CONVERSACION)
+    procesos[1].adquirir(PRIORIDAD_CONVERSACION)
+    assert reloj.tiempo == 100.0
+    assert repo.enviados[("numero", 100)] == 10
+
+    # Cuota llena: el siguiente envío espera a la ventana siguiente
+    procesos[0].adquirir(PRIORIDAD_CONVERSACION)
+    assert reloj.tiempo == pytest.approx(101.0)
+
+
+def test_429_en_un_proceso_pausa_la_cuota_de_los_demas():
+    reloj = RelojFalso(inicio=50.0)
+    repo = CuotaEnMemoria()
+    uno, otro = (
+        LimitadorEnvios(tasa=100, rafaga=100, reloj=reloj, cuota=CuotaCompartida(repo, "numero", tasa=10, reloj=reloj))
+        for _ in range(2)
+    )
+    uno.registrar_respuesta(429, retry_after=3)
+    reloj.avanzar(1)  # otra ventana: el otro proceso relee la pausa publicada
+    otro.adquirir()
+    assert reloj.tiempo >= 53.0
@@ -0,0 +1,30 @@
+import os
+import pytest
+
+pytest.importorskip("pymongo")
+pytestmark = pytest.mark.skipif(not os.getenv("MONGO_URL"), reason="requiere MONGO_URL (servidor de MongoDB de prueba)")
+
+
+@pytest.fixture
+def db_prueba(monkeypatch):
+    from pymongo import MongoClient
+    from app.database import verificar_planes
+    from app.database.db_conn import inicializar_base_datos
+
+    # VERIFICAR_PLANES=1 se lee al importar: se activa también en el módulo ya cargado
+    monkeypatch.setenv("VERIFICAR_PLANES", "1")
+    monkeypatch.setattr(verificar_planes, "VERIFICAR_PLANES", True)
+    client = MongoClient(os.getenv("MONGO_URL"), tz_aware=True)
+    client.drop_database(verificar_planes.BASE_VERIFICACION)
+    db = client[verificar_planes.BASE_VERIFICACION]
+    inicializar_base_datos(db)
+    yield db
+    client.drop_database(verificar_planes.BASE_VERIFICACION)
+    client.close()
+
+
+def test_todas_las_consultas_de_los_repositorios_usan_indices(db_prueba):
+    from app.database.verificar_planes import verificar_repositorios
+
+    fallas = {nombre: error for nombre, error in verificar_repositorios(db_prueba).items() if error}
+    assert not fallas